@@ -21,6 +21,7 @@ from core.models import (
     FormTemplate,
     FormCriterion,
     FormOption,
+    BackgroundJob,
 )
 
 # فرم‌های اختصاصی
@@ -312,7 +313,7 @@ class UnitAdmin(admin.ModelAdmin):
             parent = Unit.objects.filter(
                 organization_id=obj.organization_id, name=Settings.DEFAULT_PARENT_NAME
             ).first()
-            if parent:
+            if parent and parent.pk != obj.pk:
                 obj.parent_unit = parent
 
         super().save_model(request, obj, form, change)
@@ -926,6 +927,17 @@ class FormCriterionAdmin(admin.ModelAdmin):
 class FormOptionAdmin(admin.ModelAdmin):
     list_display = ("criterion", "order", "label", "value")
 
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "status", "progress", "total", "created_by", "created_at", "finished_at", "worker")
+    list_filter = ("status", "kind")
+    readonly_fields = ("kind", "params", "status", "progress", "total", "attempts", "worker", "error",
+                       "result_name", "result_content_type", "created_by", "created_at",
+                       "started_at", "finished_at", "heartbeat_at")
+
+    def has_add_permission(self, request):
+        return False
+
 # ==========================Report===========================
 # یک Proxy Model صرفاً برای داشتن یک منو در ادمین
 
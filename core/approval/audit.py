@@ -0,0 +1,122 @@
+# core/approval/audit.py
+"""
+ثبت گذارهای وضعیت ارزیابی در EvaluationTransition (فقط‌افزودنی).
+
+همه‌ی مسیرها (WorkflowEngine، ویوهای ساخت/ارسال/آرشیو، عملیات گروهی) از
+record_transitions استفاده می‌کنند: یک کوئری برای زمان ورود به مرحله‌ی قبلی
+و یک bulk_create برای همه‌ی ردیف‌ها. باید داخل همان تراکنشِ تغییر وضعیت صدا زده شود.
+"""
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+from typing import Iterable, List, Optional
+
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Max
+from django.utils import timezone
+
+from core.models import Evaluation, EvaluationTransition
+
+# evaluation: نمونه‌ی Evaluation (pk و unit_code لازم است)
+Transition = namedtuple("Transition", ["evaluation", "from_status", "to_status"])
+
+ARCHIVED = EvaluationTransition.ARCHIVED
+
+
+def _status(value) -> str:
+    return str(getattr(value, "value", value) or "")
+
+
+def record_transitions(transitions: Iterable[Transition], actor=None, role="", at=None) -> int:
+    """ردیف‌های گذار را یک‌جا می‌نویسد؛ گذارهای بی‌تغییر (from == to) نادیده گرفته می‌شوند"""
+    rows = [t for t in transitions if _status(t.from_status) != _status(t.to_status)]
+    if not rows:
+        return 0
+    at = at or timezone.now()
+    role = _status(role)
+    actor_id = getattr(actor, "pk", None)
+
+    # زمان ورود به مرحله‌ی فعلی: آخرین گذار ثبت‌شده، وگرنه زمان ساخت ارزیابی
+    ids = {t.evaluation.pk for t in rows if _status(t.from_status)}
+    started = {}
+    if ids:
+        started = dict(
+            EvaluationTransition.objects.filter(evaluation_id__in=ids)
+            .values("evaluation_id").annotate(m=Max("created_at"))
+            .values_list("evaluation_id", "m")
+        )
+        missing = ids - started.keys()
+        if missing:
+            started.update(Evaluation.objects.filter(pk__in=missing).values_list("pk", "created_at"))
+
+    EvaluationTransition.objects.bulk_create(
+        [
+            EvaluationTransition(
+                evaluation_id=t.evaluation.pk,
+                from_status=_status(t.from_status),
+                to_status=_status(t.to_status),
+                actor_id=actor_id,
+                role=role,
+                unit_code=t.evaluation.unit_code or "",
+                stage_started_at=started.get(t.evaluation.pk),
+                created_at=at,
+            )
+            for t in rows
+        ],
+        batch_size=1000,
+    )
+    return len(rows)
+
+
+def record_transition(evaluation, from_status, to_status, actor=None, role="") -> int:
+    return record_transitions([Transition(evaluation, from_status, to_status)], actor=actor, role=role)
+
+
+# ماندن در یک مرحله: واحد، وضعیت مبدأ، تعداد گذار، میانگین و بیشینه‌ی مدت (ساعت)
+StageDuration = namedtuple("StageDuration", ["unit_code", "status", "count", "avg_hours", "max_hours"])
+
+
+def _hours(delta) -> float:
+    return round(delta.total_seconds() / 3600, 1) if delta is not None else 0.0
+
+
+def _day_start(day) -> datetime:
+    """ابتدای روز day در منطقه‌ی زمانی جاری (aware)"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def time_in_stage_queryset(unit_codes: Optional[Iterable[str]] = None, date_from=None, date_to=None):
+    """کوئری GROUP BY گزارش time-in-stage (برای time_in_stage و explain_hot_queries)"""
+    qs = EvaluationTransition.objects.filter(stage_started_at__isnull=False)
+    if unit_codes is not None:
+        qs = qs.filter(unit_code__in=list(unit_codes))
+    # بازه روی خود ستون (نه cast به date) تا ایندکس‌های created_at به کار بیایند
+    if date_from:
+        qs = qs.filter(created_at__gte=_day_start(date_from))
+    if date_to:
+        qs = qs.filter(created_at__lt=_day_start(date_to + timedelta(days=1)))
+
+    spent = ExpressionWrapper(F("created_at") - F("stage_started_at"), output_field=DurationField())
+    return (
+        qs.values("unit_code", "from_status")
+        .annotate(n=Count("id"), avg=Avg(spent), longest=Max(spent))
+        .order_by("unit_code", "from_status")
+    )
+
+
+def time_in_stage(unit_codes: Optional[Iterable[str]] = None, date_from=None, date_to=None) -> List[StageDuration]:
+    """مدت ماندن ارزیابی‌ها در هر مرحله، با یک GROUP BY روی EvaluationTransition"""
+    rows = time_in_stage_queryset(unit_codes, date_from, date_to)
+    return [
+        StageDuration(r["unit_code"], r["from_status"], r["n"], _hours(r["avg"]), _hours(r["longest"]))
+        for r in rows
+    ]
+
+
+__all__ = [
+    "ARCHIVED",
+    "Transition",
+    "record_transitions",
+    "record_transition",
+    "StageDuration",
+    "time_in_stage",
+    "time_in_stage_queryset",
+]
@@ -0,0 +1,82 @@
+# core/approval/role_resolver.py
+"""
+تشخیص نقش تأیید کاربر، یک بار برای هر درخواست.
+
+پروفایل و نقش روی خود شیء user (request.user) نگه داشته می‌شوند؛ پس لیست‌هایی که برای
+هر ارزیابی WorkflowEngine می‌سازند فقط یک کوئری پروفایل می‌زنند، نه یکی برای هر ردیف.
+"""
+from typing import Optional
+
+from core.approval.roles import ApprovalRole
+from core.constants import Settings
+
+_PROFILE_ATTR = "_approval_profile"
+_ROLE_ATTR = "_approval_role"
+
+MANAGER_JOB_ROLES = {
+    Settings.ROLE_UNIT_MANAGER,  # 901
+    Settings.ROLE_SUPERVISOR,  # 903
+    Settings.ROLE_RESPONSIBLE,  # 907
+    Settings.ROLE_SECTION_HEAD,  # 902
+}
+
+
+def approval_role_for_profile(ep) -> Optional[ApprovalRole]:
+    """نقش تأیید از روی EmployeeProfile (بدون کوئری اگر unit/job_role لود شده باشند)"""
+    if not ep or not ep.job_role:
+        return None
+
+    # ✅ HR واقعی طبق constants
+    if (
+            ep.unit
+            and ep.unit.unit_code in Settings.HR_UNIT_CODES  # {"202"}
+            and ep.job_role.code == Settings.ROLE_UNIT_MANAGER  # "901"
+    ):
+        return ApprovalRole.HR
+
+    # مدیر کارخانه
+    if ep.job_role.code == Settings.ROLE_FACTORY_MANAGER:  # "900"
+        return ApprovalRole.FACTORY_MANAGER
+
+    # مدیر / سرپرست / مسئول
+    if ep.job_role.code in MANAGER_JOB_ROLES:
+        return ApprovalRole.MANAGER
+
+    return None
+
+
+def resolve_profile(user):
+    """EmployeeProfile کاربر (با unit و job_role)، یک بار برای هر شیء user"""
+    if user is None or not getattr(user, "is_authenticated", False):
+        return None
+    if not hasattr(user, _PROFILE_ATTR):
+        from core.models import EmployeeProfile
+
+        ep = (
+            EmployeeProfile.objects.select_related("user", "unit", "job_role")
+            .filter(user_id=user.pk)
+            .first()
+        )
+        setattr(user, _PROFILE_ATTR, ep)
+    return getattr(user, _PROFILE_ATTR)
+
+
+def resolve_approval_role(user) -> Optional[ApprovalRole]:
+    """نقش تأیید کاربر، memoize روی شیء user"""
+    if user is None:
+        return None
+    if not hasattr(user, _ROLE_ATTR):
+        setattr(user, _ROLE_ATTR, approval_role_for_profile(resolve_profile(user)))
+    return getattr(user, _ROLE_ATTR)
+
+
+def resolve_request_role(request) -> Optional[ApprovalRole]:
+    return resolve_approval_role(getattr(request, "user", None))
+
+
+__all__ = [
+    "approval_role_for_profile",
+    "resolve_profile",
+    "resolve_approval_role",
+    "resolve_request_role",
+]
@@ -1,11 +1,15 @@
 # core/approval/workflow_engine.py
+from collections import namedtuple
+from django.db import transaction
+from django.db.models import Case, CharField, Value, When
 from django.utils import timezone
-from core.models import  EmployeeProfile
-from core.models import EvaluationSignature
+from core.models import Evaluation, EvaluationSignature
 from core.approval.statuses import EvaluationStatus
-from core.constants import Settings
 from core.approval.roles import ApprovalRole
+from core.approval.role_resolver import resolve_approval_role, resolve_profile
+from core.approval.audit import Transition, record_transition, record_transitions
 from core.approval.workflow import ApprovalWorkflow
+from core.signals import evaluation_changed
 
 LEGACY_STATUS_MAP = {
     "draft": EvaluationStatus.DRAFT,
@@ -14,6 +18,13 @@ LEGACY_STATUS_MAP = {
     #"rejected": EvaluationStatus.REJECTED,
 }
 
+# نتیجه‌ی هر مورد در approve_many
+ApprovalResult = namedtuple("ApprovalResult", ["evaluation_id", "ok", "status", "error"])
+
+# نشانگر «نقش از پیش داده نشده» (None خودش یک نقش معتبر است: بدون نقش)
+_UNRESOLVED = object()
+
+
 class WorkflowEngine:
     """
     این کلاس، کُنش‌گر اصلی گردش‌کار است:
@@ -22,11 +33,16 @@ class WorkflowEngine:
     3) روی Evaluation واقعی تغییرات را اعمال می‌کند
     """
 
-    def __init__(self, evaluation):
+    def __init__(self, evaluation, role=_UNRESOLVED):
+        """
+        role: نقش تأیید از پیش تعیین‌شده‌ی کاربر (resolve_approval_role)؛
+        لیست‌ها یک بار نقش را می‌گیرند و به همه‌ی موتورها می‌دهند.
+        """
         if evaluation is None:
             raise ValueError("Evaluation cannot be None")
 
         self.evaluation = evaluation
+        self.role = role
 
         raw_status = evaluation.status
 
@@ -48,32 +64,9 @@ class WorkflowEngine:
     # نقش کاربر برای این Evaluation چیست؟
     # ---------------------------------------
     def get_user_role(self, user):
-        ep = EmployeeProfile.objects.filter(user=user).first()
-        if not ep or not ep.job_role:
-            return None
-
-        # ✅ HR واقعی طبق constants
-        if (
-                ep.unit
-                and ep.unit.unit_code in Settings.HR_UNIT_CODES  # {"202"}
-                and ep.job_role.code == Settings.ROLE_UNIT_MANAGER  # "901"
-        ):
-            return ApprovalRole.HR
-
-        # مدیر کارخانه
-        if ep.job_role.code == Settings.ROLE_FACTORY_MANAGER:  # "900"
-            return ApprovalRole.FACTORY_MANAGER
-
-        # مدیر / سرپرست / مسئول
-        if ep.job_role.code in {
-            Settings.ROLE_UNIT_MANAGER,  # 901
-            Settings.ROLE_SUPERVISOR,  # 903
-            Settings.ROLE_RESPONSIBLE,  # 907
-            Settings.ROLE_SECTION_HEAD,  # 902
-        }:
-            return ApprovalRole.MANAGER
-
-        return None
+        if self.role is not _UNRESOLVED:
+            return self.role
+        return resolve_approval_role(user)
 
     # ---------------------------------------
     # آیا این کاربر اجازه Approve دارد؟
@@ -100,7 +93,7 @@ class WorkflowEngine:
             raise ValueError("مرحله بعدی وجود ندارد.")
 
         # ثبت امضا (فقط یک بار برای هر role)
-        ep = EmployeeProfile.objects.filter(user=user).first()
+        ep = resolve_profile(user)
 
         EvaluationSignature.objects.get_or_create(
             evaluation=self.evaluation,
@@ -117,12 +110,117 @@ class WorkflowEngine:
         )
 
         # به‌روزرسانی وضعیت ارزیابی
+        old_status = self.evaluation.status
         self.evaluation.status = new_status
         self.evaluation.updated_at = timezone.now()
         self.evaluation.save(update_fields=["status", "updated_at"])
+        record_transition(self.evaluation, old_status, new_status, actor=user, role=role)
+        evaluation_changed.send(
+            sender=type(self.evaluation), evaluation=self.evaluation, user=user, status_changed=True
+        )
 
         return new_status
 
+    # ---------------------------------------
+    # تأیید گروهی (پایان دوره)
+    # ---------------------------------------
+    @classmethod
+    def approve_many(cls, user, evaluation_ids, role=_UNRESOLVED):
+        """
+        تأیید چند ارزیابی با هم:
+        - همه‌ی گذارها در حافظه بررسی می‌شوند (همان قواعد approve)
+        - امضاها با یک bulk_create (فقط نقش‌هایی که امضا ندارند)
+        - وضعیت‌ها با یک UPDATE (CASE روی وضعیت قبلی)
+        خروجی: لیست ApprovalResult به ترتیب evaluation_ids
+        """
+        from core.services.evaluation_stats import schedule_stat_refresh, stat_key
+
+        if role is _UNRESOLVED:
+            role = resolve_approval_role(user)
+        ids = []
+        for raw in evaluation_ids:
+            try:
+                ids.append(int(raw))
+            except (TypeError, ValueError):
+                continue
+        ids = list(dict.fromkeys(ids))
+        if not role:
+            return [ApprovalResult(pk, False, None, "نقش کاربر مشخص نیست.") for pk in ids]
+
+        results = {}
+        with transaction.atomic():
+            evaluations = {
+                ev.pk: ev
+                for ev in Evaluation.objects.select_for_update().filter(pk__in=ids).only(
+                    "id", "status", "unit_code", "template_id", "period_start", "period_months", "is_archived",
+                )
+            }
+            approved = []  # (ev, new_status)
+            approved_ids = []
+            transitions = {}  # وضعیت قبلی → وضعیت بعدی
+            for pk in ids:
+                ev = evaluations.get(pk)
+                if ev is None:
+                    results[pk] = ApprovalResult(pk, False, None, "ارزیابی پیدا نشد.")
+                    continue
+                try:
+                    engine = cls(ev, role=role)
+                except ValueError as ex:
+                    results[pk] = ApprovalResult(pk, False, ev.status, str(ex))
+                    continue
+                if not engine.core.can_approve(role):
+                    results[pk] = ApprovalResult(pk, False, ev.status, "شما مجاز به تأیید این مرحله نیستید.")
+                    continue
+                new_status = engine.core.approve_status()
+                if not new_status:
+                    results[pk] = ApprovalResult(pk, False, ev.status, "مرحله بعدی وجود ندارد.")
+                    continue
+                approved.append((ev, new_status))
+                approved_ids.append(ev.pk)
+                transitions[getattr(ev.status, "value", ev.status)] = new_status.value
+
+            if approved:
+                ep = resolve_profile(user)
+                signer = (
+                    ep.user.get_full_name()
+                    if ep and ep.user.get_full_name()
+                    else user.get_full_name() or user.username
+                )
+                signed = set(
+                    EvaluationSignature.objects.filter(evaluation_id__in=approved_ids, role=role.value)
+                    .values_list("evaluation_id", flat=True)
+                )
+                EvaluationSignature.objects.bulk_create([
+                    EvaluationSignature(
+                        evaluation_id=pk, evaluator=user, role=role.value, signed_by_name=signer,
+                        is_final=(role == ApprovalRole.FACTORY_MANAGER),
+                    )
+                    for pk in approved_ids if pk not in signed
+                ])
+
+                old_keys = {stat_key(ev) for ev, _ in approved}
+                # ردیف‌ها بالا قفل شده‌اند؛ وضعیتشان بین بررسی و UPDATE عوض نمی‌شود
+                Evaluation.objects.filter(pk__in=approved_ids).update(
+                    status=Case(
+                        *(When(status=old, then=Value(new)) for old, new in transitions.items()),
+                        output_field=CharField(),
+                    ),
+                    updated_at=timezone.now(),
+                )
+                record_transitions(
+                    [Transition(ev, ev.status, new_status) for ev, new_status in approved],
+                    actor=user, role=role,
+                )
+                for ev, new_status in approved:
+                    ev.status = new_status
+                    results[ev.pk] = ApprovalResult(ev.pk, True, new_status, "")
+                # update() از save() رد می‌شود؛ سطل‌های rollup دستی
+                schedule_stat_refresh(old_keys | {stat_key(ev) for ev, _ in approved})
+
+        if approved:
+            evaluation_changed.send(sender=Evaluation, evaluation=None, user=user, status_changed=True)
+        return [results[pk] for pk in ids]
+
     # ---------------------------------------
     # ثبت برگشت به مرحله قبل
     # ---------------------------------------
@@ -135,9 +233,14 @@ class WorkflowEngine:
         if not new_status:
             raise ValueError("مرحله برگشت برای این مرحله تعریف نشده.")
 
+        old_status = self.evaluation.status
         self.evaluation.status = new_status
         self.evaluation.updated_at = timezone.now()
         self.evaluation.save()
+        record_transition(self.evaluation, old_status, new_status, actor=user, role=role or "")
+        evaluation_changed.send(
+            sender=type(self.evaluation), evaluation=self.evaluation, user=user, status_changed=True
+        )
 
         return new_status
 
@@ -169,20 +272,8 @@ class WorkflowEngine:
         return True
 
     def can_user_approve(self, user):
-        ep = getattr(user, "employee_profile", None)
-        if not ep or not ep.job_role:
+        # فقط HR و مدیر کارخانه از این مسیر تأیید می‌کنند
+        role = self.get_user_role(user)
+        if role not in (ApprovalRole.HR, ApprovalRole.FACTORY_MANAGER):
             return False
-
-        # HR Manager
-        if (
-                ep.unit
-                and ep.unit.unit_code in Settings.HR_UNIT_CODES
-                and ep.job_role.code == Settings.ROLE_UNIT_MANAGER
-        ):
-            return self.core.can_approve(ApprovalRole.HR)
-
-        # Factory Manager
-        if ep.job_role.code == Settings.ROLE_FACTORY_MANAGER:
-            return self.core.can_approve(ApprovalRole.FACTORY_MANAGER)
-
-        return False
\ No newline at end of file
+        return self.core.can_approve(role)
@@ -5,4 +5,9 @@ class CoreConfig(AppConfig):
     name = 'core'
 
     def ready(self):
-        pass
+        # اتصال گیرنده‌های سیگنال (ابطال کش داشبورد، بسته‌ی معیارهای فرم، محدوده‌ی سازمانی، درخت واحدها و گراف سازمانی)
+        from core.services import dashboard_cache  # noqa: F401
+        from core.services import template_bundle  # noqa: F401
+        from core.services import org_scope  # noqa: F401
+        from core.services import unit_tree  # noqa: F401
+        from core.services import org_graph  # noqa: F401
@@ -0,0 +1,77 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Q
+from core.approval.audit import time_in_stage_queryset
+from core.constants import WorkflowStatus
+from core.models import Evaluation
+
+
+def _hot_queries(user, unit_code, sample):
+    """(نام، queryset) کوئری‌های پرتکرار داشبورد، لیست‌ها، صف‌های workflow و گزارش‌ها"""
+    active = Evaluation.objects.filter(is_archived=False)
+    mine = active.filter(evaluator=user)
+    return [
+        ("dashboard: my drafts", mine.filter(status=Evaluation.Status.DRAFT).order_by("-updated_at")[:10]),
+        ("dashboard: my submitted", mine.filter(status=Evaluation.Status.SUBMITTED).order_by("-updated_at")[:5]),
+        ("dashboard: my archived", Evaluation.objects.filter(evaluator=user, is_archived=True).order_by("-archived_at")[:5]),
+        ("dashboard: counters scan",
+         Evaluation.objects.filter(Q(evaluator=user) | Q(is_archived=False)).values("status").annotate(n=Count("id"))),
+        ("dashboard: to-do (form/period)",
+         active.filter(template_id=sample.template_id, template_version=sample.template_version,
+                       period_start=sample.period_start, period_end=sample.period_end)
+         .values_list("employee_id", flat=True)),
+        ("list: my drafts", mine.filter(status=Evaluation.Status.DRAFT).order_by("-id")[:20]),
+        ("workflow: hr queue", active.filter(status=WorkflowStatus.HR_REVIEW).order_by("-updated_at")[:50]),
+        ("workflow: factory queue", active.filter(status=WorkflowStatus.FACTORY_REVIEW).order_by("-updated_at")[:50]),
+        ("report: unit by period",
+         Evaluation.objects.filter(unit_code=unit_code).order_by("employee_id", "period_start")),
+        ("report: employee history",
+         Evaluation.objects.filter(employee_id=sample.employee_id, template_id=sample.template_id)
+         .order_by("-period_start")),
+        ("report: time in stage", time_in_stage_queryset([unit_code])),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN for the hot dashboard/list/report queries on Evaluation "
+        "(use on production-sized data to check that the composite/partial indexes are used)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Username whose dashboard is explained (default: first superuser)")
+        parser.add_argument("--unit", help="unit_code for the report queries (default: unit of a sample evaluation)")
+        parser.add_argument("--only", help="Only queries whose name contains this text")
+        parser.add_argument("--analyze", action="store_true", help="EXPLAIN ANALYZE (PostgreSQL only; runs the queries)")
+
+    def handle(self, *args, **opts):
+        User = get_user_model()
+        if opts.get("user"):
+            user = User.objects.filter(username=opts["user"]).first()
+            if not user:
+                raise CommandError(f"User '{opts['user']}' not found.")
+        else:
+            user = User.objects.filter(is_superuser=True).order_by("pk").first()
+            if not user:
+                raise CommandError("No superuser found; pass --user.")
+
+        sample = Evaluation.objects.order_by("-pk").first()
+        if sample is None:
+            raise CommandError("No evaluations to explain.")
+
+        explain_opts = {}
+        if opts["analyze"]:
+            if connection.vendor != "postgresql":
+                raise CommandError("--analyze is only supported on PostgreSQL.")
+            explain_opts = {"analyze": True, "buffers": True}
+
+        unit_code = opts.get("unit") or sample.unit_code
+        for name, qs in _hot_queries(user, unit_code, sample):
+            if opts.get("only") and opts["only"] not in name:
+                continue
+            self.stdout.write(self.style.MIGRATE_HEADING(f"== {name}"))
+            self.stdout.write(qs.explain(**explain_opts))
+            self.stdout.write("")
+
+        self.stdout.write(self.style.SUCCESS(f"Done (vendor={connection.vendor}, user={user.username}, unit={unit_code})."))
@@ -0,0 +1,13 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from core.services.jobs import purge_jobs
+
+class Command(BaseCommand):
+    help = "Delete finished/failed BackgroundJob rows (and their stored files) older than --days."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=7)
+
+    def handle(self, *args, **opts):
+        n = purge_jobs(timedelta(days=opts["days"]))
+        self.stdout.write(self.style.SUCCESS(f"Deleted {n} job(s)."))
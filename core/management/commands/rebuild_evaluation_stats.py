@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.models import Organization, Unit
+from core.services.evaluation_stats import rebuild_evaluation_stats
+
+class Command(BaseCommand):
+    help = "Rebuild the EvaluationStat rollup table from Evaluation rows (all organizations, or one with --org)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--org", help="Organization exact name (default: all)")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **opts):
+        unit_codes = None
+        if opts.get("org"):
+            try:
+                org = Organization.objects.get(name=opts["org"])
+            except Organization.DoesNotExist:
+                raise CommandError(f"Organization '{opts['org']}' not found.")
+            unit_codes = list(
+                Unit.objects.filter(organization=org, unit_code__isnull=False)
+                .values_list("unit_code", flat=True)
+            )
+
+        n = rebuild_evaluation_stats(unit_codes=unit_codes, batch_size=opts["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"EvaluationStat rebuilt: {n} buckets"))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.models import Organization
+from core.services.unit_tree import rebuild_unit_closure
+
+class Command(BaseCommand):
+    help = "Rebuild the UnitClosure table from Unit.parent_unit (all organizations, or one with --org)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--org", help="Organization exact name (default: all)")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **opts):
+        org_ids = None
+        if opts.get("org"):
+            try:
+                org_ids = [Organization.objects.get(name=opts["org"]).pk]
+            except Organization.DoesNotExist:
+                raise CommandError(f"Organization '{opts['org']}' not found.")
+
+        n = rebuild_unit_closure(organization_ids=org_ids, batch_size=opts["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"UnitClosure rebuilt: {n} rows"))
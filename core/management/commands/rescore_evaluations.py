@@ -0,0 +1,139 @@
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from core.models import Evaluation, EvaluationItem, FormCriterion, FormOption, FormTemplate
+from core.services.evaluation_stats import collect_stat_keys, refresh_stat_buckets
+from core.services.scoring import rescore_chunk
+from core.services.template_bundle import clear_bundles
+from core.signals import evaluation_changed
+
+
+def _init_worker():
+    # در start method «spawn» پروسه‌ی فرزند باید Django را خودش راه بیندازد
+    import django
+    django.setup()
+
+
+def _rescore_worker(args):
+    ids, dry_run, criterion_weights = args
+    return len(ids), rescore_chunk(ids, dry_run=dry_run, criterion_weights=criterion_weights)
+
+
+def _option_value():
+    return Subquery(FormOption.objects.filter(pk=OuterRef("selected_option_id")).values("value")[:1])
+
+
+def _id_chunks(qs, chunk_size):
+    chunk = []
+    for pk in qs.order_by("pk").values_list("pk", flat=True).iterator(chunk_size=chunk_size):
+        chunk.append(pk)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute final_score/max_score of all evaluations of a form template "
+        "(e.g. after correcting FormCriterion.weight or FormOption.value). Item value snapshots "
+        "(selected_value/earned_points) are refreshed from the linked options."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--template", required=True, help="FormTemplate code (e.g. HR-F-84)")
+        parser.add_argument("--template-version", type=int, help="Only this template version (default: all versions)")
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument("--workers", type=int, default=1, help="Parallel processes (chunks are split between them)")
+        parser.add_argument("--dry-run", action="store_true", help="Only report how many scores would change")
+        parser.add_argument(
+            "--sync-weights", action="store_true",
+            help="First copy FormCriterion.weight into the items' weight snapshot (needed after a weight correction)",
+        )
+
+    def handle(self, *args, **opts):
+        templates = FormTemplate.objects.filter(code=opts["template"])
+        if opts.get("template_version") is not None:
+            templates = templates.filter(version=opts["template_version"])
+        if not templates.exists():
+            raise CommandError(f"FormTemplate '{opts['template']}' (version={opts.get('template_version') or 'all'}) not found.")
+        if opts["chunk_size"] < 1 or opts["workers"] < 1:
+            raise CommandError("--chunk-size and --workers must be positive.")
+
+        qs = Evaluation.objects.filter(template__in=templates)
+        if opts.get("template_version") is not None:
+            qs = qs.filter(template_version=opts["template_version"])
+        total = qs.count()
+        dry_run = opts["dry_run"]
+        self.stdout.write(f"Rescoring {total} evaluation(s) of {opts['template']} "
+                          f"in chunks of {opts['chunk_size']} with {opts['workers']} worker(s)"
+                          f"{' [dry-run]' if dry_run else ''}")
+
+        if not dry_run:
+            # اصلاح با update()/SQL سیگنال ندارد؛ بسته‌ی کش‌شده‌ی فرم در همه‌ی پروسه‌ها باطل شود
+            templates.update(updated_at=timezone.now())
+            clear_bundles(templates.values_list("pk", flat=True))
+
+        if opts["sync_weights"]:
+            stale = EvaluationItem.objects.filter(evaluation__in=qs, criterion__isnull=False).exclude(
+                weight=F("criterion__weight")
+            )
+            if dry_run:
+                n = stale.count()
+            else:
+                weight = Subquery(FormCriterion.objects.filter(pk=OuterRef("criterion_id")).values("weight")[:1])
+                # earned_points در همان UPDATE؛ F("weight") اینجا هنوز وزن قبلی است
+                n = EvaluationItem.objects.filter(pk__in=stale.values("pk")).update(
+                    weight=weight,
+                    earned_points=Coalesce(_option_value(), F("selected_value")) * weight,
+                )
+            self.stdout.write(f"Item weights {'to sync' if dry_run else 'synced'}: {n}")
+
+        # مقدار گزینه مرجع امتیاز است؛ اسنپ‌شات selected_value / earned_points آیتم‌ها هم‌گام شود
+        stale = EvaluationItem.objects.filter(evaluation__in=qs, selected_option__isnull=False).exclude(
+            selected_value=F("selected_option__value")
+        )
+        if dry_run:
+            n = stale.count()
+        else:
+            n = EvaluationItem.objects.filter(pk__in=stale.values("pk")).update(
+                selected_value=_option_value(),
+                earned_points=_option_value() * F("weight"),
+            )
+        self.stdout.write(f"Item option values {'to sync' if dry_run else 'synced'}: {n}")
+
+        # dry-run با --sync-weights: وزن‌ها نوشته نشده‌اند؛ امتیاز با وزن معیارها (در حافظه) حساب شود
+        criterion_weights = dry_run and opts["sync_weights"]
+        tasks = ((ids, dry_run, criterion_weights) for ids in _id_chunks(qs, opts["chunk_size"]))
+        if opts["workers"] > 1:
+            tasks = list(tasks)
+            # اتصال‌های باز نباید با fork به فرزندها برسند
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=opts["workers"], initializer=_init_worker) as pool:
+                changed = self._collect(pool.map(_rescore_worker, tasks), total)
+        else:
+            changed = self._collect(map(_rescore_worker, tasks), total)
+
+        if changed and not dry_run:
+            # bulk_update از save() رد می‌شود؛ سطل‌های rollup و کش داشبورد دستی تازه می‌شوند
+            keys = set()
+            for i in range(0, len(changed), opts["chunk_size"]):
+                keys |= collect_stat_keys(Evaluation.objects.filter(pk__in=changed[i:i + opts["chunk_size"]]))
+            refresh_stat_buckets(keys)
+            evaluation_changed.send(sender=Evaluation, evaluation=None, user=None, status_changed=True)
+
+        verb = "would change" if dry_run else "updated"
+        self.stdout.write(self.style.SUCCESS(f"Done: {len(changed)} of {total} evaluation score(s) {verb}."))
+
+    def _collect(self, results, total):
+        done = 0
+        changed = []
+        for scanned, chunk_changed in results:
+            done += scanned
+            changed.extend(chunk_changed)
+            self.stdout.write(f"  {done}/{total} scanned, {len(changed)} changed")
+        return changed
@@ -0,0 +1,32 @@
+import socket
+import os
+from django.core.management.base import BaseCommand, CommandError
+from core.services.jobs import registered_kinds, run_worker
+
+class Command(BaseCommand):
+    help = "Run background job workers (exports / print PDFs) polling the BackgroundJob table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=2, help="Number of worker threads")
+        parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds between polls when the queue is empty")
+        parser.add_argument("--kind", action="append", help="Only run these job kinds (repeatable)")
+        parser.add_argument("--once", action="store_true", help="Drain the queue and exit")
+        parser.add_argument("--name", help="Worker name (default: host:pid)")
+
+    def handle(self, *args, **opts):
+        kinds = opts.get("kind")
+        if kinds:
+            unknown = set(kinds) - set(registered_kinds())
+            if unknown:
+                raise CommandError(f"Unknown job kind(s): {', '.join(sorted(unknown))}")
+
+        name = opts.get("name") or f"{socket.gethostname()}:{os.getpid()}"
+        self.stdout.write(f"Worker {name}: {opts['concurrency']} thread(s), kinds={kinds or 'all'}")
+        run_worker(
+            name,
+            concurrency=opts["concurrency"],
+            poll_interval=opts["poll_interval"],
+            once=opts["once"],
+            kinds=kinds,
+        )
+        self.stdout.write(self.style.SUCCESS("Worker stopped."))
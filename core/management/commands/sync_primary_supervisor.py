@@ -1,49 +1,60 @@
+from concurrent.futures import ProcessPoolExecutor
 from django.core.management.base import BaseCommand, CommandError
-from django.db import transaction
-from core.models import Organization, EmployeeProfile, EvaluationLink
+from django.db import connections
+from core.models import Organization
+from core.services.evaluation_links import sync_primary_supervisors
+
+
+def _init_worker():
+    # در start method «spawn» پروسه‌ی فرزند باید Django را خودش راه بیندازد
+    import django
+    django.setup()
+
+
+def _sync_worker(args):
+    org_id, dry_run = args
+    return org_id, sync_primary_supervisors(org_id, dry_run=dry_run)
+
 
 class Command(BaseCommand):
     help = "Set EmployeeProfile.direct_supervisor to the closest evaluator: SUPERVISOR > SECTION_HEAD > UNIT_MANAGER > ORG_HEAD."
 
     def add_arguments(self, parser):
-        parser.add_argument("--org", required=True, help="Organization exact name")
+        parser.add_argument("--org", help="Organization exact name")
+        parser.add_argument("--all-orgs", action="store_true", help="Process every organization")
+        parser.add_argument("--workers", type=int, default=1, help="Parallel processes for --all-orgs (one organization per task)")
         parser.add_argument("--dry-run", action="store_true")
 
     def handle(self, *args, **opts):
-        org_name = opts["org"]; dry = opts["dry_run"]
-        try:
-            org_id = Organization.objects.only("id").get(name=org_name).id
-        except Organization.DoesNotExist:
-            raise CommandError(f"Organization '{org_name}' not found.")
-
-        order = [
-            "SUPERVISOR",
-            "SECTION_HEAD",
-            "UNIT_MANAGER",
-            "DIRECT",
-            "ORG_HEAD",
-        ]
-        prio = {t:i for i,t in enumerate(order)}
+        dry = opts["dry_run"]
+        if bool(opts.get("org")) == bool(opts["all_orgs"]):
+            raise CommandError("Pass exactly one of --org or --all-orgs.")
+        if opts["workers"] < 1:
+            raise CommandError("--workers must be positive.")
+
+        if opts["all_orgs"]:
+            orgs = dict(Organization.objects.order_by("pk").values_list("pk", "name"))
+        else:
+            try:
+                org = Organization.objects.only("id", "name").get(name=opts["org"])
+            except Organization.DoesNotExist:
+                raise CommandError(f"Organization '{opts['org']}' not found.")
+            orgs = {org.id: org.name}
+
+        tasks = [(org_id, dry) for org_id in orgs]
+        if opts["workers"] > 1 and len(tasks) > 1:
+            # اتصال‌های باز نباید با fork به فرزندها برسند
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=opts["workers"], initializer=_init_worker) as pool:
+                results = list(pool.map(_sync_worker, tasks))
+        else:
+            results = list(map(_sync_worker, tasks))
 
         updated = 0
-        with transaction.atomic():
-            qs = EmployeeProfile.objects.select_related("user","direct_supervisor").filter(organization_id=org_id)
-            for p in qs:
-                # همهٔ لینک‌های ارزیاب برای این نفر
-                links = list(EvaluationLink.objects.filter(organization_id=org_id, subordinate=p.user)
-                             .values_list("link_type","evaluator_id"))
-                if not links:
-                    continue
-                # انتخاب نزدیک‌ترین
-                links.sort(key=lambda t: prio.get(t[0], 999))
-                best_eval_id = links[0][1]
-                if p.direct_supervisor_id != best_eval_id:
-                    p.direct_supervisor_id = best_eval_id
-                    p.save(update_fields=["direct_supervisor"])
-                    updated += 1
-
-            if dry:
-                transaction.set_rollback(True)
+        for org_id, n in results:
+            updated += n
+            if len(orgs) > 1:
+                self.stdout.write(f"  {orgs[org_id]}: {n}")
         self.stdout.write(self.style.SUCCESS(
             ("Dry-run; " if dry else "") + f"primary supervisors updated: {updated}"
         ))
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:56
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def backfill_period_months(apps, schema_editor):
+    # همان فرمول Evaluation.months_label، در یک UPDATE
+    Evaluation = apps.get_model("core", "Evaluation")
+    Evaluation.objects.filter(
+        period_start__isnull=False, period_end__isnull=False,
+        period_end__gte=F("period_start"),
+    ).update(
+        period_months=(ExtractYear(F("period_end")) - ExtractYear(F("period_start"))) * 12
+        + (ExtractMonth(F("period_end")) - ExtractMonth(F("period_start"))) + 1
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0039_evaluationsignature_signed_by_name_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='evaluation',
+            name='period_months',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='evaluation',
+            index=models.Index(fields=['period_months', 'period_start'], name='eval_period_months_idx'),
+        ),
+        migrations.RunPython(backfill_period_months, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Case, Count, F, FloatField, Q, Sum, When
+from django.db.models.functions import Coalesce, ExtractYear
+
+
+def build_initial_stats(apps, schema_editor):
+    # ساخت اولیه‌ی rollup؛ معادل rebuild_evaluation_stats
+    Evaluation = apps.get_model("core", "Evaluation")
+    EvaluationStat = apps.get_model("core", "EvaluationStat")
+    Unit = apps.get_model("core", "Unit")
+
+    scored = Q(max_score__gt=0, final_score__isnull=False)
+    percent = Case(
+        When(max_score__gt=0, then=(F("final_score") * 100.0) / F("max_score")),
+        default=None,
+        output_field=FloatField(),
+    )
+    rows = (
+        Evaluation.objects.order_by()
+        .annotate(stat_year=Coalesce(ExtractYear("period_start"), 0),
+                  stat_months=Coalesce("period_months", 0))
+        .values("unit_code", "template_id", "stat_year", "stat_months", "status", "is_archived")
+        .annotate(n=Count("id"), scored=Count("id", filter=scored),
+                  pct=Sum(percent, filter=scored),
+                  final_sum=Sum("final_score"), max_sum=Sum("max_score"))
+    )
+    org_ids = dict(Unit.objects.exclude(unit_code=None).values_list("unit_code", "organization_id"))
+    EvaluationStat.objects.bulk_create([
+        EvaluationStat(
+            organization_id=org_ids.get(r["unit_code"]),
+            unit_code=r["unit_code"] or "",
+            template_id=r["template_id"],
+            year=r["stat_year"] or 0,
+            period_months=r["stat_months"] or 0,
+            status=r["status"],
+            is_archived=r["is_archived"],
+            count=r["n"],
+            scored_count=r["scored"],
+            pct_sum=float(r["pct"] or 0.0),
+            final_score_sum=r["final_sum"] or 0,
+            max_score_sum=r["max_sum"] or 0,
+        )
+        for r in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0040_evaluation_period_months'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EvaluationStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unit_code', models.CharField(blank=True, default='', max_length=10)),
+                ('year', models.PositiveIntegerField(default=0)),
+                ('period_months', models.PositiveSmallIntegerField(default=0)),
+                ('status', models.CharField(max_length=16)),
+                ('is_archived', models.BooleanField(default=False)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('scored_count', models.PositiveIntegerField(default=0)),
+                ('pct_sum', models.FloatField(default=0)),
+                ('final_score_sum', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('max_score_sum', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('organization', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='evaluation_stats', to='core.organization')),
+                ('template', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='core.formtemplate')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['organization', 'year'], name='core_evalua_organiz_1a51fb_idx')],
+                'constraints': [models.UniqueConstraint(fields=('unit_code', 'template', 'year', 'period_months', 'status', 'is_archived'), name='uniq_evaluation_stat_bucket')],
+            },
+        ),
+        migrations.RunPython(build_initial_stats, migrations.RunPython.noop),
+    ]
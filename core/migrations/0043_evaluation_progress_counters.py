@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:15
+
+from django.db import migrations, models
+from django.db.models import Count, Exists, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_progress_counters(apps, schema_editor):
+    # همان قاعده‌ی is_complete: فقط آیتم‌های دارای معیارِ با گزینه اجباری‌اند؛ در یک UPDATE
+    Evaluation = apps.get_model("core", "Evaluation")
+    EvaluationItem = apps.get_model("core", "EvaluationItem")
+    FormOption = apps.get_model("core", "FormOption")
+
+    required = EvaluationItem.objects.filter(
+        evaluation=OuterRef("pk"),
+        criterion__isnull=False,
+    ).filter(Exists(FormOption.objects.filter(criterion=OuterRef("criterion"))))
+
+    def count(qs):
+        return Coalesce(
+            Subquery(qs.order_by().values("evaluation").annotate(n=Count("id")).values("n")[:1],
+                     output_field=IntegerField()),
+            Value(0),
+        )
+
+    Evaluation.objects.update(
+        required_items=count(required),
+        filled_items=count(required.filter(selected_option__isnull=False)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0042_backgroundjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='evaluation',
+            name='filled_items',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='evaluation',
+            name='required_items',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_progress_counters, migrations.RunPython.noop),
+    ]
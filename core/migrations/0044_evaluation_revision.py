@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0043_evaluation_progress_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='evaluation',
+            name='revision',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
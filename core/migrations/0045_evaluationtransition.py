@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:19
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0044_evaluation_revision'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EvaluationTransition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(blank=True, default='', max_length=32)),
+                ('to_status', models.CharField(max_length=32)),
+                ('role', models.CharField(blank=True, default='', max_length=20)),
+                ('unit_code', models.CharField(blank=True, default='', max_length=10)),
+                ('stage_started_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('evaluation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transitions', to='core.evaluation')),
+            ],
+            options={
+                'ordering': ['created_at', 'id'],
+                'indexes': [models.Index(fields=['created_at'], name='evtrans_created_idx'), models.Index(fields=['unit_code', 'created_at'], name='evtrans_unit_created_idx'), models.Index(fields=['evaluation', 'created_at'], name='evtrans_eval_created_idx')],
+            },
+        ),
+    ]
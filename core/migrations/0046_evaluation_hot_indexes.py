@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0045_evaluationtransition'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='evaluation',
+            index=models.Index(condition=models.Q(('is_archived', False)), fields=['evaluator', 'status', '-updated_at'], name='eval_evaluator_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='evaluation',
+            index=models.Index(condition=models.Q(('is_archived', True)), fields=['evaluator', '-archived_at'], name='eval_evaluator_archived_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='evaluation',
+            index=models.Index(condition=models.Q(('is_archived', False)), fields=['status', '-updated_at'], name='eval_status_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='evaluation',
+            index=models.Index(condition=models.Q(('is_archived', False)), fields=['template', 'template_version', 'period_start', 'period_end'], name='eval_tpl_period_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='evaluation',
+            index=models.Index(fields=['unit_code', 'period_start'], name='eval_unit_period_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='evaluation',
+            index=models.Index(fields=['employee_id', 'template', 'period_start'], name='eval_employee_period_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_closure(apps, schema_editor):
+    # مثل unit_tree.rebuild_unit_closure، با مدل‌های تاریخی
+    Unit = apps.get_model("core", "Unit")
+    UnitClosure = apps.get_model("core", "UnitClosure")
+    parents = dict(Unit.objects.values_list("pk", "parent_unit_id"))
+    rows = []
+    for unit_id in parents:
+        seen = set()
+        node, depth = unit_id, 0
+        while node is not None and node not in seen and node in parents:
+            seen.add(node)
+            rows.append(UnitClosure(ancestor_id=node, descendant_id=unit_id, depth=depth))
+            node, depth = parents[node], depth + 1
+    UnitClosure.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0046_evaluation_hot_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnitClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveSmallIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='core.unit')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='core.unit')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='unit_closure_desc_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ancestor', 'descendant'), name='unit_closure_pair_uniq')],
+            },
+        ),
+        migrations.RunPython(build_closure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:49
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0047_unitclosure'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='backgroundjob',
+            name='result_data',
+        ),
+        migrations.AddField(
+            model_name='backgroundjob',
+            name='result_file',
+            field=models.FileField(blank=True, editable=False, max_length=255, storage=core.models.job_results_storage, upload_to='%Y/%m/'),
+        ),
+    ]
@@ -3,6 +3,7 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.core.files.storage import FileSystemStorage
 from django.utils import timezone
 from .organization_models import (
     Holding,
@@ -90,6 +91,42 @@ class Unit(models.Model):
     def __str__(self):
         return self.name
 
+    def parent_creates_cycle(self) -> bool:
+        """آیا parent_unit فعلی خود این واحد یا یکی از زیرمجموعه‌هایش است؟ (از جدول بستار)"""
+        if self.pk is None or self.parent_unit_id is None:
+            return False
+        return self.parent_unit_id == self.pk or UnitClosure.objects.filter(
+            ancestor_id=self.pk, descendant_id=self.parent_unit_id
+        ).exists()
+
+    def clean(self):
+        if self.parent_creates_cycle():
+            raise ValidationError({
+                "parent_unit": f"واحد «{self}» نمی‌تواند زیرمجموعه‌ی خودش یا یکی از زیرمجموعه‌هایش باشد.",
+            })
+
+
+class UnitClosure(models.Model):
+    """
+    جدول بستار (closure) درخت parent_unit: برای هر جفت (نیا، نواده) یک ردیف با فاصله‌ی depth.
+    هر واحد با خودش هم یک ردیف depth=0 دارد؛ پس «این واحد و زیرمجموعه‌هایش» یک join است.
+    با core.services.unit_tree روی ذخیره/حذف Unit به‌روز می‌شود (rebuild_unit_closure برای بازسازی).
+    """
+    ancestor = models.ForeignKey("Unit", on_delete=models.CASCADE, related_name="descendant_links")
+    descendant = models.ForeignKey("Unit", on_delete=models.CASCADE, related_name="ancestor_links")
+    depth = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["ancestor", "descendant"], name="unit_closure_pair_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["descendant", "depth"], name="unit_closure_desc_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestor_id} → {self.descendant_id} ({self.depth})"
+
 #---------------------------------------
 class JobRole(models.Model):
     name = models.CharField(max_length=255, unique=True)
@@ -341,6 +378,8 @@ class Evaluation(models.Model):
     evaluated_at = models.DateField(auto_now_add=True)
     period_start = models.DateField(blank=True, null=True)
     period_end = models.DateField(blank=True, null=True)
+    # طول بازه به ماه (۳/۶/۹/۱۲) — ذخیره‌شده برای فیلتر مستقیم در SQL
+    period_months = models.PositiveSmallIntegerField(null=True, blank=True, editable=False)
 
     # فلگ‌های نمایشی (کپی از Template)
     show_employee_signature = models.BooleanField(default=False)
@@ -367,6 +406,12 @@ class Evaluation(models.Model):
     final_score = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     max_score   = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
 
+    # شمارنده‌های پیشرفت (آیتم‌های نمره‌دار / پرشده)؛ با ذخیره‌ی آیتم‌ها به‌روز می‌شوند
+    required_items = models.PositiveSmallIntegerField(default=0)
+    filled_items = models.PositiveSmallIntegerField(default=0)
+    # نسخه‌ی انتخاب‌های فرم؛ با هر ذخیره‌ی دارای تغییر یک واحد جلو می‌رود (autosave)
+    revision = models.PositiveIntegerField(default=0)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     submitted_at = models.DateTimeField(null=True, blank=True)
@@ -390,54 +435,121 @@ class Evaluation(models.Model):
                 condition=models.Q(is_archived=False),
             )
         ]
+        indexes = [
+            models.Index(fields=["period_months", "period_start"], name="eval_period_months_idx"),
+            # داشبورد و لیست‌های ارزیاب: Draft/Submitted/... خودم، جدیدترین اول
+            models.Index(
+                fields=["evaluator", "status", "-updated_at"], name="eval_evaluator_active_idx",
+                condition=models.Q(is_archived=False),
+            ),
+            models.Index(
+                fields=["evaluator", "-archived_at"], name="eval_evaluator_archived_idx",
+                condition=models.Q(is_archived=True),
+            ),
+            # صف‌های workflow (HR/مدیر/کارخانه) و شمارنده‌های وضعیت
+            models.Index(
+                fields=["status", "-updated_at"], name="eval_status_updated_idx",
+                condition=models.Q(is_archived=False),
+            ),
+            # To-Do و شروع دوره: ارزیابی‌های یک فرم/بازه
+            models.Index(
+                fields=["template", "template_version", "period_start", "period_end"], name="eval_tpl_period_active_idx",
+                condition=models.Q(is_archived=False),
+            ),
+            # گزارش‌ها و خروجی اکسل واحد (شامل آرشیوشده‌ها)
+            models.Index(fields=["unit_code", "period_start"], name="eval_unit_period_idx"),
+            # سابقه‌ی یک نفر در همه‌ی دوره‌ها؛ فعال‌ها را unique_active_eval هم پوشش می‌دهد
+            models.Index(fields=["employee_id", "template", "period_start"], name="eval_employee_period_idx"),
+        ]
 
     def __str__(self):
         return f"Eval {self.employee_name} [{self.template.code} v{self.template_version}]"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # کلید سطل آمار در لحظه‌ی خواندن (برای به‌روزرسانی سطل قبلی بعد از تغییر)؛
+        # کافی است ستون‌های کلید خوانده شده باشند، بقیه می‌توانند defer شوند
+        from core.services.evaluation_stats import STAT_KEY_FIELDS, stat_key
+        if not (STAT_KEY_FIELDS & instance.get_deferred_fields()):
+            instance._stat_key = stat_key(instance)
+        return instance
+
+    def save(self, *args, **kwargs):
+        # period_months همیشه با period_start/period_end هم‌گام بماند
+        months = self.months_label()
+        self.period_months = months if months and months > 0 else None
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and ({"period_start", "period_end"} & set(update_fields)):
+            kwargs["update_fields"] = list(update_fields) + ["period_months"]
+
+        from core.services.evaluation_stats import (
+            STAT_TRACKED_FIELDS, schedule_stat_refresh, stat_key, stored_stat_key,
+        )
+        tracked = update_fields is None or bool(STAT_TRACKED_FIELDS & set(update_fields))
+        # نمونه‌ای که با only()/defer() کلیدش خوانده نشده: سطل قبلی را از ردیف دیتابیس بگیریم
+        if tracked and self.pk is not None and not self._state.adding and not hasattr(self, "_stat_key"):
+            self._stat_key = stored_stat_key(self.pk)
+        super().save(*args, **kwargs)
+
+        # به‌روزرسانی افزایشی جدول آمار (EvaluationStat)
+        if tracked:
+            new_key = stat_key(self)
+            schedule_stat_refresh({getattr(self, "_stat_key", None), new_key})
+            self._stat_key = new_key
+
+    def delete(self, *args, **kwargs):
+        from core.services.evaluation_stats import schedule_stat_refresh, stat_key
+        key = getattr(self, "_stat_key", None) or stat_key(self)
+        result = super().delete(*args, **kwargs)
+        schedule_stat_refresh({key})
+        return result
+
     def recalc_scores(self):
-        items = self.items.select_related("criterion", "selected_option").prefetch_related("criterion__options").all()
-        total = 0
-        max_total = 0
-        for it in items:
-            # اگر مقدار مستقیم ذخیره نشده، از گزینه‌ی انتخابی بگیر
-            value = it.selected_value
-            if value is None and it.selected_option_id:
-                value = it.selected_option.value
-
-            if value is not None:
-                total += float(value) * float(it.weight or 1)
-
-            if it.criterion and hasattr(it.criterion, "options"):
-                max_opt = it.criterion.options.aggregate(models.Max("value"))["value__max"] or 0
-                max_total += float(max_opt) * float(it.weight or 1)
-
-        self.final_score = round(total, 2)
-        self.max_score = round(max_total, 2)
-        self.save(update_fields=["final_score", "max_score"])
+        """امتیاز و شمارنده‌های پیشرفت را از آیتم‌ها (و بسته‌ی کش‌شده‌ی فرم) دوباره حساب می‌کند"""
+        from core.services.scoring import ItemRow, criterion_max_values, score_items
+        from core.services.template_bundle import get_bundle
+
+        bundle = get_bundle(self.template)
+        items = list(self.items.values_list("criterion_id", "weight", "selected_value", "selected_option_id"))
+        # سقف و مقدار گزینه‌ها از بسته‌ی کش‌شده‌ی فرم؛ بدون کوئری برای هر آیتم
+        max_by_criterion = bundle.max_by_criterion()
+        required_ids = {c.id for c in bundle.criteria if c.is_required}
+        missing = {cid for cid, *_ in items if cid and cid not in max_by_criterion}
+        if missing:
+            extra = criterion_max_values(criterion_ids=missing)
+            max_by_criterion.update(extra)
+            required_ids.update(extra)
+        option_values = {o.id: o.value for c in bundle.criteria for o in c.options}
+
+        rows = []
+        required = filled = 0
+        for cid, weight, selected_value, option_id in items:
+            option_value = option_values.get(option_id) if option_id else None
+            if option_id and option_value is None:
+                option_value = FormOption.objects.filter(pk=option_id).values_list("value", flat=True).first()
+            rows.append(ItemRow(cid, weight, selected_value, option_value))
+            # آیتم بدون گزینه → اجباری نیست
+            if cid in required_ids:
+                required += 1
+                filled += option_id is not None
+        self.final_score, self.max_score = score_items(rows, max_by_criterion)
+        self.required_items, self.filled_items = required, filled
+        self.save(update_fields=["final_score", "max_score", "required_items", "filled_items"])
 
     def is_complete(self):
         """
         فقط آیتم‌هایی که criterion با options دارند اجباری‌اند.
         آیتم‌های توضیحی یا بدون گزینه نمره‌دار محسوب نمی‌شوند.
+        از شمارنده‌های required_items / filled_items؛ بدون کوئری.
         """
-        items = (
-            self.items
-            .select_related("criterion")
-            .prefetch_related("criterion__options")
-        )
-        required = 0
-        filled = 0
-        for it in items:
-            has_options = it.criterion and it.criterion.options.exists()
-            if not has_options:
-                continue  # آیتم بدون گزینه → اجباری نیست
+        return self.required_items > 0 and self.filled_items == self.required_items
 
-            required += 1
-
-            if it.selected_option_id is not None:
-                filled += 1
-
-        return required > 0 and filled == required
+    @property
+    def progress_percent(self) -> int:
+        if not self.required_items:
+            return 0
+        return round(100 * self.filled_items / self.required_items)
 
     def months_label(self):
         """تعداد ماه‌ها به صورت دقیق (۳، ۶، ۹، ۱۲)"""
@@ -558,7 +670,7 @@ class Evaluation(models.Model):
 
     @property
     def has_progress(self):
-        return self.items.filter(selected_option__isnull=False).exists()
+        return self.filled_items > 0
 
     is_archived = models.BooleanField(default=False)
     archived_at = models.DateTimeField(null=True, blank=True)
@@ -570,6 +682,8 @@ class Evaluation(models.Model):
             # (اختیاری) اگر status اضافه کنی: self.status = "expired"
             self.archived_at = timezone.now()
             self.save(update_fields=["is_archived", "archived_at"])  # + ["status"] اگر داری
+            from core.approval.audit import ARCHIVED, record_transition
+            record_transition(self, self.status, ARCHIVED)
 
     @property
     def period_label(self):
@@ -652,3 +766,140 @@ class EvaluationSignature(models.Model):
 
     def __str__(self):
         return f"Evaluation {self.evaluation_id} - {self.role}"
+#-------------------------------------------------------------------
+
+class EvaluationTransition(models.Model):
+    """
+    لاگ فقط‌افزودنی تغییر وضعیت ارزیابی‌ها (برای گزارش «زمان ماندن در هر مرحله»).
+    stage_started_at = زمان ورود به from_status (گذار قبلی یا ساخت ارزیابی)؛
+    پس مدت ماندن در مرحله = created_at - stage_started_at، بدون بازسازی تاریخچه.
+    با core.approval.audit به‌صورت گروهی (bulk_create) نوشته می‌شود.
+    """
+    ARCHIVED = "archived"  # شبه‌وضعیت برای is_archived=True
+
+    evaluation = models.ForeignKey("Evaluation", on_delete=models.CASCADE, related_name="transitions")
+    from_status = models.CharField(max_length=32, blank=True, default="")
+    to_status = models.CharField(max_length=32)
+    actor = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    role = models.CharField(max_length=20, blank=True, default="")
+    unit_code = models.CharField(max_length=10, blank=True, default="")
+    stage_started_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["created_at", "id"]
+        indexes = [
+            models.Index(fields=["created_at"], name="evtrans_created_idx"),
+            models.Index(fields=["unit_code", "created_at"], name="evtrans_unit_created_idx"),
+            models.Index(fields=["evaluation", "created_at"], name="evtrans_eval_created_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None and not self._state.adding:
+            raise ValueError("EvaluationTransition فقط‌افزودنی است و ویرایش نمی‌شود.")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"Evaluation {self.evaluation_id}: {self.from_status or '-'} → {self.to_status}"
+#-------------------------------------------------------------------
+
+class EvaluationStat(models.Model):
+    """
+    جدول تجمیعی (rollup) آمار ارزیابی‌ها برای گزارش‌ها.
+    هر ردیف یک «سطل» است: واحد/فرم/سال/طول بازه/وضعیت/آرشیو.
+    year و period_months برای ارزیابی‌های بدون بازه برابر 0 هستند.
+    """
+    organization = models.ForeignKey(
+        "Organization", on_delete=models.CASCADE, null=True, blank=True,
+        related_name="evaluation_stats"
+    )
+    unit_code = models.CharField(max_length=10, blank=True, default="")
+    template = models.ForeignKey("FormTemplate", on_delete=models.CASCADE, related_name="stats")
+    year = models.PositiveIntegerField(default=0)
+    period_months = models.PositiveSmallIntegerField(default=0)
+    status = models.CharField(max_length=16)
+    is_archived = models.BooleanField(default=False)
+
+    count = models.PositiveIntegerField(default=0)
+    # تعداد ارزیابی‌های دارای امتیاز (max_score > 0) و جمع درصدهایشان
+    scored_count = models.PositiveIntegerField(default=0)
+    pct_sum = models.FloatField(default=0)
+    final_score_sum = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    max_score_sum = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["unit_code", "template", "year", "period_months", "status", "is_archived"],
+                name="uniq_evaluation_stat_bucket",
+            )
+        ]
+        indexes = [
+            models.Index(fields=["organization", "year"]),
+        ]
+
+    def __str__(self):
+        return f"{self.unit_code} | {self.template_id} | {self.year}/{self.period_months}m | {self.status}: {self.count}"
+#-------------------------------------------------------------------
+
+def job_results_storage():
+    """محل فایل‌های خروجی BackgroundJob (settings.JOB_RESULTS_ROOT)"""
+    return FileSystemStorage(location=settings.JOB_RESULTS_ROOT)
+
+
+class BackgroundJob(models.Model):
+    """
+    صف کارهای سنگین (خروجی CSV/PDF، چاپ PDF فرم) روی همین دیتابیس.
+    worker (دستور run_job_worker) ردیف‌های queued را با SKIP LOCKED برمی‌دارد
+    و فایل خروجی را در result_file (روی دیسک، نه در دیتابیس) ذخیره می‌کند.
+    """
+    class Status(models.TextChoices):
+        QUEUED = "queued", "در صف"
+        RUNNING = "running", "در حال اجرا"
+        DONE = "done", "انجام شد"
+        FAILED = "failed", "ناموفق"
+
+    kind = models.CharField(max_length=64)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.QUEUED)
+
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True, default="")
+    error = models.TextField(blank=True, default="")
+
+    result_name = models.CharField(max_length=200, blank=True, default="")
+    result_content_type = models.CharField(max_length=100, blank=True, default="")
+    result_file = models.FileField(
+        upload_to="%Y/%m/", storage=job_results_storage, max_length=255, blank=True, editable=False
+    )
+
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name="background_jobs"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # آخرین علامت حیات worker؛ اجرای رهاشده بعد از مهلت دوباره در صف می‌رود
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["status", "created_at"], name="bgjob_status_created_idx"),
+        ]
+
+    @property
+    def percent(self) -> int:
+        if self.status == self.Status.DONE:
+            return 100
+        return int(100 * self.progress / self.total) if self.total else 0
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
@@ -0,0 +1,77 @@
+# core/services/dashboard.py
+"""
+شمارنده‌های داشبورد ارزیاب در یک کوئری.
+
+به‌جای ده‌ها Evaluation.objects.filter(...).count()، همه‌ی شمارنده‌ها با یک
+aggregate(Count("id", filter=Q(...))) روی جدول ارزیابی‌ها محاسبه می‌شوند.
+"""
+from typing import Dict, Optional
+
+from django.db.models import Count, Exists, OuterRef, Q
+
+from core.constants import WorkflowStatus
+from core.services.org_scope import scope_filter
+from core.models import Evaluation, EvaluationSignature
+
+REJECTED_STATUSES = [
+    WorkflowStatus.HR_REJECTED,
+    WorkflowStatus.MANAGER_REJECTED,
+    WorkflowStatus.FACTORY_REJECTED,
+]
+
+
+def _signed_by(role: str) -> Exists:
+    """آیا امضای نقش role روی این ارزیابی ثبت شده است"""
+    return Exists(
+        EvaluationSignature.objects.filter(
+            evaluation=OuterRef("pk"), role=role, signed_at__isnull=False
+        )
+    )
+
+
+def _scope_filter(user) -> Optional[Q]:
+    """
+    شرط scope_queryset به‌صورت Q برای استفاده داخل aggregate.
+    None یعنی کاربر هیچ ارزیابی‌ای نمی‌بیند.
+    """
+    return scope_filter(Evaluation, user)
+
+
+def dashboard_counters(user) -> Dict[str, int]:
+    """همه‌ی شمارنده‌های dashboard_view با یک کوئری"""
+    active = Q(is_archived=False)
+    mine = Q(evaluator=user)
+
+    counters = {
+        "count_draft": Count("id", filter=mine & active & Q(status=Evaluation.Status.DRAFT)),
+        "count_hr": Count("id", filter=active & Q(status=WorkflowStatus.HR_REVIEW)),
+        "count_manager": Count("id", filter=active & Q(status=WorkflowStatus.MANAGER_REVIEW)),
+        "count_factory": Count("id", filter=active & Q(status=WorkflowStatus.FACTORY_REVIEW)),
+        "count_final": Count("id", filter=active & Q(status=WorkflowStatus.FINAL_APPROVED)),
+        "count_approved": Count("id", filter=mine & active & Q(status=Evaluation.Status.APPROVED)),
+        "count_rejected": Count("id", filter=active & Q(status__in=REJECTED_STATUSES)),
+        "count_archived": Count("id", filter=mine & Q(is_archived=True)),
+        "hr_pending_count": Count(
+            "id", filter=active & Q(status=Evaluation.Status.SUBMITTED) & ~Q(_signed_by("hr"))
+        ),
+        "factory_pending_count": Count(
+            "id", filter=active & Q(status=Evaluation.Status.FACTORY_REVIEW) & ~Q(_signed_by("factory"))
+        ),
+    }
+
+    scope = _scope_filter(user)
+    if scope is not None:
+        counters["count_submitted"] = Count(
+            "id", filter=scope & active & Q(status=Evaluation.Status.SUBMITTED)
+        )
+
+    # فقط ردیف‌هایی که در حداقل یک شمارنده‌اند: ارزیابی‌های خودم یا آرشیونشده‌ها
+    result = Evaluation.objects.filter(mine | active).aggregate(**counters)
+    result.setdefault("count_submitted", 0)
+    return result
+
+
+__all__ = [
+    "REJECTED_STATUSES",
+    "dashboard_counters",
+]
@@ -0,0 +1,164 @@
+# core/services/dashboard_cache.py
+"""
+کش context داشبورد ارزیاب برای هر کاربر.
+
+کلید = کاربر + فرم + بازه + روز + «نسل» سراسری + «نسل» همان کاربر.
+- شمارنده‌ها (dashboard_counters) ورودی جدای خودشان را دارند با «نسل شمارنده‌ها»؛
+  چون بین همه مشترک‌اند هر تغییر وضعیت آن را عوض می‌کند (بازسازی = یک کوئری).
+- تغییر وضعیت یک ارزیابی فقط نسل ارزیاب، انجام‌دهنده و تأییدکننده‌های سازمان همان
+  ارزیابی (HR / مدیر / مدیر کارخانه که کارت‌های گردش‌کارشان عوض می‌شود) را عوض می‌کند.
+- تغییرات گروهی (evaluation=None) و ساختاری نسل سراسری را عوض می‌کنند.
+- تغییرات محتوایی (ذخیره‌ی موقت و ...) فقط نسل ارزیاب همان فرم را عوض می‌کنند.
+ورودی‌های قدیمی پاک نمی‌شوند؛ فقط دیگر خوانده نمی‌شوند و با timeout منقضی می‌شوند.
+لیست کارت‌ها حداکثر DASHBOARD_CARD_LIMIT ردیف در کش نگه می‌دارند.
+To-Do (افرادی که هنوز ارزیابی ندارند) در کش نیست: به ارزیاب‌های دیگر همان نفر وابسته است.
+"""
+import time
+from typing import Callable, Iterable, Set
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Q
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.approval.role_resolver import MANAGER_JOB_ROLES
+from core.constants import Settings
+from core.signals import evaluation_changed
+
+DASHBOARD_CACHE_ALIAS = getattr(settings, "DASHBOARD_CACHE_ALIAS", "default")
+DASHBOARD_CACHE_TIMEOUT = getattr(settings, "DASHBOARD_CACHE_TIMEOUT", 300)
+DASHBOARD_CARD_LIMIT = getattr(settings, "DASHBOARD_CARD_LIMIT", 50)
+
+# نقش‌های شغلی که کارت‌های گردش‌کار (HR / مدیر / مدیر کارخانه) را می‌بینند؛ HR همان 901 واحد HR است
+APPROVER_JOB_ROLES = frozenset(MANAGER_JOB_ROLES | {Settings.ROLE_FACTORY_MANAGER})
+
+_GLOBAL_GEN_KEY = "dashboard:gen"
+_COUNTERS_GEN_KEY = "dashboard:counters:gen"
+
+
+def _cache():
+    return caches[DASHBOARD_CACHE_ALIAS]
+
+
+def _user_gen_key(user_id) -> str:
+    return f"dashboard:gen:user:{user_id}"
+
+
+def _new_generation() -> int:
+    # بدون incr تا در backendهای بدون incr اتمیک (file) هم همیشه مقدار تازه باشد
+    return time.time_ns()
+
+
+def invalidate_all_dashboards() -> None:
+    _cache().set(_GLOBAL_GEN_KEY, _new_generation(), None)
+
+
+def invalidate_user_dashboard(user_id) -> None:
+    if user_id:
+        _cache().set(_user_gen_key(user_id), _new_generation(), None)
+
+
+def invalidate_user_dashboards(user_ids: Iterable) -> None:
+    gen = _new_generation()
+    _cache().set_many({_user_gen_key(user_id): gen for user_id in set(user_ids) if user_id}, None)
+
+
+def invalidate_dashboard_counters() -> None:
+    _cache().set(_COUNTERS_GEN_KEY, _new_generation(), None)
+
+
+def approver_user_ids(unit_codes: Iterable[str]) -> Set[int]:
+    """
+    کاربرانی با نقش تأیید که سازمان این واحدها در محدوده‌شان است
+    (همان قواعد org_scope: پروفایل سازمان، گروه واحدهای مشترک یا دفتر مرکزی holding)
+    """
+    from core.models import EmployeeProfile, Unit
+
+    codes = {c for c in unit_codes if c}
+    if not codes:
+        return set()
+    orgs = set(Unit.objects.filter(unit_code__in=codes).values_list("organization_id", "organization__holding_id"))
+    org_ids = {org_id for org_id, _ in orgs if org_id}
+    holding_ids = {holding_id for _, holding_id in orgs if holding_id}
+    if not org_ids:
+        return set()
+    in_scope = (
+        Q(organization_id__in=org_ids)
+        | Q(department_group__factories__in=org_ids)
+        | Q(holding_id__in=holding_ids, organization__isnull=True, department_group__isnull=True)
+    )
+    return set(
+        EmployeeProfile.objects.filter(in_scope, job_role__code__in=APPROVER_JOB_ROLES)
+        .values_list("user_id", flat=True).distinct()
+    )
+
+
+def _dashboard_key(user_id, form_code, months) -> str:
+    cache = _cache()
+    gens = cache.get_many([_GLOBAL_GEN_KEY, _user_gen_key(user_id)])
+    return ":".join(str(p) for p in (
+        "dashboard", user_id, form_code or "-", months, timezone.localdate().isoformat(),
+        gens.get(_GLOBAL_GEN_KEY, 0), gens.get(_user_gen_key(user_id), 0),
+    ))
+
+
+def cached_dashboard_counters(user, build: Callable[[], dict]) -> dict:
+    """شمارنده‌های داشبورد از کش، یا build() (یک کوئری) و ذخیره"""
+    cache = _cache()
+    gens = cache.get_many([_GLOBAL_GEN_KEY, _COUNTERS_GEN_KEY, _user_gen_key(user.pk)])
+    key = ":".join(str(p) for p in (
+        "dashboard:counters", user.pk,
+        gens.get(_GLOBAL_GEN_KEY, 0), gens.get(_COUNTERS_GEN_KEY, 0), gens.get(_user_gen_key(user.pk), 0),
+    ))
+    counters = cache.get(key)
+    if counters is None:
+        counters = build()
+        cache.set(key, counters, DASHBOARD_CACHE_TIMEOUT)
+    return dict(counters)
+
+
+def cached_dashboard_context(user, form_code, months, build: Callable[[], dict]) -> dict:
+    """context داشبورد از کش، یا build() و ذخیره. build باید فقط مقادیر pickle‌پذیر برگرداند."""
+    key = _dashboard_key(user.pk, form_code, months)
+    cache = _cache()
+    context = cache.get(key)
+    if context is None:
+        context = build()
+        cache.set(key, context, DASHBOARD_CACHE_TIMEOUT)
+    return dict(context)
+
+
+@receiver(evaluation_changed, dispatch_uid="dashboard_cache_invalidate")
+def _on_evaluation_changed(sender, evaluation=None, user=None, status_changed=True, evaluator_ids=(), **kwargs):
+    # بعد از commit؛ وگرنه درخواست هم‌زمان ممکن است داده‌ی قدیمی را با نسل جدید کش کند
+    if status_changed and evaluation is None:
+        # تغییر گروهی: ارزیابی‌ها و تأییدکننده‌های درگیر معلوم نیستند
+        transaction.on_commit(invalidate_all_dashboards)
+        return
+    ids = set(evaluator_ids or ())
+    if evaluation is not None:
+        ids.add(evaluation.evaluator_id)
+    if user is not None:
+        ids.add(user.pk)
+    unit_code = evaluation.unit_code if status_changed else None
+
+    def invalidate():
+        if status_changed:
+            invalidate_dashboard_counters()
+            ids.update(approver_user_ids([unit_code]))
+        invalidate_user_dashboards(ids)
+    transaction.on_commit(invalidate)
+
+
+__all__ = [
+    "DASHBOARD_CARD_LIMIT",
+    "approver_user_ids",
+    "cached_dashboard_context",
+    "cached_dashboard_counters",
+    "invalidate_all_dashboards",
+    "invalidate_dashboard_counters",
+    "invalidate_user_dashboard",
+    "invalidate_user_dashboards",
+]
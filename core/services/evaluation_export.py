@@ -0,0 +1,346 @@
+# core/services/evaluation_export.py
+"""
+خروجی گرفتن از ارزیابی‌ها (CSV / PDF) بدون کوئری جداگانه برای هر ردیف.
+
+- ارزیابی‌ها با .iterator(chunk_size) پیمایش می‌شوند (حافظه‌ی ثابت).
+- username هر chunk با یک کوئری روی EmployeeProfile (personnel_code / user_id) پیدا می‌شود.
+- خروجی CSV به‌صورت generator است تا با StreamingHttpResponse ارسال شود.
+- PDF به جدول‌های هم‌اندازه‌ی یک صفحه شکسته می‌شود و در فایل موقت نوشته می‌شود؛
+  حالت چندواحدی برای هر واحد یک PDF داخل یک ZIP می‌سازد.
+"""
+import csv
+import tempfile
+import zipfile
+from itertools import groupby, islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.db.models import Q
+from django.http import Http404
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from core.mixins.organization_scope import scope_queryset
+from core.models import EmployeeProfile, Evaluation, Unit
+
+EXPORT_HEADER = ["Employee Code", "Username", "Status", "Final Score", "Max Score", "Percent", "Period Start"]
+EXPORT_FIELDS = ("id", "unit_code", "employee_id", "status", "final_score", "max_score", "period_start")
+DEFAULT_CHUNK_SIZE = 2000
+
+# تعداد ردیف هر جدول PDF (تقریباً یک صفحه‌ی A4)
+PDF_ROWS_PER_TABLE = 40
+PDF_COL_WIDTHS = [80, 80, 60, 70, 70, 60, 80]
+# تا این اندازه در حافظه، بزرگ‌تر روی دیسک
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+
+def export_queryset(user, params):
+    """
+    QuerySet گزارش یک واحد (mode=unit یا individual) از روی پارامترهای GET.
+    خروجی: (qs, unit, mode, subtitle)
+    ValueError برای پارامتر ناقص، Http404 برای واحد/کارمند ناموجود.
+    """
+    mode = params.get("mode", "unit")
+    unit_id = params.get("unit_id")
+    if not unit_id:
+        raise ValueError("unit_id required")
+
+    unit = Unit.objects.filter(id=unit_id).first()
+    if not unit:
+        raise Http404("unit not found")
+
+    employee_filter = {}
+    subtitle = f"Unit {unit.unit_code or '—'}"
+    if mode == "individual":
+        emp_id = params.get("employee_id")
+        if not emp_id:
+            raise ValueError("employee_id required")
+        ep = EmployeeProfile.objects.select_related("user").filter(id=emp_id).first()
+        if not ep:
+            raise Http404("employee not found")
+        candidate_ids = []
+        if ep.personnel_code: candidate_ids.append(ep.personnel_code.strip())
+        if ep.user_id: candidate_ids.append(str(ep.user_id))
+        employee_filter["employee_id__in"] = candidate_ids
+        subtitle += f" – Employee {ep.user.username if ep.user else (ep.personnel_code or '')}"
+
+    qs = (Evaluation.objects
+          .filter(unit_code=(unit.unit_code or "").strip(), **employee_filter)
+          .order_by("employee_id", "period_start"))
+    return scope_queryset(qs, user=user), unit, mode, subtitle
+
+
+def units_export_queryset(user, org_id=None):
+    """ارزیابی‌های همه‌ی واحدهای مجاز (اختیاری: یک سازمان)، مرتب بر اساس unit_code"""
+    units = scope_queryset(Unit.objects.exclude(unit_code__isnull=True), user=user)
+    if org_id:
+        units = units.filter(organization_id=org_id)
+    unit_codes = [c.strip() for c in units.values_list("unit_code", flat=True) if c]
+
+    qs = (Evaluation.objects
+          .filter(unit_code__in=unit_codes)
+          .order_by("unit_code", "employee_id", "period_start"))
+    return scope_queryset(qs, user=user)
+
+
+def username_map(employee_ids: Iterable[str]) -> Dict[str, str]:
+    """
+    employee_id → username با یک کوئری.
+    مثل منطق قبلی: اول personnel_code، اگر نبود و عددی بود user_id.
+    """
+    codes = {(e or "").strip() for e in employee_ids if e}
+    codes.discard("")
+    if not codes:
+        return {}
+
+    user_ids = {int(c) for c in codes if c.isdigit()}
+    rows = (
+        EmployeeProfile.objects
+        .filter(Q(personnel_code__in=codes) | Q(user_id__in=user_ids))
+        .exclude(user__isnull=True)
+        .values_list("personnel_code", "user_id", "user__username")
+    )
+
+    by_code: Dict[str, str] = {}
+    by_user: Dict[int, str] = {}
+    for code, user_id, username in rows:
+        if code:
+            by_code.setdefault(code, username)
+        by_user.setdefault(user_id, username)
+
+    result = {}
+    for c in codes:
+        if c in by_code:
+            result[c] = by_code[c]
+        elif c.isdigit() and int(c) in by_user:
+            result[c] = by_user[int(c)]
+    return result
+
+
+def iter_with_usernames(qs, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Tuple[Evaluation, str]]:
+    """(ارزیابی، username) برای هر ردیف؛ یک کوئری EmployeeProfile برای هر chunk"""
+    rows = qs.only(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    while True:
+        chunk: List[Evaluation] = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        names = username_map(ev.employee_id for ev in chunk)
+        for ev in chunk:
+            yield ev, names.get((ev.employee_id or "").strip(), "")
+
+
+def score_percent(ev):
+    """درصد امتیاز گردشده به دو رقم، یا "" اگر قابل محاسبه نباشد"""
+    if ev.final_score and ev.max_score:
+        try:
+            return round(float(ev.final_score) / float(ev.max_score) * 100.0, 2)
+        except Exception:
+            return ""
+    return ""
+
+
+class _Echo:
+    """شبه‌فایل برای csv.writer که همان خط نوشته‌شده را برمی‌گرداند"""
+    def write(self, value):
+        return value
+
+
+def iter_csv_rows(qs, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+    """خطوط CSV گزارش ارزیابی‌ها (شامل سرستون)"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_HEADER)
+    for ev, username in iter_with_usernames(qs, chunk_size=chunk_size):
+        yield writer.writerow([
+            ev.employee_id or "",
+            username,
+            ev.status or "",
+            ev.final_score or "",
+            ev.max_score or "",
+            score_percent(ev),
+            ev.period_start or "",
+        ])
+
+
+# ---------------------------------------
+# PDF
+# ---------------------------------------
+
+def spooled_file():
+    """فایل موقت: کوچک‌ها در حافظه، بزرگ‌ها روی دیسک"""
+    return tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+
+
+def _pdf_row(ev, username) -> list:
+    percent = score_percent(ev)
+    return [
+        ev.employee_id or "",
+        username,
+        ev.status or "",
+        ev.final_score or "-",
+        ev.max_score or "-",
+        f"{percent}%" if percent != "" else "",
+        str(ev.period_start or ""),
+    ]
+
+
+def _pdf_table(rows: List[list]) -> Table:
+    table = Table([EXPORT_HEADER] + rows, repeatRows=1, hAlign="LEFT", colWidths=PDF_COL_WIDTHS)
+    table.setStyle(TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
+        ("ALIGN", (0, 0), (-1, 0), "CENTER"),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+        ("ALIGN", (0, 1), (-1, -1), "CENTER"),
+        ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.whitesmoke, colors.white]),
+    ]))
+    return table
+
+
+def write_pdf_report(out, pairs: Iterable[Tuple[Evaluation, str]], subtitle: str,
+                     rows_per_table: int = PDF_ROWS_PER_TABLE) -> None:
+    """
+    گزارش PDF در out (فایل/stream).
+    به‌جای یک Table بزرگ، هر rows_per_table ردیف یک جدول جدا می‌شود
+    تا reportlab مجبور به شکستن یک جدول چند هزار ردیفی نشود.
+    """
+    doc = SimpleDocTemplate(out, pagesize=A4, leftMargin=24, rightMargin=24, topMargin=24, bottomMargin=24)
+    styles = getSampleStyleSheet()
+    story = [
+        Paragraph("<b>Performance Evaluation Report</b>", styles["Title"]),
+        Paragraph(subtitle, styles["Heading3"]),
+        Spacer(1, 10),
+    ]
+
+    rows = (_pdf_row(ev, username) for ev, username in pairs)
+    tables = 0
+    while True:
+        batch = list(islice(rows, rows_per_table))
+        if not batch and tables:
+            break
+        story.append(_pdf_table(batch))
+        tables += 1
+        if len(batch) < rows_per_table:
+            break
+
+    doc.build(story)
+
+
+def _counted(items, on_row: Callable[[int], None]):
+    for n, item in enumerate(items, 1):
+        yield item
+        on_row(n)
+
+
+def write_units_zip(out, qs, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                    on_row: Optional[Callable[[int], None]] = None) -> int:
+    """
+    یک PDF برای هر unit_code داخل ZIP.
+    qs باید بر اساس unit_code مرتب باشد؛ کل ردیف‌ها با یک پیمایش خوانده می‌شوند.
+    on_row(n): بعد از هر ردیف (برای گزارش پیشرفت).
+    خروجی: تعداد فایل‌های PDF.
+    """
+    count = 0
+    pairs = iter_with_usernames(qs, chunk_size=chunk_size)
+    if on_row:
+        pairs = _counted(pairs, on_row)
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for unit_code, group in groupby(pairs, key=lambda pair: pair[0].unit_code or ""):
+            title = f"Unit {unit_code or '—'}"
+            with spooled_file() as pdf:
+                write_pdf_report(pdf, group, title)
+                pdf.seek(0)
+                with zf.open(f"evaluation_report_{unit_code or 'unit'}.pdf", "w") as entry:
+                    for block in iter(lambda: pdf.read(64 * 1024), b""):
+                        entry.write(block)
+            count += 1
+    return count
+
+
+def print_form_context(user, params) -> dict:
+    """
+    context قالب admin/reports/print_form.html: آخرین فرم تأییدشده‌ی کارمند
+    (اختیاری: سال و طول بازه). ValueError/Http404 مثل ویوی چاپ.
+    """
+    employee_id = params.get("employee_id")
+    year = params.get("year")
+    period = params.get("period")
+
+    if not employee_id:
+        raise ValueError("پارامتر کارمند الزامی است")
+
+    emp = EmployeeProfile.objects.select_related("user", "unit").filter(id=employee_id).first()
+    if not emp:
+        raise Http404("کارمند یافت نشد")
+
+    filters = {"status": Evaluation.Status.APPROVED, "employee_id": emp.personnel_code}
+    if year:
+        filters["period_start__year"] = int(year)
+    if period and str(period).isdigit():
+        filters["period_months"] = int(period)
+
+    evals = scope_queryset(Evaluation.objects.filter(**filters).order_by("-period_start"), user=user)
+    ev = evals.first()
+    if not ev:
+        raise Http404("هیچ ارزیابی یافت نشد")
+
+    # آیتم‌های فرم از snapshot داخلی مدل
+    items = list(
+        ev.items.select_related("criterion", "selected_option").values(
+            "criterion_order",
+            "criterion_title",
+            "selected_value",
+            "earned_points",
+            "selected_option",
+            "selected_option__label",
+        )
+    )
+
+    return {
+        "title": "فرم ارزیابی عملکرد پرسنل",
+        "employee": emp,
+        "unit_code": ev.unit_code or (emp.unit.unit_code if emp.unit else "-"),
+        "manager_name": ev.manager_name or "—",
+        "year": year or (ev.period_start.year if ev.period_start else ""),
+        "period": ev.period_label if hasattr(ev, "period_label") else "",
+        "items": items,
+        "total_score": ev.final_score or 0,
+        "max_score": ev.max_score or 0,
+        "total_percent": (
+            round(100 * float(ev.final_score) / float(ev.max_score), 2)
+            if ev.final_score and ev.max_score
+            else None
+        ),
+    }
+
+
+def write_print_form_pdf(out, user, params) -> str:
+    """
+    نسخه‌ی PDF همان فرم چاپی (xhtml2pdf) در out.
+    خروجی: نام فایل.
+    """
+    from django.template.loader import get_template
+    from io import BytesIO
+    from xhtml2pdf import pisa
+
+    context = print_form_context(user, params)
+    html = get_template("admin/reports/print_form.html").render(context)
+    pisa.CreatePDF(BytesIO(html.encode("utf-8")), dest=out, encoding="utf-8")
+    return f"evaluation_{context['employee'].personnel_code}.pdf"
+
+
+__all__ = [
+    "EXPORT_HEADER",
+    "export_queryset",
+    "units_export_queryset",
+    "username_map",
+    "iter_with_usernames",
+    "score_percent",
+    "iter_csv_rows",
+    "spooled_file",
+    "write_pdf_report",
+    "write_units_zip",
+    "print_form_context",
+    "write_print_form_pdf",
+]
@@ -0,0 +1,186 @@
+# core/services/evaluation_form.py
+"""
+ذخیره‌ی فرم ارزیابی (انتخاب گزینه‌ها) با تعداد کوئری ثابت.
+
+به‌جای criterion.options.filter(...).first() و it.save() برای هر آیتم:
+- آیتم‌ها با یک کوئری خوانده می‌شوند؛ گزینه‌های معتبر از بسته‌ی کش‌شده‌ی فرم (template_bundle)
+- انتخاب‌های ارسالی در حافظه اعتبارسنجی می‌شوند (گزینه باید مال همان معیار باشد)
+- فقط آیتم‌های تغییر کرده با یک bulk_update نوشته می‌شوند
+- امتیاز و شمارنده‌های پیشرفت یک بار از همان داده‌ها محاسبه و همراه updated_at ذخیره می‌شوند
+- هر ذخیره‌ی دارای تغییر Evaluation.revision را یک واحد جلو می‌برد (قفل خوش‌بینانه‌ی autosave)
+"""
+from typing import Dict, List, Mapping, Optional, Sequence
+
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import Evaluation, EvaluationItem, FormOption
+from core.services.scoring import ItemRow, max_values_from_options, score_items
+from core.services.template_bundle import get_bundle
+
+ITEM_FIELD_PREFIX = "item_"
+
+ITEM_CHOICE_FIELDS = ["selected_option", "selected_label", "selected_value", "earned_points"]
+
+
+def load_items(ev: Evaluation) -> List[EvaluationItem]:
+    return list(
+        ev.items.only(
+            "id", "evaluation_id", "criterion_id", "weight", "selected_option_id", "selected_value",
+        ).order_by("criterion_order", "id")
+    )
+
+
+def load_options(criterion_ids) -> Dict[int, List[FormOption]]:
+    """criterion_id → گزینه‌ها، با یک کوئری"""
+    options: Dict[int, List[FormOption]] = {}
+    rows = (
+        FormOption.objects.filter(criterion_id__in=set(criterion_ids))
+        .only("id", "criterion_id", "label", "value")
+        .order_by("criterion_id", "order")
+    )
+    for opt in rows:
+        options.setdefault(opt.criterion_id, []).append(opt)
+    return options
+
+
+def item_options(ev: Evaluation, items: List[EvaluationItem]) -> Dict[int, Sequence]:
+    """
+    گزینه‌های معیارهای آیتم‌ها از بسته‌ی کش‌شده‌ی فرم؛
+    فقط معیارهایی که در بسته نیستند (داده‌ی ناسازگار) از دیتابیس خوانده می‌شوند.
+    """
+    options = dict(get_bundle(ev.template).options_by_criterion())
+    missing = {it.criterion_id for it in items if it.criterion_id and it.criterion_id not in options}
+    if missing:
+        options.update(load_options(missing))
+    return options
+
+
+def _posted_option_id(data: Mapping, item_id: int) -> Optional[int]:
+    raw = data.get(f"{ITEM_FIELD_PREFIX}{item_id}")
+    if not raw:
+        return None
+    try:
+        return int(raw)
+    except (TypeError, ValueError):
+        return None
+
+
+def apply_choices(items: List[EvaluationItem], options: Dict[int, Sequence],
+                  data: Mapping) -> List[EvaluationItem]:
+    """
+    انتخاب‌های ارسالی را روی آیتم‌ها (در حافظه) اعمال می‌کند و آیتم‌های تغییر کرده را برمی‌گرداند.
+    فیلد خالی یعنی «دست نزن»؛ گزینه‌ی نامعتبر یا متعلق به معیار دیگر نادیده گرفته می‌شود.
+    """
+    changed = []
+    for it in items:
+        opt_id = _posted_option_id(data, it.id)
+        if opt_id is None or opt_id == it.selected_option_id:
+            continue
+        opt = next((o for o in options.get(it.criterion_id, ()) if o.id == opt_id), None)
+        if opt is None:
+            continue
+        it.selected_option_id = opt.id
+        it.selected_label = opt.label
+        it.selected_value = opt.value
+        it.earned_points = round(float(opt.value) * float(it.weight or 1), 2)
+        changed.append(it)
+    return changed
+
+
+def compute_scores(items: List[EvaluationItem], options: Dict[int, Sequence]):
+    """(final_score, max_score) از آیتم‌ها و گزینه‌های خوانده‌شده؛ بدون کوئری"""
+    option_values = {o.id: o.value for opts in options.values() for o in opts}
+    return score_items(
+        (
+            ItemRow(it.criterion_id, it.weight, it.selected_value, option_values.get(it.selected_option_id))
+            for it in items
+        ),
+        max_values_from_options(options),
+    )
+
+
+def count_progress(items: List[EvaluationItem], options: Dict[int, Sequence]):
+    """(required_items, filled_items): فقط آیتم‌های دارای گزینه اجباری‌اند"""
+    required = [it for it in items if it.criterion_id and options.get(it.criterion_id)]
+    return len(required), sum(1 for it in required if it.selected_option_id is not None)
+
+
+class StaleRevision(Exception):
+    """نسخه‌ی کلاینت از نسخه‌ی ذخیره‌شده عقب‌تر است (فرم در تب/درخواست دیگری ذخیره شده)"""
+
+    def __init__(self, current: int):
+        super().__init__(f"stale revision (current={current})")
+        self.current = current
+
+
+class NotDraft(Exception):
+    """فرم دیگر پیش‌نویس باز نیست (ارسال، تأیید یا آرشیو شده است)"""
+
+
+def _save_choices(ev: Evaluation, data: Mapping, revision: Optional[int] = None) -> int:
+    with transaction.atomic():
+        # قفل ردیف: دو ذخیره‌ی هم‌زمان یک فرم (یا ذخیره و ارسال/تأیید/آرشیو) پشت سر هم اجرا می‌شوند
+        current, status, is_archived = (
+            Evaluation.objects.select_for_update()
+            .values_list("revision", "status", "is_archived")
+            .get(pk=ev.pk)
+        )
+        # autosave فقط روی پیش‌نویس باز؛ وضعیت زیر قفل دوباره بررسی می‌شود
+        if revision is not None and (status != Evaluation.Status.DRAFT or is_archived):
+            raise NotDraft()
+        if revision is not None and revision != current:
+            raise StaleRevision(current)
+        ev.revision = current
+
+        items = load_items(ev)
+        options = item_options(ev, items)
+        changed = apply_choices(items, options, data)
+        if not changed and revision is not None:
+            return 0  # autosave بی‌تغییر → بدون نوشتن
+        if changed:
+            EvaluationItem.objects.bulk_update(changed, ITEM_CHOICE_FIELDS, batch_size=500)
+            ev.revision = current + 1
+
+        ev.final_score, ev.max_score = compute_scores(items, options)
+        ev.required_items, ev.filled_items = count_progress(items, options)
+        ev.updated_at = timezone.now()
+        ev.save(update_fields=[
+            "final_score", "max_score", "required_items", "filled_items", "revision", "updated_at",
+        ])
+    return len(changed)
+
+
+def save_item_choices(ev: Evaluation, data: Mapping) -> int:
+    """
+    انتخاب‌های فرم (item_<id>) را ذخیره و امتیاز را یک بار محاسبه می‌کند.
+    تعداد آیتم‌های تغییر کرده را برمی‌گرداند.
+    """
+    return _save_choices(ev, data)
+
+
+def autosave_choices(ev: Evaluation, revision: int, choices: Mapping) -> int:
+    """
+    ذخیره‌ی خودکار: فقط انتخاب‌های تغییر کرده ({item_id: option_id}) با نسخه‌ی کلاینت.
+    - فرمی که پیش‌نویس باز نیست → NotDraft
+    - نسخه‌ی قدیمی → StaleRevision
+    - بدون تغییر واقعی → هیچ نوشتنی انجام نمی‌شود
+    تعداد آیتم‌های تغییر کرده را برمی‌گرداند؛ ev.revision نسخه‌ی جدید است.
+    """
+    data = {f"{ITEM_FIELD_PREFIX}{item_id}": option_id for item_id, option_id in choices.items()}
+    return _save_choices(ev, data, revision=revision)
+
+
+__all__ = [
+    "ITEM_FIELD_PREFIX",
+    "load_items",
+    "load_options",
+    "item_options",
+    "apply_choices",
+    "compute_scores",
+    "count_progress",
+    "StaleRevision",
+    "NotDraft",
+    "save_item_choices",
+    "autosave_choices",
+]
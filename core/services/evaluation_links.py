@@ -0,0 +1,224 @@
+# core/services/evaluation_links.py
+"""
+ساخت مجموعه‌ای (set-based) EvaluationLinkهای یک سازمان.
+
+- desired_links: مجموعه‌ی مطلوب لینک‌ها در حافظه، با چند کوئری values_list
+- diff_links: مقایسه با لینک‌های موجود → ایجاد / تغییر ارزیاب / حذف
+- apply_link_diff: اعمال با bulk_create، bulk_update و delete گروهی (بدون سیگنال؛
+  پس نسخه‌ی گراف سازمانی دستی جلو می‌رود)
+- sync_primary_supervisors: direct_supervisor هر نفر = نزدیک‌ترین ارزیابش، با یک کوئری لینک
+
+کلید منطقی هر لینک (subordinate, link_type) است؛ هر نفر از هر نوع یک ارزیاب دارد.
+"""
+from collections import Counter, defaultdict, namedtuple
+from typing import Dict, Iterable, List, Set, Tuple
+
+from django.db import transaction
+
+from core.models import EmployeeProfile, EvaluationLink, ReportingLine, Unit
+from core.services.org_graph import bump_org_graph
+
+LinkType = EvaluationLink.LinkType
+
+# ترتیب ساخت؛ ORG_HEAD آخر است چون fallback به بقیه نگاه می‌کند
+LINK_TYPE_ORDER = (
+    LinkType.DIRECT_SUPERVISOR,
+    LinkType.UNIT_MANAGER,
+    LinkType.SECTION_HEAD,
+    LinkType.SUPERVISOR,
+    LinkType.ORG_HEAD,
+)
+
+LinkKey = Tuple[int, str]  # (subordinate_id, link_type)
+LinkDiff = namedtuple("LinkDiff", ["create", "update", "delete", "counts"])
+
+_SECTION_HEAD_WORDS = ("رئیس", "رييس", "رییس")
+_SUPERVISOR_WORDS = ("سرپرست",)
+_MANAGER_WORDS = ("مدیر", "مدير")
+
+
+def clean_text(x: str) -> str:
+    if not x:
+        return ""
+    return str(x).replace("\u200c", " ").replace("\u00a0", " ").strip()
+
+
+def _has_any(text, words) -> bool:
+    text = clean_text(text)
+    return any(w in text for w in words)
+
+
+def desired_links(org_id: int, org_head_id: int, types: Iterable[str], linked_elsewhere: Set[int] = frozenset()
+                  ) -> Dict[LinkKey, int]:
+    """
+    (subordinate_id, link_type) → evaluator_id برای انواع خواسته‌شده.
+    linked_elsewhere: کسانی که لینکی از انواع دیگر دارند (برای fallback مدیر سازمان).
+    """
+    types = set(types)
+    desired: Dict[LinkKey, int] = {}
+    profiles = EmployeeProfile.objects.filter(organization_id=org_id)
+
+    if LinkType.DIRECT_SUPERVISOR in types:
+        for uid, sup_id in profiles.filter(direct_supervisor__isnull=False).values_list("user_id", "direct_supervisor_id"):
+            desired[(uid, LinkType.DIRECT_SUPERVISOR)] = sup_id
+
+    if LinkType.UNIT_MANAGER in types:
+        for uid, mgr_id in profiles.filter(unit__manager__isnull=False).values_list("user_id", "unit__manager_id"):
+            if mgr_id != uid:
+                desired[(uid, LinkType.UNIT_MANAGER)] = mgr_id
+
+    # SECTION_HEAD / SUPERVISOR از ReportingLine، بر اساس عنوان نقش شغلی بالادست
+    if types & {LinkType.SECTION_HEAD, LinkType.SUPERVISOR}:
+        for sub_id, sup_id, jr_name in ReportingLine.objects.filter(organization_id=org_id).values_list(
+            "subordinate_id", "supervisor_id", "supervisor__employee_profile__job_role__name"
+        ):
+            if LinkType.SECTION_HEAD in types and _has_any(jr_name, _SECTION_HEAD_WORDS):
+                desired[(sub_id, LinkType.SECTION_HEAD)] = sup_id
+            if LinkType.SUPERVISOR in types and _has_any(jr_name, _SUPERVISOR_WORDS):
+                desired[(sub_id, LinkType.SUPERVISOR)] = sup_id
+
+    if LinkType.ORG_HEAD in types:
+        # مدیرها = manager واحد + هرکس عنوان شغلی‌اش شامل «مدیر»
+        manager_ids = set(
+            Unit.objects.filter(organization_id=org_id, manager__isnull=False).values_list("manager_id", flat=True)
+        )
+        manager_ids |= {
+            uid for uid, jr in profiles.filter(job_role__isnull=False).values_list("user_id", "job_role__name")
+            if _has_any(jr, _MANAGER_WORDS)
+        }
+        # fallback: کسانی که هیچ لینک دیگری ندارند
+        linked = set(linked_elsewhere) | {sub for sub, _ in desired}
+        need_head = set(profiles.values_list("user_id", flat=True)) - linked
+        for uid in (manager_ids | need_head) - {org_head_id}:
+            desired[(uid, LinkType.ORG_HEAD)] = org_head_id
+
+    return desired
+
+
+def diff_links(existing: Iterable[Tuple[int, int, str, int]], desired: Dict[LinkKey, int], types: Iterable[str],
+               keep_stale: bool = False) -> LinkDiff:
+    """
+    existing: (pk, subordinate_id, link_type, evaluator_id) لینک‌های فعلی سازمان.
+    لینک‌های انواع خواسته‌نشده دست نمی‌خورند؛ تکراری‌های یک کلید همیشه حذف می‌شوند.
+    """
+    types = set(types)
+    current: Dict[LinkKey, List[Tuple[int, int]]] = defaultdict(list)
+    for pk, sub_id, link_type, ev_id in existing:
+        if link_type in types:
+            current[(sub_id, link_type)].append((pk, ev_id))
+
+    create: List[Tuple[LinkKey, int]] = []
+    update: List[Tuple[int, int]] = []
+    delete: List[int] = []
+    counts = Counter()
+    for key, ev_id in desired.items():
+        rows = current.pop(key, [])
+        keep = next((pk for pk, e in rows if e == ev_id), None)
+        if keep is not None:
+            counts[(key[1], "unchanged")] += 1
+        elif rows:
+            keep = rows[0][0]
+            update.append((keep, ev_id))
+            counts[(key[1], "updated")] += 1
+        else:
+            create.append((key, ev_id))
+            counts[(key[1], "created")] += 1
+        extra = [pk for pk, _ in rows if pk != keep]
+        delete.extend(extra)
+        counts[(key[1], "deleted")] += len(extra)
+
+    if not keep_stale:
+        for (_, link_type), rows in current.items():
+            delete.extend(pk for pk, _ in rows)
+            counts[(link_type, "deleted")] += len(rows)
+    return LinkDiff(create, update, delete, counts)
+
+
+def apply_link_diff(org_id: int, diff: LinkDiff, batch_size: int = 1000) -> None:
+    with transaction.atomic():
+        for i in range(0, len(diff.delete), batch_size):
+            EvaluationLink.objects.filter(pk__in=diff.delete[i:i + batch_size]).delete()
+        EvaluationLink.objects.bulk_update(
+            [EvaluationLink(pk=pk, evaluator_id=ev_id) for pk, ev_id in diff.update], ["evaluator"],
+            batch_size=batch_size,
+        )
+        EvaluationLink.objects.bulk_create(
+            [
+                EvaluationLink(organization_id=org_id, subordinate_id=sub_id, link_type=link_type, evaluator_id=ev_id)
+                for (sub_id, link_type), ev_id in diff.create
+            ],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        # bulk از سیگنال‌ها رد می‌شود
+        transaction.on_commit(lambda: bump_org_graph([org_id]))
+
+
+def rebuild_links(org_id: int, org_head_id: int, types: Iterable[str], keep_stale: bool = False,
+                  dry_run: bool = False) -> LinkDiff:
+    """محاسبه‌ی مجموعه‌ی مطلوب، diff با موجودها و (اگر dry_run نباشد) اعمال آن"""
+    types = [t for t in LINK_TYPE_ORDER if t in set(types)]
+    existing = list(
+        EvaluationLink.objects.filter(organization_id=org_id)
+        .values_list("pk", "subordinate_id", "link_type", "evaluator_id")
+    )
+    # برای fallback: لینک‌های انواع دیگر می‌مانند؛ با keep_stale لینک‌های قدیمی همین انواع هم
+    linked_elsewhere = {sub for _, sub, lt, _ in existing if keep_stale or lt not in types}
+    desired = desired_links(org_id, org_head_id, types, linked_elsewhere)
+    diff = diff_links(existing, desired, types, keep_stale=keep_stale)
+    if not dry_run:
+        apply_link_diff(org_id, diff)
+    return diff
+
+
+# اولویت انتخاب رئیس اصلی: نزدیک‌ترین ارزیاب اول
+PRIMARY_SUPERVISOR_PRIORITY = (
+    LinkType.SUPERVISOR,
+    LinkType.SECTION_HEAD,
+    LinkType.UNIT_MANAGER,
+    LinkType.DIRECT_SUPERVISOR,
+    LinkType.ORG_HEAD,
+)
+
+
+def primary_supervisors(org_id: int) -> Dict[int, int]:
+    """subordinate_id → بهترین evaluator_id طبق PRIMARY_SUPERVISOR_PRIORITY (یک کوئری)"""
+    prio = {t: i for i, t in enumerate(PRIMARY_SUPERVISOR_PRIORITY)}
+    best: Dict[int, Tuple[int, int, int]] = {}
+    for pk, sub_id, link_type, ev_id in EvaluationLink.objects.filter(organization_id=org_id).values_list(
+        "pk", "subordinate_id", "link_type", "evaluator_id"
+    ):
+        rank = (prio.get(link_type, 999), pk)
+        if sub_id not in best or rank < best[sub_id][:2]:
+            best[sub_id] = (*rank, ev_id)
+    return {sub_id: row[2] for sub_id, row in best.items()}
+
+
+def sync_primary_supervisors(org_id: int, dry_run: bool = False, batch_size: int = 1000) -> int:
+    """EmployeeProfile.direct_supervisor را با bulk_update هم‌گام می‌کند؛ تعداد تغییرها"""
+    best = primary_supervisors(org_id)
+    changed = [
+        EmployeeProfile(pk=pk, direct_supervisor_id=best[uid])
+        for pk, uid, current in EmployeeProfile.objects.filter(organization_id=org_id, user_id__in=list(best))
+        .values_list("pk", "user_id", "direct_supervisor_id").iterator(chunk_size=batch_size)
+        if current != best[uid]
+    ]
+    if changed and not dry_run:
+        with transaction.atomic():
+            EmployeeProfile.objects.bulk_update(changed, ["direct_supervisor"], batch_size=batch_size)
+            transaction.on_commit(lambda: bump_org_graph([org_id]))
+    return len(changed)
+
+
+__all__ = [
+    "LINK_TYPE_ORDER",
+    "PRIMARY_SUPERVISOR_PRIORITY",
+    "LinkDiff",
+    "clean_text",
+    "desired_links",
+    "diff_links",
+    "apply_link_diff",
+    "rebuild_links",
+    "primary_supervisors",
+    "sync_primary_supervisors",
+]
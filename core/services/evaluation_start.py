@@ -0,0 +1,159 @@
+# core/services/evaluation_start.py
+"""
+ساخت Draft ارزیابی و اسنپ‌شات معیارهای فرم.
+
+- معیارهای هر نسخه‌ی فرم از بسته‌ی کش‌شده (template_bundle) خوانده می‌شوند.
+- آیتم‌های ارزیابی با یک bulk_create (یک INSERT) ساخته می‌شوند.
+- start_team_drafts برای شروع دوره: Draft چند نفر با چند کوئری ثابت.
+"""
+from collections import namedtuple
+from typing import Dict, Iterable, List, Tuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import Evaluation, EvaluationItem, FormTemplate
+from core.approval.audit import ARCHIVED, Transition, record_transitions
+from core.services.evaluation_stats import schedule_stat_refresh, stat_key
+from core.services.template_bundle import get_bundle
+
+CriterionSnapshot = namedtuple("CriterionSnapshot", ["id", "title", "weight", "order"])
+
+def template_criteria(tpl: FormTemplate) -> Tuple[CriterionSnapshot, ...]:
+    """معیارهای مرتب‌شده‌ی یک نسخه‌ی فرم (از بسته‌ی کش‌شده‌ی template_bundle)"""
+    return tuple(
+        CriterionSnapshot(id=c.id, title=c.title, weight=c.weight or 1, order=c.order or idx)
+        for idx, c in enumerate(get_bundle(tpl).criteria, 1)
+    )
+
+
+def create_items(evaluations: Iterable[Evaluation], criteria: Tuple[CriterionSnapshot, ...]) -> int:
+    """آیتم‌های همه‌ی ارزیابی‌ها با یک bulk_create"""
+    items = [
+        EvaluationItem(
+            evaluation=ev,
+            criterion_id=c.id,
+            criterion_title=c.title,
+            weight=c.weight,
+            criterion_order=c.order,
+        )
+        for ev in evaluations
+        for c in criteria
+    ]
+    EvaluationItem.objects.bulk_create(items, batch_size=1000)
+    return len(items)
+
+
+def build_draft(tpl: FormTemplate, *, employee_id: str, employee_name: str, evaluator,
+                evaluator_profile=None, role_level=None, unit_code: str = "", team_code: str = "",
+                period_start=None, period_end=None) -> Evaluation:
+    """Evaluation ذخیره‌نشده با فلگ‌های فرم و مهلت Draft"""
+    ev = Evaluation(
+        template=tpl,
+        template_version=tpl.version,
+        status=Evaluation.Status.DRAFT,
+        employee_id=str(employee_id),
+        employee_name=employee_name,
+        unit_code=unit_code or "",
+        role_level=role_level,
+        team_code=team_code or "",
+        evaluator=evaluator,
+        manager_id=str(evaluator_profile.personnel_code) if evaluator_profile else "",
+        manager_name=evaluator.get_full_name() or evaluator.username,
+        holding_id=getattr(evaluator_profile, "holding_id", None),
+        show_employee_signature=tpl.show_employee_signature,
+        show_manager_signature=tpl.show_manager_signature,
+        show_hr_signature=tpl.show_hr_signature,
+        show_employee_comment=tpl.show_employee_comment,
+        show_next_period_goals=tpl.show_next_period_goals,
+        period_start=period_start,
+        period_end=period_end,
+        draft_started=True,
+        required_items=sum(1 for c in get_bundle(tpl).criteria if c.is_required),
+        filled_items=0,
+    )
+    ev.ensure_visible_until()
+    return ev
+
+
+def _display_name(profile) -> str:
+    user = getattr(profile, "user", None)
+    return (user and user.get_full_name()) or getattr(profile, "title", None) or str(profile.personnel_code)
+
+
+def start_team_drafts(tpl: FormTemplate, employees: Iterable, evaluator, evaluator_profile=None, *,
+                      role_level=None, unit_code: str = "", team_code: str = "",
+                      period_start=None, period_end=None) -> Dict[str, List]:
+    """
+    Draft برای چند کارمند (EmployeeProfile) در یک تراکنش.
+    - ارزیابی فعال موجود (هر وضعیتی) دست نمی‌خورد → existing
+    - Draftهای منقضی‌شده‌ی همان کلید آرشیو می‌شوند
+    - بقیه با یک bulk_create ارزیابی و یک bulk_create آیتم ساخته می‌شوند → created
+    """
+    employees = [e for e in employees if e.personnel_code]
+    codes = [str(e.personnel_code) for e in employees]
+    result = {"created": [], "existing": []}
+    if not codes:
+        return result
+
+    criteria = template_criteria(tpl)
+    if not criteria:
+        raise ValueError(f"برای فرم {tpl.code} هیچ معیاری پیدا نشد.")
+
+    now = timezone.now()
+    key = dict(template=tpl, template_version=tpl.version, period_start=period_start, period_end=period_end)
+
+    with transaction.atomic():
+        active = Evaluation.objects.filter(employee_id__in=codes, is_archived=False, **key)
+
+        # Draftهای منقضی → آرشیو (مثل archive_if_expired)
+        stale = active.filter(status=Evaluation.Status.DRAFT, visible_until__lt=now)
+        stale = list(stale)
+        stale_keys = {stat_key(ev) for ev in stale}
+        if stale_keys:
+            Evaluation.objects.filter(pk__in=[ev.pk for ev in stale]).update(is_archived=True, archived_at=now)
+            record_transitions([Transition(ev, ev.status, ARCHIVED) for ev in stale], actor=evaluator, at=now)
+            schedule_stat_refresh(stale_keys | {k._replace(is_archived=True) for k in stale_keys})
+
+        existing = {ev.employee_id: ev for ev in active.filter(is_archived=False)}
+        result["existing"] = list(existing.values())
+
+        drafts = [
+            build_draft(
+                tpl,
+                employee_id=e.personnel_code,
+                employee_name=_display_name(e),
+                evaluator=evaluator,
+                evaluator_profile=evaluator_profile,
+                role_level=role_level,
+                unit_code=unit_code,
+                team_code=team_code,
+                period_start=period_start,
+                period_end=period_end,
+            )
+            for e in employees
+            if str(e.personnel_code) not in existing
+        ]
+        if not drafts:
+            return result
+
+        # bulk_create از save() رد می‌شود؛ period_months و rollup دستی
+        for ev in drafts:
+            months = ev.months_label()
+            ev.period_months = months if months and months > 0 else None
+        created = Evaluation.objects.bulk_create(drafts)
+        create_items(created, criteria)
+        record_transitions([Transition(ev, "", ev.status) for ev in created], actor=evaluator, at=now)
+        schedule_stat_refresh({stat_key(ev) for ev in created})
+
+    result["created"] = created
+    return result
+
+
+__all__ = [
+    "CriterionSnapshot",
+    "template_criteria",
+    "create_items",
+    "build_draft",
+    "start_team_drafts",
+]
@@ -0,0 +1,277 @@
+# core/services/evaluation_stats.py
+"""
+نگهداری و خواندن جدول تجمیعی EvaluationStat.
+
+- هر بار که ارزیابی ذخیره می‌شود (recalc_scores، تغییر وضعیت در WorkflowEngine،
+  آرشیو و ...) فقط سطل‌های قدیم/جدید همان ارزیابی بعد از commit بازمحاسبه می‌شوند.
+- rebuild_evaluation_stats کل جدول (یا یک سازمان) را از نو می‌سازد.
+- گزارش‌ها به‌جای اسکن Evaluation، چند صد ردیف این جدول را جمع می‌زنند.
+"""
+from collections import namedtuple
+from typing import Dict, Iterable, Optional
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce, ExtractYear
+
+from core.models import Evaluation, EvaluationStat, Unit
+from core.services.report_aggregates import ReportAggregate, percent_expression, scored_filter
+
+StatKey = namedtuple(
+    "StatKey",
+    ["unit_code", "template_id", "year", "period_months", "status", "is_archived"],
+)
+
+# فیلدهایی از Evaluation که سطل یا مقادیر rollup را تغییر می‌دهند
+STAT_TRACKED_FIELDS = {
+    "unit_code", "template", "period_start", "period_end", "period_months",
+    "status", "is_archived", "final_score", "max_score",
+}
+
+# ستون‌هایی از Evaluation که stat_key به آن‌ها نیاز دارد (attname)
+STAT_KEY_FIELDS = frozenset({"unit_code", "template_id", "period_start", "period_months", "status", "is_archived"})
+
+_KEY_FIELDS = list(StatKey._fields)
+_VALUE_FIELDS = ["organization", "count", "scored_count", "pct_sum", "final_score_sum", "max_score_sum"]
+
+
+def stat_key(ev) -> StatKey:
+    """کلید سطل rollup برای یک ارزیابی"""
+    return StatKey(
+        unit_code=ev.unit_code or "",
+        template_id=ev.template_id,
+        year=ev.period_start.year if ev.period_start else 0,
+        period_months=ev.period_months or 0,
+        status=getattr(ev.status, "value", ev.status),
+        is_archived=bool(ev.is_archived),
+    )
+
+
+def stored_stat_key(pk) -> Optional[StatKey]:
+    """کلید سطل ردیف ذخیره‌شده در دیتابیس (برای نمونه‌ای که کلید قبلی‌اش را ندارد)"""
+    row = Evaluation.objects.filter(pk=pk).values(*STAT_KEY_FIELDS).first()
+    if row is None:
+        return None
+    return StatKey(
+        unit_code=row["unit_code"] or "",
+        template_id=row["template_id"],
+        year=row["period_start"].year if row["period_start"] else 0,
+        period_months=row["period_months"] or 0,
+        status=row["status"],
+        is_archived=bool(row["is_archived"]),
+    )
+
+
+def _bucket_values(qs):
+    """GROUP BY روی کلید سطل‌ها با شمارش و جمع امتیازها"""
+    return (
+        qs.order_by()
+        .annotate(
+            stat_year=Coalesce(ExtractYear("period_start"), 0),
+            stat_months=Coalesce("period_months", 0),
+        )
+        .values("unit_code", "template_id", "stat_year", "stat_months", "status", "is_archived")
+        .annotate(
+            n=Count("id"),
+            scored=Count("id", filter=scored_filter()),
+            pct=Sum(percent_expression(), filter=scored_filter()),
+            final_sum=Sum("final_score"),
+            max_sum=Sum("max_score"),
+        )
+    )
+
+
+def _row_key(row) -> StatKey:
+    return StatKey(
+        unit_code=row["unit_code"] or "",
+        template_id=row["template_id"],
+        year=row["stat_year"] or 0,
+        period_months=row["stat_months"] or 0,
+        status=row["status"],
+        is_archived=row["is_archived"],
+    )
+
+
+def _org_ids_by_unit(unit_codes: Iterable[str]) -> Dict[str, int]:
+    codes = {c for c in unit_codes if c}
+    if not codes:
+        return {}
+    return dict(Unit.objects.filter(unit_code__in=codes).values_list("unit_code", "organization_id"))
+
+
+def _build_stats(rows) -> Dict[StatKey, EvaluationStat]:
+    rows = list(rows)
+    org_ids = _org_ids_by_unit(r["unit_code"] for r in rows)
+    stats = {}
+    for row in rows:
+        key = _row_key(row)
+        stats[key] = EvaluationStat(
+            organization_id=org_ids.get(key.unit_code),
+            count=row["n"],
+            scored_count=row["scored"],
+            pct_sum=float(row["pct"] or 0.0),
+            final_score_sum=row["final_sum"] or 0,
+            max_score_sum=row["max_sum"] or 0,
+            **key._asdict(),
+        )
+    return stats
+
+
+def _key_q(key: StatKey, prefix: str = "") -> Q:
+    """فیلتر ردیف‌های Evaluation (prefix="") متعلق به یک سطل"""
+    q = Q(unit_code=key.unit_code, template_id=key.template_id,
+          status=key.status, is_archived=key.is_archived)
+    q &= Q(period_start__year=key.year) if key.year else Q(period_start__isnull=True)
+    q &= Q(period_months=key.period_months) if key.period_months else Q(period_months__isnull=True)
+    return q
+
+
+def refresh_stat_buckets(keys: Iterable[Optional[StatKey]]) -> None:
+    """بازمحاسبه‌ی فقط همین سطل‌ها از روی Evaluation (ایدمپوتنت)"""
+    keys = {k for k in keys if k and k.template_id}
+    if not keys:
+        return
+
+    cond = Q()
+    for key in keys:
+        cond |= _key_q(key)
+
+    with transaction.atomic():
+        fresh = _build_stats(_bucket_values(Evaluation.objects.filter(cond)))
+
+        if fresh:
+            EvaluationStat.objects.bulk_create(
+                list(fresh.values()),
+                update_conflicts=True,
+                unique_fields=_KEY_FIELDS,
+                update_fields=_VALUE_FIELDS,
+            )
+
+        # سطل‌هایی که دیگر هیچ ارزیابی ندارند حذف شوند
+        gone = keys - set(fresh)
+        if gone:
+            cond = Q()
+            for key in gone:
+                cond |= Q(**key._asdict())
+            EvaluationStat.objects.filter(cond).delete()
+
+
+def schedule_stat_refresh(keys: Iterable[Optional[StatKey]]) -> None:
+    """بازمحاسبه بعد از commit تراکنش جاری (در autocommit: بلافاصله)"""
+    keys = {k for k in keys if k}
+    if keys:
+        transaction.on_commit(lambda: refresh_stat_buckets(keys))
+
+
+def collect_stat_keys(qs) -> set:
+    """کلید سطل‌های یک QuerySet، پیش از update()/delete() گروهی"""
+    return {_row_key(row) for row in _bucket_values(qs)}
+
+
+def rebuild_evaluation_stats(unit_codes: Optional[Iterable[str]] = None, batch_size: int = 1000) -> int:
+    """ساخت کامل rollup (یا فقط برای unit_codeهای داده‌شده)"""
+    evaluations = Evaluation.objects.all()
+    stats = EvaluationStat.objects.all()
+    if unit_codes is not None:
+        unit_codes = list(unit_codes)
+        evaluations = evaluations.filter(unit_code__in=unit_codes)
+        stats = stats.filter(unit_code__in=unit_codes)
+
+    with transaction.atomic():
+        stats.delete()
+        objs = list(_build_stats(_bucket_values(evaluations)).values())
+        EvaluationStat.objects.bulk_create(objs, batch_size=batch_size)
+    return len(objs)
+
+
+# ---------------------------------------
+# خواندن برای گزارش‌ها
+# ---------------------------------------
+
+def _stats_queryset(unit_codes=None, year=None, period_months=None, template_code=None, is_archived=None):
+    qs = EvaluationStat.objects.all()
+    if unit_codes is not None:
+        qs = qs.filter(unit_code__in=list(unit_codes))
+    if year:
+        qs = qs.filter(year=year)
+    if period_months:
+        qs = qs.filter(period_months=period_months)
+    if template_code:
+        qs = qs.filter(template__code=template_code)
+    if is_archived is not None:
+        qs = qs.filter(is_archived=is_archived)
+    return qs
+
+
+def _fold_stat_rows(rows, score_statuses=None) -> ReportAggregate:
+    allowed = {getattr(s, "value", s) for s in score_statuses} if score_statuses else None
+    status_counts = {value: 0 for value in Evaluation.Status.values}
+    forms: Dict[str, dict] = {}
+
+    for row in rows:
+        n = row["n"] or 0
+        status_counts[row["status"]] = status_counts.get(row["status"], 0) + n
+        f = forms.setdefault(row["template__code"], {
+            "code": row["template__code"], "total": 0, "pct_sum": 0.0, "pct_count": 0,
+        })
+        f["total"] += n
+        if allowed is None or row["status"] in allowed:
+            f["pct_sum"] += float(row["pct_sum"] or 0.0)
+            f["pct_count"] += row["pct_count"] or 0
+
+    forms_list = [forms[code] for code in sorted(forms)]
+    return ReportAggregate(
+        total=sum(f["total"] for f in forms_list),
+        status_counts=status_counts,
+        pct_sum=sum(f["pct_sum"] for f in forms_list),
+        pct_count=sum(f["pct_count"] for f in forms_list),
+        forms=forms_list,
+    )
+
+
+def _stat_rows(qs, group_fields):
+    return (
+        qs.values(*group_fields, "template__code", "status")
+        .annotate(n=Sum("count"), pct_sum=Sum("pct_sum"), pct_count=Sum("scored_count"))
+        .order_by()
+    )
+
+
+def aggregate_stats(score_statuses=None, **filters) -> ReportAggregate:
+    """معادل aggregate_report ولی از روی جدول rollup"""
+    return _fold_stat_rows(_stat_rows(_stats_queryset(**filters), []), score_statuses)
+
+
+def aggregate_stats_by_unit(score_statuses=None, **filters) -> Dict[str, ReportAggregate]:
+    """معادل aggregate_report به تفکیک unit_code، از روی جدول rollup (یک کوئری)"""
+    by_unit: Dict[str, list] = {}
+    for row in _stat_rows(_stats_queryset(**filters), ["unit_code"]):
+        by_unit.setdefault(row["unit_code"], []).append(row)
+    return {code: _fold_stat_rows(rows, score_statuses) for code, rows in by_unit.items()}
+
+
+def available_years(**filters) -> list:
+    """سال‌های دارای ارزیابی (نزولی)"""
+    return list(
+        _stats_queryset(**filters)
+        .exclude(year=0)
+        .values_list("year", flat=True)
+        .distinct()
+        .order_by("-year")
+    )
+
+
+__all__ = [
+    "StatKey",
+    "STAT_TRACKED_FIELDS",
+    "STAT_KEY_FIELDS",
+    "stat_key",
+    "stored_stat_key",
+    "refresh_stat_buckets",
+    "schedule_stat_refresh",
+    "collect_stat_keys",
+    "rebuild_evaluation_stats",
+    "aggregate_stats",
+    "aggregate_stats_by_unit",
+    "available_years",
+]
@@ -0,0 +1,53 @@
+# core/services/export_jobs.py
+"""
+handlerهای صف پس‌زمینه برای خروجی‌های سنگین.
+پارامترها همان پارامترهای GET ویوهای خروجی ادمین هستند.
+"""
+from core.services.evaluation_export import (
+    export_queryset,
+    iter_csv_rows,
+    iter_with_usernames,
+    units_export_queryset,
+    write_pdf_report,
+    write_print_form_pdf,
+    write_units_zip,
+)
+from core.services.jobs import job_handler
+
+
+def _tracked(ctx, qs):
+    return ctx.track(iter_with_usernames(qs), total=qs.count())
+
+
+@job_handler("evaluation_csv")
+def evaluation_csv(ctx, **params):
+    qs, unit, mode, _ = export_queryset(ctx.user, params)
+    lines = ctx.track(iter_csv_rows(qs), total=qs.count() + 1)
+    for line in lines:
+        ctx.out.write(line.encode("utf-8"))
+    return f"evaluation_report_{mode}_{unit.unit_code or 'unit'}.csv", "text/csv; charset=utf-8"
+
+
+@job_handler("evaluation_pdf")
+def evaluation_pdf(ctx, **params):
+    qs, unit, mode, subtitle = export_queryset(ctx.user, params)
+    write_pdf_report(ctx.out, _tracked(ctx, qs), subtitle)
+    return f"evaluation_report_{mode}_{unit.unit_code or 'unit'}.pdf", "application/pdf"
+
+
+@job_handler("evaluation_pdf_units")
+def evaluation_pdf_units(ctx, **params):
+    qs = units_export_queryset(ctx.user, params.get("org_id"))
+    total = qs.count()
+    ctx.progress(0, total, force=True)
+    write_units_zip(ctx.out, qs, on_row=ctx.progress)
+    ctx.progress(total, force=True)
+    return "evaluation_reports_units.zip", "application/zip"
+
+
+@job_handler("print_form_pdf")
+def print_form_pdf(ctx, **params):
+    ctx.progress(0, 1, force=True)
+    filename = write_print_form_pdf(ctx.out, ctx.user, params)
+    ctx.progress(1, force=True)
+    return filename, "application/pdf"
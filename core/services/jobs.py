@@ -0,0 +1,284 @@
+# core/services/jobs.py
+"""
+صف کار پس‌زمینه روی دیتابیس (بدون broker خارجی).
+
+- enqueue(kind, params, user) یک BackgroundJob در صف می‌گذارد.
+- worker با claim_next یک کار را با SELECT ... FOR UPDATE SKIP LOCKED برمی‌دارد،
+  پس چند worker/thread هم‌زمان یک کار را دوبار اجرا نمی‌کنند.
+- handlerها با @job_handler("kind") ثبت می‌شوند و خروجی را در ctx.out می‌نویسند.
+- خروجی در فایل (BackgroundJob.result_file) ذخیره می‌شود، نه در دیتابیس؛ بیش از
+  JOB_RESULT_MAX_BYTES کار را ناموفق می‌کند.
+- در طول اجرا یک رشته‌ی heartbeat هر HEARTBEAT_INTERVAL ثانیه heartbeat_at را تازه می‌کند؛
+  پس مراحل طولانی بدون progress (رندر PDF، doc.build) رهاشده حساب نمی‌شوند.
+"""
+import importlib
+import logging
+import threading
+import time
+import traceback
+from datetime import timedelta
+from typing import Callable, Dict, Iterable, Optional
+
+from django.conf import settings
+from django.core.files import File
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import BackgroundJob
+
+log = logging.getLogger(__name__)
+
+# ماژول‌هایی که handler ثبت می‌کنند
+HANDLER_MODULES = ("core.services.export_jobs",)
+
+# اجرای بدون heartbeat بیش از این مدت رهاشده حساب می‌شود
+STALE_AFTER = timedelta(minutes=15)
+# فاصله‌ی heartbeat رشته‌ی پس‌زمینه در طول اجرا (ثانیه)؛ باید خیلی کمتر از STALE_AFTER باشد
+HEARTBEAT_INTERVAL = 60.0
+MAX_ATTEMPTS = 3
+# سقف حجم فایل خروجی هر کار (بایت)
+MAX_RESULT_BYTES = getattr(settings, "JOB_RESULT_MAX_BYTES", 512 * 1024 * 1024)
+# فاصله‌ی حداقل بین دو به‌روزرسانی progress در دیتابیس (ثانیه)
+PROGRESS_INTERVAL = 2.0
+
+_HANDLERS: Dict[str, Callable] = {}
+_loaded = False
+
+
+def job_handler(kind: str):
+    """ثبت handler برای یک نوع کار: handler(ctx, **params) -> (filename, content_type)"""
+    def register(func):
+        _HANDLERS[kind] = func
+        return func
+    return register
+
+
+def _load_handlers():
+    global _loaded
+    if not _loaded:
+        for module in HANDLER_MODULES:
+            importlib.import_module(module)
+        _loaded = True
+
+
+def registered_kinds() -> list:
+    _load_handlers()
+    return sorted(_HANDLERS)
+
+
+class JobContext:
+    """چیزی که handler می‌بیند: کاربر، فایل خروجی و گزارش پیشرفت"""
+
+    def __init__(self, job: BackgroundJob, out):
+        self.job = job
+        self.user = job.created_by
+        self.out = out
+        self._last_flush = 0.0
+
+    def progress(self, done: int, total: Optional[int] = None, force: bool = False):
+        self.job.progress = done
+        if total is not None:
+            self.job.total = total
+        now = time.monotonic()
+        if force or now - self._last_flush >= PROGRESS_INTERVAL:
+            self._last_flush = now
+            BackgroundJob.objects.filter(pk=self.job.pk).update(
+                progress=self.job.progress, total=self.job.total, heartbeat_at=timezone.now()
+            )
+
+    def track(self, items: Iterable, total: int):
+        """پیمایش items با گزارش خودکار پیشرفت"""
+        self.progress(0, total, force=True)
+        done = 0
+        for item in items:
+            yield item
+            done += 1
+            self.progress(done)
+        self.progress(done, force=True)
+
+
+def enqueue(kind: str, params: Optional[dict] = None, user=None) -> BackgroundJob:
+    _load_handlers()
+    if kind not in _HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    return BackgroundJob.objects.create(kind=kind, params=params or {}, created_by=user)
+
+
+def claim_next(worker: str, kinds: Optional[Iterable[str]] = None) -> Optional[BackgroundJob]:
+    """برداشتن قدیمی‌ترین کار در صف (یا اجرای رهاشده) به‌صورت اتمیک"""
+    stale = timezone.now() - STALE_AFTER
+    cond = Q(status=BackgroundJob.Status.QUEUED) | Q(
+        status=BackgroundJob.Status.RUNNING, heartbeat_at__lt=stale, attempts__lt=MAX_ATTEMPTS
+    )
+    # اجراهای رهاشده‌ای که سهم تلاششان تمام شده → ناموفق
+    BackgroundJob.objects.filter(
+        status=BackgroundJob.Status.RUNNING, heartbeat_at__lt=stale, attempts__gte=MAX_ATTEMPTS
+    ).update(status=BackgroundJob.Status.FAILED, error="worker stopped responding", finished_at=timezone.now())
+
+    with transaction.atomic():
+        qs = BackgroundJob.objects.filter(cond)
+        if kinds:
+            qs = qs.filter(kind__in=list(kinds))
+        job = (
+            qs.select_for_update(skip_locked=connection.features.has_select_for_update_skip_locked)
+            .order_by("created_at")
+            .first()
+        )
+        if job is None:
+            return None
+        now = timezone.now()
+        job.status = BackgroundJob.Status.RUNNING
+        job.worker = worker
+        job.attempts += 1
+        job.started_at = now
+        job.heartbeat_at = now
+        job.save(update_fields=["status", "worker", "attempts", "started_at", "heartbeat_at"])
+    return job
+
+
+class _Heartbeat:
+    """رشته‌ای که تا پایان اجرای کار heartbeat_at را تازه نگه می‌دارد (اتصال دیتابیس جدا)"""
+
+    def __init__(self, job: BackgroundJob, interval: float = HEARTBEAT_INTERVAL):
+        self.job = job
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"heartbeat-{job.pk}", daemon=True)
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval):
+                # اگر کار دوباره برداشته شده باشد (worker دیگر) دیگر به آن دست نمی‌زنیم
+                BackgroundJob.objects.filter(
+                    pk=self.job.pk, status=BackgroundJob.Status.RUNNING, worker=self.job.worker
+                ).update(heartbeat_at=timezone.now())
+        except Exception:
+            log.exception("heartbeat of background job %s failed", self.job.pk)
+        finally:
+            connection.close()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+class ResultTooLarge(Exception):
+    """خروجی handler از MAX_RESULT_BYTES بزرگ‌تر است"""
+
+
+def run_job(job: BackgroundJob) -> BackgroundJob:
+    """اجرای handler و ذخیره‌ی فایل خروجی یا خطا"""
+    from core.services.evaluation_export import spooled_file
+
+    _load_handlers()
+    handler = _HANDLERS.get(job.kind)
+    # اجرای دوباره‌ی کار رهاشده: فایل نیمه‌کاره‌ی قبلی کنار گذاشته می‌شود
+    if job.result_file:
+        job.result_file.delete(save=False)
+    with spooled_file() as out, _Heartbeat(job):
+        try:
+            if handler is None:
+                raise ValueError(f"Unknown job kind: {job.kind}")
+            filename, content_type = handler(JobContext(job, out), **job.params)
+            size = out.seek(0, 2)
+            if size > MAX_RESULT_BYTES:
+                raise ResultTooLarge(f"result is {size} bytes; limit is {MAX_RESULT_BYTES}")
+            out.seek(0)
+            # storage فایل را تکه‌تکه کپی می‌کند؛ کل خروجی در حافظه خوانده نمی‌شود
+            job.result_file.save(f"{job.pk}-{filename}", File(out), save=False)
+            job.result_name = filename
+            job.result_content_type = content_type
+            job.status = BackgroundJob.Status.DONE
+            job.error = ""
+        except ResultTooLarge as e:
+            log.warning("background job %s failed: %s", job.pk, e)
+            job.status = BackgroundJob.Status.FAILED
+            job.error = f"خروجی بیش از حد مجاز بزرگ است ({e})."
+        except Exception as e:
+            log.exception("background job %s failed", job.pk)
+            job.status = BackgroundJob.Status.FAILED
+            job.error = f"{e}\n{traceback.format_exc()}"
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=[
+        "status", "error", "result_file", "result_name", "result_content_type",
+        "progress", "total", "finished_at",
+    ])
+    return job
+
+
+def _worker_loop(name: str, kinds, poll_interval: float, once: bool, stop: threading.Event):
+    try:
+        while not stop.is_set():
+            close_old_connections()
+            job = claim_next(name, kinds)
+            if job is None:
+                if once:
+                    return
+                stop.wait(poll_interval)
+                continue
+            run_job(job)
+    finally:
+        connection.close()
+
+
+def run_worker(name: str, concurrency: int = 1, poll_interval: float = 2.0,
+               once: bool = False, kinds: Optional[Iterable[str]] = None,
+               stop: Optional[threading.Event] = None) -> None:
+    """
+    اجرای concurrency رشته‌ی worker؛ هر رشته اتصال دیتابیس خودش را دارد.
+    once=True: تا خالی شدن صف اجرا و خروج.
+    """
+    _load_handlers()
+    stop = stop or threading.Event()
+    kinds = list(kinds) if kinds else None
+    threads = [
+        threading.Thread(
+            target=_worker_loop,
+            args=(f"{name}-{i}", kinds, poll_interval, once, stop),
+            daemon=True,
+        )
+        for i in range(max(1, concurrency))
+    ]
+    for t in threads:
+        t.start()
+    try:
+        while any(t.is_alive() for t in threads):
+            for t in threads:
+                t.join(timeout=0.5)
+    except KeyboardInterrupt:
+        stop.set()
+        for t in threads:
+            t.join()
+
+
+def purge_jobs(older_than: timedelta) -> int:
+    """حذف کارهای تمام‌شده/ناموفق قدیمی‌تر از older_than (همراه فایل خروجی‌شان)"""
+    cutoff = timezone.now() - older_than
+    jobs = BackgroundJob.objects.filter(
+        status__in=[BackgroundJob.Status.DONE, BackgroundJob.Status.FAILED],
+        created_at__lt=cutoff,
+    )
+    storage = BackgroundJob._meta.get_field("result_file").storage
+    for name in jobs.exclude(result_file="").values_list("result_file", flat=True).iterator():
+        storage.delete(name)
+    deleted, _ = jobs.delete()
+    return deleted
+
+
+__all__ = [
+    "job_handler",
+    "registered_kinds",
+    "JobContext",
+    "ResultTooLarge",
+    "enqueue",
+    "claim_next",
+    "run_job",
+    "run_worker",
+    "purge_jobs",
+]
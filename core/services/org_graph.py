@@ -0,0 +1,212 @@
+# core/services/org_graph.py
+"""
+گراف سازمانی هر سازمان در حافظه: چه کسی چه کسی را ارزیابی می‌کند و زیردست‌های مستقیم هر نفر.
+
+منابع (همه یک گراف را توصیف می‌کنند):
+- EvaluationLink: ارزیاب‌های هر نفر (مرجع اصلی «چه کسی می‌تواند X را ارزیابی کند»)
+- برای کسانی که لینک ندارند: direct_supervisor / section_head / unit_manager پروفایل
+  و manager / head واحدش (همان چیزی که build_evaluation_links از آن لینک می‌سازد)
+- ReportingLine (و در نبودش direct_supervisor): درخت گزارش‌دهی
+
+کل گراف یک سازمان با چند کوئری خوانده و به آرایه‌های فشرده (CSR روی اندیس‌های صحیح)
+تبدیل می‌شود؛ پرسش‌ها بعد از آن بدون کوئری و در حد میکروثانیه‌اند.
+
+evaluatees_of یال‌های مشتق از پروفایل/واحد را هم حساب می‌کند؛ برای دسترسی به پروفایل‌ها
+(core.services.access) همچنان فقط EvaluationLinkهای صریح، با یک زیرکوئری، ملاک است.
+
+تازگی: هر سازمان یک «نسخه» در کش Django دارد (مثل نسل‌های dashboard_cache).
+ذخیره/حذف ReportingLine، EvaluationLink، EmployeeProfile و Unit نسخه‌ی سازمان را جلو می‌برد
+(انتقال پروفایل به سازمان دیگر نسخه‌ی هر دو سازمان را)؛
+عملیات گروهی (bulk_create / update) باید خودشان bump_org_graph را صدا بزنند.
+"""
+import time
+from array import array
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.models import EmployeeProfile, EvaluationLink, ReportingLine, Unit
+
+ORG_GRAPH_CACHE_ALIAS = getattr(settings, "ORG_GRAPH_CACHE_ALIAS", "default")
+
+LINK_TYPES = tuple(EvaluationLink.LinkType.values)
+_LINK_INDEX = {t: i for i, t in enumerate(LINK_TYPES)}
+_NONE = -1
+
+
+def _csr(size: int, pairs: List[Tuple[int, int, int]]):
+    """(مبدأ، مقصد، نوع) → offsets/targets/kinds به سبک CSR"""
+    pairs.sort()
+    offsets = array("q", [0] * (size + 1))
+    for src, _, _ in pairs:
+        offsets[src + 1] += 1
+    for i in range(size):
+        offsets[i + 1] += offsets[i]
+    return offsets, array("q", (p[1] for p in pairs)), array("b", (p[2] for p in pairs))
+
+
+@dataclass(frozen=True)
+class OrgGraph:
+    organization_id: int
+    version: tuple
+    users: array  # اندیس → user_id
+    index: Dict[int, int] = field(repr=False)  # user_id → اندیس
+    reports_offsets: array = field(repr=False)
+    reports: array = field(repr=False)
+    evaluatees_offsets: array = field(repr=False)
+    evaluatees: array = field(repr=False)
+
+    def _row(self, offsets, targets, user_id) -> List[int]:
+        i = self.index.get(user_id)
+        if i is None:
+            return []
+        return [self.users[t] for t in targets[offsets[i]:offsets[i + 1]]]
+
+    def evaluatees_of(self, user_id) -> List[int]:
+        """user_id چه کسانی را می‌تواند ارزیابی کند"""
+        return self._row(self.evaluatees_offsets, self.evaluatees, user_id)
+
+    def direct_reports(self, user_id) -> List[int]:
+        return self._row(self.reports_offsets, self.reports, user_id)
+
+
+def _load_graph(org_id: int, version: tuple) -> OrgGraph:
+    profiles = list(
+        EmployeeProfile.objects.filter(organization_id=org_id).values_list(
+            "user_id", "direct_supervisor_id", "section_head_id", "unit_manager_id",
+            "unit__manager_id", "unit__head_id",
+        )
+    )
+    lines = list(ReportingLine.objects.filter(organization_id=org_id).values_list("subordinate_id", "supervisor_id"))
+    links = list(
+        EvaluationLink.objects.filter(organization_id=org_id).values_list("subordinate_id", "evaluator_id", "link_type")
+    )
+
+    ids = set()
+    for row in profiles:
+        ids.update(u for u in row if u)
+    for sub, sup in lines:
+        ids.update((sub, sup))
+    for sub, ev, _ in links:
+        ids.update((sub, ev))
+    users = array("q", sorted(ids))
+    index = {u: i for i, u in enumerate(users)}
+    size = len(users)
+
+    # درخت گزارش‌دهی: ReportingLine، وگرنه direct_supervisor
+    supervisor = array("q", [_NONE] * size)
+    for user_id, direct, *_ in profiles:
+        if direct and direct != user_id:
+            supervisor[index[user_id]] = index[direct]
+    for sub, sup in lines:
+        if sub != sup:
+            supervisor[index[sub]] = index[sup]
+    reports = [(s, i, 0) for i, s in enumerate(supervisor) if s != _NONE]
+
+    # ارزیاب‌ها: EvaluationLink؛ برای بدون‌لینک‌ها فیلدهای پروفایل و واحد
+    edges = {(index[sub], index[ev], _LINK_INDEX[lt]) for sub, ev, lt in links if lt in _LINK_INDEX}
+    linked = {sub for sub, _, _ in edges}
+    derived = (
+        (1, EvaluationLink.LinkType.DIRECT_SUPERVISOR),
+        (2, EvaluationLink.LinkType.SECTION_HEAD),
+        (3, EvaluationLink.LinkType.UNIT_MANAGER),
+        (4, EvaluationLink.LinkType.UNIT_MANAGER),
+        (5, EvaluationLink.LinkType.SECTION_HEAD),
+    )
+    for row in profiles:
+        sub = index[row[0]]
+        if sub in linked:
+            continue
+        for col, link_type in derived:
+            if row[col] and row[col] != row[0]:
+                edges.add((sub, index[row[col]], _LINK_INDEX[link_type]))
+
+    ee_offsets, ee_targets, _ = _csr(size, list({(e, s, 0) for s, e, _ in edges}))
+    rp_offsets, rp_targets, _ = _csr(size, reports)
+
+    return OrgGraph(
+        organization_id=org_id, version=version, users=users, index=index,
+        reports_offsets=rp_offsets, reports=rp_targets,
+        evaluatees_offsets=ee_offsets, evaluatees=ee_targets,
+    )
+
+
+_GRAPHS: Dict[int, OrgGraph] = {}
+_LOCK = Lock()
+
+
+def _cache():
+    return caches[ORG_GRAPH_CACHE_ALIAS]
+
+
+_GLOBAL_VERSION_KEY = "orggraph:ver"
+
+
+def _version_key(org_id) -> str:
+    return f"orggraph:ver:{org_id}"
+
+
+def graph_version(org_id) -> tuple:
+    versions = _cache().get_many([_GLOBAL_VERSION_KEY, _version_key(org_id)])
+    return versions.get(_GLOBAL_VERSION_KEY, 0), versions.get(_version_key(org_id), 0)
+
+
+def bump_org_graph(org_ids: Optional[Iterable[int]] = None) -> None:
+    """نسخه‌ی گراف سازمان(ها) را جلو می‌برد؛ None یعنی همه‌ی سازمان‌ها"""
+    now = time.time_ns()
+    if org_ids is None:
+        _cache().set(_GLOBAL_VERSION_KEY, now, None)
+        return
+    _cache().set_many({_version_key(org_id): now for org_id in set(org_ids) if org_id}, None)
+
+
+def get_org_graph(org_id: int) -> OrgGraph:
+    """گراف سازمان؛ اگر نسخه‌ی کش عوض شده باشد دوباره خوانده می‌شود (یک get_many از کش)"""
+    version = graph_version(org_id)
+    graph = _GRAPHS.get(org_id)
+    if graph is None or graph.version != version:
+        graph = _load_graph(org_id, version)
+        with _LOCK:
+            _GRAPHS[org_id] = graph
+    return graph
+
+
+def _bump_on_commit(org_id) -> None:
+    if org_id:
+        transaction.on_commit(lambda: bump_org_graph([org_id]))
+
+
+@receiver([post_save, post_delete], sender=ReportingLine, dispatch_uid="org_graph_reporting_line")
+@receiver([post_save, post_delete], sender=EvaluationLink, dispatch_uid="org_graph_evaluation_link")
+@receiver([post_save, post_delete], sender=EmployeeProfile, dispatch_uid="org_graph_profile")
+@receiver([post_save, post_delete], sender=Unit, dispatch_uid="org_graph_unit")
+def _on_graph_changed(sender, instance, **kwargs):
+    _bump_on_commit(instance.organization_id)
+    old_org_id = getattr(instance, "_org_graph_old_org_id", None)
+    if old_org_id != instance.organization_id:
+        _bump_on_commit(old_org_id)
+
+
+@receiver(pre_save, sender=EmployeeProfile, dispatch_uid="org_graph_profile_move")
+def _remember_old_org(sender, instance, raw=False, **kwargs):
+    # انتقال به سازمان دیگر: گراف سازمان قبلی هم باید کنار گذاشته شود
+    if raw or instance.pk is None:
+        return
+    instance._org_graph_old_org_id = (
+        EmployeeProfile.objects.filter(pk=instance.pk).values_list("organization_id", flat=True).first()
+    )
+
+
+__all__ = [
+    "LINK_TYPES",
+    "OrgGraph",
+    "get_org_graph",
+    "graph_version",
+    "bump_org_graph",
+]
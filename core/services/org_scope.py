@@ -0,0 +1,172 @@
+# core/services/org_scope.py
+"""
+محدوده‌ی سازمانی کاربر (کدام سازمان‌ها و واحدها را می‌بیند)، یک بار محاسبه و کش‌شده.
+
+- روی خود شیء user (request.user) نگه داشته می‌شود: در هر درخواست حداکثر یک بار حساب می‌شود.
+- بین درخواست‌ها در کش Django به ازای هر کاربر؛ کلید «نسل» سراسری و «نسل» همان کاربر را دارد
+  (مثل dashboard_cache). تغییر پروفایل کاربر نسل خودش را عوض می‌کند؛ تغییر سازمان/واحد/گروه
+  واحدهای مشترک نسل سراسری را.
+- apply_org_scope شرط را به‌صورت IN ساده روی organization_id (یا unit_code برای Evaluation
+  که ستون سازمان ندارد) اعمال می‌کند؛ بدون subquery روی گروه‌ها در هر بار.
+"""
+import time
+from dataclasses import dataclass
+from typing import FrozenSet, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core.approval.role_resolver import resolve_profile
+from core.models import DepartmentGroup, EmployeeProfile, Organization, Unit
+
+ORG_SCOPE_CACHE_ALIAS = getattr(settings, "ORG_SCOPE_CACHE_ALIAS", "default")
+ORG_SCOPE_CACHE_TIMEOUT = getattr(settings, "ORG_SCOPE_CACHE_TIMEOUT", 3600)
+
+_SCOPE_ATTR = "_org_scope"
+_GLOBAL_GEN_KEY = "orgscope:gen"
+
+
+@dataclass(frozen=True)
+class OrgScope:
+    unrestricted: bool = False  # سوپرادمین
+    org_ids: FrozenSet[int] = frozenset()
+    unit_codes: FrozenSet[str] = frozenset()
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.unrestricted and not self.org_ids
+
+
+UNRESTRICTED = OrgScope(unrestricted=True)
+EMPTY = OrgScope()
+
+
+def _cache():
+    return caches[ORG_SCOPE_CACHE_ALIAS]
+
+
+def _user_gen_key(user_id) -> str:
+    return f"orgscope:gen:user:{user_id}"
+
+
+def _new_generation() -> int:
+    return time.time_ns()
+
+
+def invalidate_all_scopes() -> None:
+    _cache().set(_GLOBAL_GEN_KEY, _new_generation(), None)
+
+
+def invalidate_user_scope(user_id) -> None:
+    if user_id:
+        _cache().set(_user_gen_key(user_id), _new_generation(), None)
+
+
+def _scope_key(user_id) -> str:
+    gens = _cache().get_many([_GLOBAL_GEN_KEY, _user_gen_key(user_id)])
+    return f"orgscope:{user_id}:{gens.get(_GLOBAL_GEN_KEY, 0)}:{gens.get(_user_gen_key(user_id), 0)}"
+
+
+def _allowed_org_ids(ep) -> FrozenSet[int]:
+    # دفتر مرکزی (فقط holding دارد) → همه‌ی سازمان‌های holding
+    if ep.holding_id and not ep.organization_id and not ep.department_group_id:
+        return frozenset(Organization.objects.filter(holding_id=ep.holding_id).values_list("pk", flat=True))
+
+    # HR/IT مشترک → کارخانه‌های گروه
+    if ep.department_group_id:
+        return frozenset(
+            DepartmentGroup.factories.through.objects.filter(departmentgroup_id=ep.department_group_id)
+            .values_list("organization_id", flat=True)
+        )
+
+    # مدیر یا کارمند کارخانه
+    if ep.organization_id:
+        return frozenset([ep.organization_id])
+
+    return frozenset()
+
+
+def _compute_scope(user) -> OrgScope:
+    ep = resolve_profile(user)
+    if not ep:
+        return EMPTY
+    org_ids = _allowed_org_ids(ep)
+    if not org_ids:
+        return EMPTY
+    unit_codes = frozenset(
+        c for c in Unit.objects.filter(organization_id__in=org_ids).values_list("unit_code", flat=True) if c
+    )
+    return OrgScope(org_ids=org_ids, unit_codes=unit_codes)
+
+
+def resolve_org_scope(user) -> OrgScope:
+    """محدوده‌ی سازمانی کاربر؛ memoize روی user و کش بین درخواست‌ها"""
+    if user is None or not getattr(user, "is_authenticated", False):
+        return EMPTY
+    if user.is_superuser:
+        return UNRESTRICTED
+    if hasattr(user, _SCOPE_ATTR):
+        return getattr(user, _SCOPE_ATTR)
+
+    key = _scope_key(user.pk)
+    cached = _cache().get(key)
+    if cached is None:
+        scope = _compute_scope(user)
+        _cache().set(key, (tuple(scope.org_ids), tuple(scope.unit_codes)), ORG_SCOPE_CACHE_TIMEOUT)
+    else:
+        scope = OrgScope(org_ids=frozenset(cached[0]), unit_codes=frozenset(cached[1]))
+    setattr(user, _SCOPE_ATTR, scope)
+    return scope
+
+
+def scope_filter(model, user) -> Optional[Q]:
+    """
+    شرط محدوده برای model: None یعنی هیچ ردیفی، Q() یعنی همه.
+    مدل‌های دارای organization با organization_id و Evaluation با unit_code فیلتر می‌شوند.
+    """
+    scope = resolve_org_scope(user)
+    if scope.unrestricted:
+        return Q()
+    if scope.is_empty:
+        return None
+
+    fields = {f.name for f in model._meta.get_fields()}
+    if "organization" in fields:
+        return Q(organization_id__in=sorted(scope.org_ids))
+    if "unit_code" in fields:
+        return Q(unit_code__in=sorted(scope.unit_codes)) if scope.unit_codes else None
+    raise ValueError(f"{model.__name__} has neither organization nor unit_code; cannot scope it.")
+
+
+def apply_org_scope(qs, user):
+    cond = scope_filter(qs.model, user)
+    if cond is None:
+        return qs.none()
+    return qs.filter(cond) if cond else qs
+
+
+@receiver([post_save, post_delete], sender=EmployeeProfile, dispatch_uid="org_scope_profile")
+def _on_profile_changed(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_user_scope(user_id))
+
+
+@receiver([post_save, post_delete], sender=Organization, dispatch_uid="org_scope_organization")
+@receiver([post_save, post_delete], sender=Unit, dispatch_uid="org_scope_unit")
+@receiver(m2m_changed, sender=DepartmentGroup.factories.through, dispatch_uid="org_scope_group")
+def _on_structure_changed(sender, **kwargs):
+    transaction.on_commit(invalidate_all_scopes)
+
+
+__all__ = [
+    "OrgScope",
+    "resolve_org_scope",
+    "scope_filter",
+    "apply_org_scope",
+    "invalidate_all_scopes",
+    "invalidate_user_scope",
+]
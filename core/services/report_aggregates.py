@@ -0,0 +1,139 @@
+# core/services/report_aggregates.py
+"""
+تجمیع آمار گزارش‌ها در یک کوئری.
+
+به‌جای چند count() و aggregate() جداگانه روی یک QuerySet، همه‌ی شمارنده‌های
+وضعیت، میانگین درصد و میانگین هر فرم با یک GROUP BY شرطی محاسبه می‌شوند.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from django.db.models import Case, Count, F, FloatField, Q, Sum, When
+
+from core.models import Evaluation
+
+
+def percent_expression():
+    """درصد امتیاز هر ارزیابی؛ اگر max_score صفر/خالی باشد NULL."""
+    return Case(
+        When(max_score__gt=0, then=(F("final_score") * 100.0) / F("max_score")),
+        default=None,
+        output_field=FloatField(),
+    )
+
+
+def scored_filter():
+    """ارزیابی‌هایی که درصدشان قابل محاسبه است"""
+    return Q(max_score__gt=0, final_score__isnull=False)
+
+
+def _status_key(value: str) -> str:
+    return f"n_{value}"
+
+
+@dataclass(frozen=True)
+class ReportAggregate:
+    total: int = 0
+    status_counts: Dict[str, int] = field(default_factory=dict)
+    pct_sum: float = 0.0
+    pct_count: int = 0
+    # ارزیابی‌های score_statuses که final_score یا max_score دارند (درصدشان شاید قابل محاسبه نباشد)
+    rated_count: int = 0
+    forms: List[dict] = field(default_factory=list)
+
+    def count(self, status) -> int:
+        value = getattr(status, "value", status)
+        return self.status_counts.get(value, 0)
+
+    @property
+    def avg_percent(self) -> float:
+        return (self.pct_sum / self.pct_count) if self.pct_count else 0.0
+
+    def by_form(self, default: Optional[float] = None) -> List[dict]:
+        """خروجی سازگار با قالب‌ها: [{"template__code": ..., "avg_percent": ...}]"""
+        return [
+            {
+                "template__code": f["code"],
+                "avg_percent": (f["pct_sum"] / f["pct_count"]) if f["pct_count"] else default,
+            }
+            for f in self.forms
+        ]
+
+
+def _grouped_rows(qs, group_fields, score_statuses=None):
+    """ردیف‌های GROUP BY با شمارنده‌های شرطی هر وضعیت و جمع/تعداد درصدها"""
+    status_filter = Q()
+    if score_statuses:
+        status_filter = Q(status__in=[getattr(s, "value", s) for s in score_statuses])
+    score_filter = scored_filter() & status_filter
+    rated_filter = status_filter & ~Q(final_score__isnull=True, max_score__isnull=True)
+
+    per_status = {
+        _status_key(value): Count("id", filter=Q(status=value))
+        for value in Evaluation.Status.values
+    }
+
+    return (
+        qs.order_by()
+        .values(*group_fields)
+        .annotate(
+            total=Count("id"),
+            pct_sum=Sum(percent_expression(), filter=score_filter),
+            pct_count=Count("id", filter=score_filter),
+            rated_count=Count("id", filter=rated_filter),
+            **per_status,
+        )
+        .order_by(*group_fields)
+    )
+
+
+def _fold(rows) -> ReportAggregate:
+    """جمع‌کردن ردیف‌های هر فرم در یک ReportAggregate"""
+    total = 0
+    pct_sum = 0.0
+    pct_count = 0
+    rated_count = 0
+    status_counts = {value: 0 for value in Evaluation.Status.values}
+    forms = []
+
+    for row in rows:
+        total += row["total"]
+        row_sum = float(row["pct_sum"] or 0.0)
+        pct_sum += row_sum
+        pct_count += row["pct_count"]
+        rated_count += row["rated_count"]
+        for value in Evaluation.Status.values:
+            status_counts[value] += row[_status_key(value)]
+        forms.append({
+            "code": row["template__code"],
+            "total": row["total"],
+            "pct_sum": row_sum,
+            "pct_count": row["pct_count"],
+        })
+
+    return ReportAggregate(
+        total=total,
+        status_counts=status_counts,
+        pct_sum=pct_sum,
+        pct_count=pct_count,
+        rated_count=rated_count,
+        forms=forms,
+    )
+
+
+def aggregate_report(qs, score_statuses=None) -> ReportAggregate:
+    """
+    یک پیمایش روی QuerySet ارزیابی‌ها:
+      - شمارش همه‌ی وضعیت‌ها (Count با filter)
+      - جمع و تعداد درصدها برای میانگین کل و میانگین هر فرم
+    score_statuses: اگر داده شود، میانگین فقط روی همین وضعیت‌ها حساب می‌شود.
+    """
+    return _fold(_grouped_rows(qs, ["template__code"], score_statuses))
+
+
+__all__ = [
+    "ReportAggregate",
+    "aggregate_report",
+    "percent_expression",
+    "scored_filter",
+]
@@ -0,0 +1,144 @@
+# core/services/scoring.py
+"""
+محاسبه‌ی امتیاز ارزیابی (final_score / max_score) بدون کوئری برای هر آیتم.
+
+قاعده (همان Evaluation.recalc_scores قبلی):
+- امتیاز آیتم = مقدار گزینه‌ی انتخابی (یا selected_value برای آیتم بدون گزینه) × weight
+  (گزینه مرجع است؛ پس اصلاح FormOption.value با rescore در final_score هم اعمال می‌شود)
+- سقف آیتم = بیشترین مقدار گزینه‌های معیار × weight (آیتم بدون معیار سقف ندارد)
+- هر دو با دو رقم اعشار گرد می‌شوند
+
+دو مسیر:
+- score_items: تابع خالص روی داده‌ی از قبل خوانده‌شده (prefetch یا values)
+- score_evaluations: مسیر برداری برای چند ارزیابی؛ دو کوئری + groupby در pandas
+  (rescore_chunk همین را برای یک دسته اجرا و فقط تغییرها را bulk_update می‌کند)
+"""
+from decimal import Decimal
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+
+Scores = Tuple[float, float]
+
+
+class ItemRow(NamedTuple):
+    criterion_id: Optional[int]
+    weight: object
+    selected_value: object
+    option_value: object = None  # مقدار فعلی گزینه‌ی انتخابی؛ اگر هست بر selected_value مقدم است
+
+
+def max_values_from_options(options_by_criterion: Mapping[int, Iterable]) -> Dict[int, object]:
+    """criterion_id → بیشترین value گزینه‌ها (از گزینه‌های prefetch شده)"""
+    return {
+        cid: max((o.value for o in options), default=0)
+        for cid, options in options_by_criterion.items()
+    }
+
+
+def criterion_max_values(criterion_ids=None, template_ids=None) -> Dict[int, object]:
+    """criterion_id → بیشترین value گزینه‌ها، با یک کوئری aggregate"""
+    from django.db.models import Max
+
+    from core.models import FormOption
+
+    qs = FormOption.objects.all()
+    if criterion_ids is not None:
+        qs = qs.filter(criterion_id__in=set(criterion_ids))
+    if template_ids is not None:
+        qs = qs.filter(criterion__template_id__in=set(template_ids))
+    return dict(
+        qs.order_by().values("criterion_id").annotate(m=Max("value")).values_list("criterion_id", "m")
+    )
+
+
+def score_items(items: Iterable[ItemRow], max_by_criterion: Mapping[int, object]) -> Scores:
+    """(final_score, max_score) برای آیتم‌های یک ارزیابی"""
+    total = 0.0
+    max_total = 0.0
+    for it in items:
+        weight = float(it.weight or 1)
+        value = it.option_value if it.option_value is not None else it.selected_value
+        if value is not None:
+            total += float(value) * weight
+        if it.criterion_id:
+            max_total += float(max_by_criterion.get(it.criterion_id) or 0) * weight
+    return round(total, 2), round(max_total, 2)
+
+
+ITEM_VALUE_FIELDS = ("evaluation_id", "criterion_id", "weight", "selected_value", "selected_option__value")
+
+
+def score_evaluations(evaluation_ids: Iterable[int], criterion_weights: bool = False) -> Dict[int, Scores]:
+    """
+    امتیاز چند ارزیابی با هم (مثلاً بعد از اصلاح وزن‌های یک فرم).
+    آیتم‌ها با values() و سقف معیارها با یک aggregate خوانده و با pandas جمع زده می‌شوند.
+    criterion_weights: وزن فعلی FormCriterion به‌جای اسنپ‌شات آیتم (پیش‌نمایش --sync-weights)
+    ارزیابی بدون آیتم → (0, 0)
+    """
+    import pandas as pd
+
+    from core.models import EvaluationItem
+
+    ids = list(evaluation_ids)
+    result: Dict[int, Scores] = {ev_id: (0.0, 0.0) for ev_id in ids}
+    if not ids:
+        return result
+
+    fields = ITEM_VALUE_FIELDS + ("criterion__weight",) if criterion_weights else ITEM_VALUE_FIELDS
+    rows = list(EvaluationItem.objects.filter(evaluation_id__in=ids).values_list(*fields))
+    if not rows:
+        return result
+    df = pd.DataFrame.from_records(rows, columns=list(fields))
+    if criterion_weights:
+        # همان چیزی که --sync-weights می‌نویسد: آیتم‌های دارای معیار وزن معیار را می‌گیرند
+        df["weight"] = df["criterion__weight"].where(df["criterion_id"].notna(), df["weight"])
+
+    criterion_ids = df["criterion_id"].dropna().astype("int64").unique().tolist()
+    max_by_criterion = criterion_max_values(criterion_ids=criterion_ids)
+
+    weight = pd.to_numeric(df["weight"], errors="coerce").fillna(0).astype(float)
+    weight = weight.where(weight != 0, 1.0)  # مثل (weight or 1)
+    value = pd.to_numeric(df["selected_option__value"], errors="coerce").astype(float)
+    value = value.fillna(pd.to_numeric(df["selected_value"], errors="coerce").astype(float))
+    max_value = df["criterion_id"].map({cid: float(m or 0) for cid, m in max_by_criterion.items()}).fillna(0.0)
+
+    df["points"] = (value * weight).fillna(0.0)
+    df["max_points"] = max_value.astype(float) * weight
+    sums = df.groupby("evaluation_id")[["points", "max_points"]].sum()
+    for ev_id, points, max_points in sums.itertuples():
+        result[int(ev_id)] = (round(float(points), 2), round(float(max_points), 2))
+    return result
+
+
+def _as_decimal(value) -> Decimal:
+    return Decimal(str(value)).quantize(Decimal("0.01"))
+
+
+def rescore_chunk(evaluation_ids: Iterable[int], dry_run: bool = False, criterion_weights: bool = False) -> List[int]:
+    """
+    امتیاز یک دسته ارزیابی را دوباره محاسبه و فقط تغییر کرده‌ها را با یک bulk_update می‌نویسد.
+    شناسه‌ی ارزیابی‌های تغییر کرده را برمی‌گرداند (در dry_run چیزی نوشته نمی‌شود).
+    criterion_weights: مثل score_evaluations
+    """
+    from core.models import Evaluation
+
+    ids = list(evaluation_ids)
+    scores = score_evaluations(ids, criterion_weights=criterion_weights)
+    changed = []
+    current = Evaluation.objects.filter(pk__in=ids).values_list("pk", "final_score", "max_score")
+    for pk, old_final, old_max in current:
+        final, max_score = (_as_decimal(v) for v in scores[pk])
+        if old_final != final or old_max != max_score:
+            changed.append(Evaluation(pk=pk, final_score=final, max_score=max_score))
+    if changed and not dry_run:
+        Evaluation.objects.bulk_update(changed, ["final_score", "max_score"], batch_size=500)
+    return [ev.pk for ev in changed]
+
+
+__all__ = [
+    "ItemRow",
+    "max_values_from_options",
+    "criterion_max_values",
+    "score_items",
+    "score_evaluations",
+    "rescore_chunk",
+]
@@ -0,0 +1,158 @@
+# core/services/template_bundle.py
+"""
+بسته‌ی تغییرناپذیر معیارها/گزینه‌های هر نسخه‌ی فرم، کش‌شده در حافظه‌ی پروسه.
+
+فرم‌های Published تغییر نمی‌کنند (import_form_templates فقط Draft را بازنویسی می‌کند)،
+پس معیارها، گزینه‌ها و سقف امتیاز هر (code, version) یک بار خوانده می‌شوند و
+رندر فرم، امتیازدهی و is_complete دیگر کوئری قالب نمی‌زنند.
+
+ابطال:
+- هر ورودی با updated_at همان FormTemplate اعتبارسنجی می‌شود
+- ذخیره/حذف FormCriterion یا FormOption (مثلاً اصلاح در ادمین یا import روی Draft)
+  updated_at فرم را جلو می‌برد؛ پس بقیه‌ی پروسه‌ها هم در درخواست بعدی دوباره می‌خوانند
+"""
+from dataclasses import dataclass, field
+from decimal import Decimal
+from threading import Lock
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import FormCriterion, FormOption, FormTemplate
+
+
+@dataclass(frozen=True)
+class OptionSpec:
+    id: int
+    order: int
+    label: str
+    value: Decimal
+
+
+@dataclass(frozen=True)
+class CriterionSpec:
+    id: int
+    order: int
+    title: str
+    description: str
+    weight: Decimal
+    options: Tuple[OptionSpec, ...]
+
+    @property
+    def max_value(self):
+        return max((o.value for o in self.options), default=0)
+
+    @property
+    def is_required(self) -> bool:
+        """فقط معیارهای دارای گزینه نمره‌دار و اجباری‌اند (مثل is_complete)"""
+        return bool(self.options)
+
+
+@dataclass(frozen=True)
+class TemplateBundle:
+    template_id: int
+    code: str
+    version: int
+    stamp: object  # FormTemplate.updated_at هنگام بارگذاری
+    criteria: Tuple[CriterionSpec, ...]
+    by_id: Dict[int, CriterionSpec] = field(default_factory=dict, compare=False, repr=False)
+
+    def criterion(self, criterion_id) -> Optional[CriterionSpec]:
+        return self.by_id.get(criterion_id)
+
+    def options_by_criterion(self) -> Dict[int, Tuple[OptionSpec, ...]]:
+        return {c.id: c.options for c in self.criteria}
+
+    def max_by_criterion(self) -> Dict[int, object]:
+        return {c.id: c.max_value for c in self.criteria}
+
+
+_BUNDLES: Dict[Tuple[str, int], TemplateBundle] = {}
+_LOCK = Lock()
+
+
+def _load_bundle(tpl: FormTemplate) -> TemplateBundle:
+    options: Dict[int, list] = {}
+    for opt_id, cid, order, label, value in (
+        FormOption.objects.filter(criterion__template_id=tpl.pk)
+        .order_by("criterion_id", "order", "id")
+        .values_list("id", "criterion_id", "order", "label", "value")
+    ):
+        options.setdefault(cid, []).append(OptionSpec(opt_id, order, label, value))
+
+    criteria = tuple(
+        CriterionSpec(
+            id=cid, order=order, title=title or "", description=description or "",
+            weight=weight, options=tuple(options.get(cid, ())),
+        )
+        for cid, order, title, description, weight in (
+            FormCriterion.objects.filter(template_id=tpl.pk)
+            .order_by("order", "id")
+            .values_list("id", "order", "title", "description", "weight")
+        )
+    )
+    return TemplateBundle(
+        template_id=tpl.pk, code=tpl.code, version=tpl.version, stamp=tpl.updated_at,
+        criteria=criteria, by_id={c.id: c for c in criteria},
+    )
+
+
+def get_bundle(tpl: FormTemplate) -> TemplateBundle:
+    """بسته‌ی (code, version) فرم؛ اگر updated_at عوض شده باشد دوباره خوانده می‌شود"""
+    key = (tpl.code, tpl.version)
+    bundle = _BUNDLES.get(key)
+    if bundle is None or bundle.template_id != tpl.pk or bundle.stamp != tpl.updated_at:
+        bundle = _load_bundle(tpl)
+        with _LOCK:
+            _BUNDLES[key] = bundle
+    return bundle
+
+
+def get_bundle_for(template_id: int) -> TemplateBundle:
+    """مثل get_bundle وقتی فقط template_id در دست است (یک کوئری کوچک برای updated_at)"""
+    tpl = FormTemplate.objects.only("id", "code", "version", "updated_at").get(pk=template_id)
+    return get_bundle(tpl)
+
+
+def clear_bundles(template_ids: Optional[Iterable[int]] = None) -> None:
+    with _LOCK:
+        if template_ids is None:
+            _BUNDLES.clear()
+            return
+        ids = set(template_ids)
+        for key in [k for k, b in _BUNDLES.items() if b.template_id in ids]:
+            del _BUNDLES[key]
+
+
+def _touch_templates(qs) -> None:
+    # update() از auto_now رد می‌شود؛ مُهر زمان را دستی جلو می‌بریم
+    qs.update(updated_at=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=FormTemplate, dispatch_uid="template_bundle_template")
+def _on_template_changed(sender, instance, **kwargs):
+    clear_bundles([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=FormCriterion, dispatch_uid="template_bundle_criterion")
+def _on_criterion_changed(sender, instance, **kwargs):
+    _touch_templates(FormTemplate.objects.filter(pk=instance.template_id))
+    clear_bundles([instance.template_id])
+
+
+@receiver([post_save, post_delete], sender=FormOption, dispatch_uid="template_bundle_option")
+def _on_option_changed(sender, instance, **kwargs):
+    _touch_templates(FormTemplate.objects.filter(criteria__id=instance.criterion_id))
+    clear_bundles()
+
+
+__all__ = [
+    "OptionSpec",
+    "CriterionSpec",
+    "TemplateBundle",
+    "get_bundle",
+    "get_bundle_for",
+    "clear_bundles",
+]
@@ -0,0 +1,134 @@
+# core/services/unit_tree.py
+"""
+نگهداری جدول بستار UnitClosure برای درخت parent_unit.
+
+- ساخت/جابه‌جایی یک واحد: فقط ردیف‌های زیردرخت همان واحد عوض می‌شوند (چند کوئری ثابت).
+- حذف واحد: زیرمجموعه‌ها (SET_NULL) ریشه می‌شوند؛ پیوندشان با نیاهای قبلی پاک می‌شود.
+- queryset.update(parent_unit=...) از سیگنال رد می‌شود؛ بعدش rebuild_unit_closure لازم است.
+
+پرس‌وجوها:
+- descendant_units(unit): این واحد و همه‌ی زیرمجموعه‌ها با یک join (محدوده‌ی گزارش‌های مدیر واحد)
+"""
+from typing import Dict, Iterable, List, Optional
+
+from django.db import transaction
+from django.db.models.signals import post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from core.models import Unit, UnitClosure
+
+
+def _closure_rows(parents: Dict[int, Optional[int]], unit_ids: Iterable[int]) -> List[UnitClosure]:
+    """ردیف‌های بستار unit_ids از نگاشت id → parent_id (حلقه‌ها قطع می‌شوند)"""
+    rows = []
+    for unit_id in unit_ids:
+        seen = set()
+        node, depth = unit_id, 0
+        while node is not None and node not in seen and node in parents:
+            seen.add(node)
+            rows.append(UnitClosure(ancestor_id=node, descendant_id=unit_id, depth=depth))
+            node, depth = parents[node], depth + 1
+    return rows
+
+
+def _parent_chain(parents: Dict[int, Optional[int]]) -> Dict[int, Optional[int]]:
+    """
+    نیاهای بیرون از parents (مثلاً واحد والد در سازمان دیگر) را هم، سطح به سطح، اضافه می‌کند
+    تا بازسازی محدود به چند سازمان زنجیره‌ی کامل را ببیند.
+    """
+    chain = dict(parents)
+    missing = {p for p in chain.values() if p is not None and p not in chain}
+    while missing:
+        found = dict(Unit.objects.filter(pk__in=missing).values_list("pk", "parent_unit_id"))
+        chain.update(found)
+        missing = {p for p in found.values() if p is not None and p not in chain}
+    return chain
+
+
+def rebuild_unit_closure(organization_ids: Optional[Iterable[int]] = None, batch_size: int = 1000) -> int:
+    """
+    بازسازی جدول بستار (همه یا چند سازمان)؛ تعداد ردیف‌ها را برمی‌گرداند.
+    با organization_ids فقط ردیف‌هایی که نواده‌شان واحدی از این سازمان‌هاست بازسازی می‌شوند،
+    ولی زنجیره‌ی والدها تا ریشه (حتی بیرون از این سازمان‌ها) دنبال می‌شود.
+    """
+    units = Unit.objects.all()
+    if organization_ids is not None:
+        units = units.filter(organization_id__in=list(organization_ids))
+    parents = dict(units.values_list("pk", "parent_unit_id"))
+
+    rows = _closure_rows(_parent_chain(parents), parents)
+    with transaction.atomic():
+        UnitClosure.objects.filter(descendant_id__in=list(parents)).delete()
+        UnitClosure.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def descendant_units(unit, include_self: bool = True):
+    """queryset واحد و زیرمجموعه‌هایش (یک join روی UnitClosure)"""
+    links = {"ancestor_links__ancestor_id": getattr(unit, "pk", unit)}
+    if not include_self:
+        links["ancestor_links__depth__gt"] = 0
+    return Unit.objects.filter(**links)
+
+
+def move_unit(unit_id, parent_id) -> None:
+    """زیردرخت unit_id را زیر parent_id (یا ریشه) می‌برد"""
+    with transaction.atomic():
+        subtree = UnitClosure.objects.filter(ancestor_id=unit_id).values_list("descendant_id", "depth")
+        depths = dict(subtree)
+        if not depths:
+            # واحد تازه (یا خارج از جدول): فقط خودش
+            UnitClosure.objects.create(ancestor_id=unit_id, descendant_id=unit_id, depth=0)
+            depths = {unit_id: 0}
+
+        # پیوند زیردرخت با نیاهای قبلی
+        UnitClosure.objects.filter(descendant_id__in=list(depths)).exclude(ancestor_id__in=list(depths)).delete()
+        if parent_id is None:
+            return
+
+        above = UnitClosure.objects.filter(descendant_id=parent_id).values_list("ancestor_id", "depth")
+        UnitClosure.objects.bulk_create(
+            [
+                UnitClosure(ancestor_id=anc, descendant_id=desc, depth=anc_depth + desc_depth + 1)
+                for anc, anc_depth in above
+                for desc, desc_depth in depths.items()
+            ],
+            batch_size=1000,
+        )
+
+
+@receiver(pre_save, sender=Unit, dispatch_uid="unit_tree_no_cycle")
+def _check_cycle(sender, instance, raw=False, **kwargs):
+    # فرم‌ها (ادمین) حلقه را در Unit.clean می‌بینند؛ این فقط پشتیبان ذخیره‌های مستقیم است
+    if not raw and instance.parent_creates_cycle():
+        instance.clean()
+
+
+@receiver(post_save, sender=Unit, dispatch_uid="unit_tree_save")
+def _on_unit_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if not created:
+        current = UnitClosure.objects.filter(descendant_id=instance.pk, depth=1).values_list("ancestor_id", flat=True)
+        current = list(current)
+        has_self = current or UnitClosure.objects.filter(descendant_id=instance.pk, depth=0).exists()
+        if has_self and current == ([instance.parent_unit_id] if instance.parent_unit_id else []):
+            return
+    move_unit(instance.pk, instance.parent_unit_id)
+
+
+@receiver(pre_delete, sender=Unit, dispatch_uid="unit_tree_delete")
+def _on_unit_deleted(sender, instance, **kwargs):
+    # فرزندان با SET_NULL ریشه می‌شوند (بدون سیگنال)؛ پیوند زیردرخت‌شان با نیاهای این واحد قطع شود
+    below = UnitClosure.objects.filter(ancestor_id=instance.pk, depth__gt=0).values_list("descendant_id", flat=True)
+    UnitClosure.objects.filter(
+        descendant_id__in=list(below),
+        ancestor_id__in=list(UnitClosure.objects.filter(descendant_id=instance.pk).values_list("ancestor_id", flat=True)),
+    ).delete()
+
+
+__all__ = [
+    "rebuild_unit_closure",
+    "move_unit",
+    "descendant_units",
+]
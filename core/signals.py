@@ -0,0 +1,15 @@
+# core/signals.py
+"""
+سیگنال‌های دامنه‌ی ارزیابی.
+
+evaluation_changed بعد از هر تغییر ارزیابی از مسیرهای گردش‌کار
+(WorkflowEngine.approve / return_for_edit) و ویوهای ساخت/ویرایش/ذخیره ارسال می‌شود.
+آرگومان‌ها:
+  evaluation      نمونه‌ی Evaluation (یا None برای تغییرات گروهی)
+  user            کاربری که تغییر را انجام داده
+  status_changed  آیا وضعیت/آرشیو عوض شده (روی شمارنده‌های همه اثر دارد)
+  evaluator_ids   (اختیاری) ارزیاب‌های ارزیابی‌های تغییر کرده در تغییرات گروهی
+"""
+from django.dispatch import Signal
+
+evaluation_changed = Signal()
@@ -0,0 +1,204 @@
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.constants import Settings, WorkflowStatus
+from core.models import EmployeeProfile, Evaluation, EvaluationSignature, FormTemplate, JobRole, Organization, Unit
+from core.services.dashboard import dashboard_counters
+from core.services.org_scope import resolve_org_scope
+
+STATUSES = [
+    Evaluation.Status.DRAFT,
+    Evaluation.Status.SUBMITTED,
+    WorkflowStatus.HR_REVIEW,
+    WorkflowStatus.MANAGER_REVIEW,
+    WorkflowStatus.FACTORY_REVIEW,
+    WorkflowStatus.FINAL_APPROVED,
+    WorkflowStatus.HR_REJECTED,
+    Evaluation.Status.APPROVED,
+]
+
+LOCMEM = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "dashboard-tests"}}
+
+
+@override_settings(CACHES=LOCMEM)
+class DashboardQueryCountTests(TestCase):
+    """تعداد کوئری شمارنده‌ها و داشبورد نباید با تعداد ارزیابی‌ها رشد کند"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.org = Organization.objects.create(name="Org")
+        cls.unit = Unit.objects.create(organization=cls.org, name="U", unit_code="300")
+        job_role = JobRole.objects.create(name="FM", code=Settings.ROLE_FACTORY_MANAGER, organization=cls.org)
+        cls.template = FormTemplate.objects.create(code=Settings.FORM_CODE_MANAGER, name="T", status="Published", version=1)
+        cls.user = User.objects.create(username="900000")
+        EmployeeProfile.objects.create(
+            user=cls.user, organization=cls.org, unit=cls.unit, job_role=job_role, personnel_code="900000"
+        )
+
+    def _make_evaluations(self, n):
+        start = Evaluation.objects.count()
+        for k in range(start, start + n):
+            ev = Evaluation.objects.create(
+                template=self.template, template_version=1, employee_id=f"{k:06d}", employee_name=f"E{k}",
+                unit_code=self.unit.unit_code, status=STATUSES[k % len(STATUSES)], evaluator=self.user,
+                period_start=date(2025, 1, 1), period_end=date(2025, 3, 31), is_archived=(k % 5 == 0),
+                final_score=Decimal(12), max_score=Decimal(24),
+            )
+            if k % 3 == 0:
+                EvaluationSignature.objects.create(evaluation=ev, evaluator=self.user, role="hr")
+
+    def _counters_queries(self):
+        user = User.objects.get(pk=self.user.pk)
+        resolve_org_scope(user)
+        with CaptureQueriesContext(connection) as ctx:
+            counters = dashboard_counters(user)
+        return len(ctx), counters
+
+    def test_counters_single_query(self):
+        self._make_evaluations(len(STATUSES))
+        n_queries, counters = self._counters_queries()
+        self.assertEqual(n_queries, 1)
+        self.assertEqual(counters["count_hr"], 1)
+        self.assertEqual(counters["count_submitted"], 1)
+
+        self._make_evaluations(10 * len(STATUSES))
+        n_queries, counters = self._counters_queries()
+        self.assertEqual(n_queries, 1)
+        self.assertEqual(counters["count_final"], Evaluation.objects.filter(
+            status=WorkflowStatus.FINAL_APPROVED, is_archived=False
+        ).count())
+
+    def _dashboard_queries(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("eval_dashboard"))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx)
+
+    def test_dashboard_view_query_count_is_constant(self):
+        from django.core.cache import cache
+
+        self._make_evaluations(len(STATUSES))
+        cache.clear()
+        self._dashboard_queries()  # گرم‌کردن کش‌های درون‌پردازه‌ای (بسته‌ی فرم)
+        cache.clear()
+        baseline = self._dashboard_queries()
+
+        self._make_evaluations(10 * len(STATUSES))
+        cache.clear()
+        with self.assertNumQueries(baseline):
+            self.client.get(reverse("eval_dashboard"))
+
+    def test_todo_is_not_served_from_cache(self):
+        from django.core.cache import cache
+
+        from core.views.manager.evaluations import _subtract_months
+
+        head_role = JobRole.objects.create(name="SH", code=Settings.ROLE_SECTION_HEAD, organization=self.org)
+        head = User.objects.create(username="200000")
+        EmployeeProfile.objects.create(
+            user=head, organization=self.org, unit=self.unit, job_role=head_role, personnel_code="200000"
+        )
+        cache.clear()
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("eval_dashboard"))
+        self.assertIn("200000", [p.personnel_code for p in response.context["todo"]])
+
+        # ارزیاب دیگری برای همان نفر پیش‌نویس می‌سازد؛ کش داشبورد این کاربر باطل نمی‌شود
+        today = date.today()
+        Evaluation.objects.create(
+            template=self.template, template_version=1, employee_id="200000", employee_name="H",
+            unit_code=self.unit.unit_code, evaluator=head,
+            period_start=_subtract_months(today, 3), period_end=today,
+        )
+        response = self.client.get(reverse("eval_dashboard"))
+        self.assertNotIn("200000", [p.personnel_code for p in response.context["todo"]])
+
+
+@override_settings(CACHES=LOCMEM)
+class DashboardInvalidationTests(TestCase):
+    """تغییر وضعیت فقط داشبورد ارزیاب و تأییدکننده‌های همان سازمان را باطل می‌کند"""
+
+    @classmethod
+    def setUpTestData(cls):
+        org = Organization.objects.create(name="Org")
+        other_org = Organization.objects.create(name="Other")
+        unit = Unit.objects.create(organization=org, name="U", unit_code="300")
+        other_unit = Unit.objects.create(organization=other_org, name="V", unit_code="400")
+        manager_role = JobRole.objects.create(name="M", code=Settings.ROLE_UNIT_MANAGER, organization=org)
+        employee_role = JobRole.objects.create(name="E", code="904", organization=org)
+
+        def person(username, unit, job_role):
+            user = User.objects.create(username=username)
+            EmployeeProfile.objects.create(
+                user=user, organization=unit.organization, unit=unit, job_role=job_role, personnel_code=username
+            )
+            return user
+
+        cls.evaluator = person("100001", unit, employee_role)
+        cls.approver = person("100002", unit, manager_role)
+        cls.colleague = person("100003", unit, employee_role)
+        cls.outsider = person("100004", other_unit, manager_role)
+        template = FormTemplate.objects.create(code="HR-F-80", name="T", status="Published", version=1)
+        cls.evaluation = Evaluation.objects.create(
+            template=template, template_version=1, employee_id="200001", employee_name="E",
+            unit_code=unit.unit_code, evaluator=cls.evaluator,
+            period_start=date(2025, 1, 1), period_end=date(2025, 3, 31),
+        )
+
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.builds = []
+
+    def _context(self, user):
+        from core.services.dashboard_cache import cached_dashboard_context
+
+        return cached_dashboard_context(user, None, 3, lambda: self.builds.append(user.pk) or {})
+
+    def _counters(self, user):
+        from core.services.dashboard_cache import cached_dashboard_counters
+
+        return cached_dashboard_counters(user, lambda: self.builds.append(("counters", user.pk)) or {})
+
+    def test_status_change_invalidates_evaluator_and_approvers_only(self):
+        from core.signals import evaluation_changed
+
+        users = [self.evaluator, self.approver, self.colleague, self.outsider]
+        for user in users:
+            self._context(user)
+            self._counters(user)
+        self.builds.clear()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            evaluation_changed.send(
+                sender=Evaluation, evaluation=self.evaluation, user=self.evaluator, status_changed=True
+            )
+        for user in users:
+            self._context(user)
+        self.assertEqual(sorted(self.builds), sorted([self.evaluator.pk, self.approver.pk]))
+
+        # شمارنده‌ها بین همه مشترک‌اند و برای همه دوباره ساخته می‌شوند
+        self.builds.clear()
+        self._counters(self.outsider)
+        self.assertEqual(self.builds, [("counters", self.outsider.pk)])
+
+    def test_bulk_change_invalidates_everyone(self):
+        from core.signals import evaluation_changed
+
+        for user in (self.colleague, self.outsider):
+            self._context(user)
+        self.builds.clear()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            evaluation_changed.send(sender=Evaluation, evaluation=None, user=self.evaluator, status_changed=True)
+        for user in (self.colleague, self.outsider):
+            self._context(user)
+        self.assertEqual(sorted(self.builds), sorted([self.colleague.pk, self.outsider.pk]))
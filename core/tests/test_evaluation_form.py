@@ -0,0 +1,93 @@
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.models import Evaluation, EvaluationItem, FormCriterion, FormOption, FormTemplate
+from core.services.evaluation_form import NotDraft, StaleRevision, autosave_choices
+
+
+class AutosaveTests(TestCase):
+    """قفل خوش‌بینانه‌ی autosave: نسخه‌ی قدیمی، ذخیره‌ی بی‌تغییر و فرم غیرپیش‌نویس"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.evaluator = User.objects.create(username="900000")
+        template = FormTemplate.objects.create(code="HR-F-80", name="T", status="Published", version=1)
+        cls.evaluation = Evaluation.objects.create(
+            template=template, template_version=1, employee_id="100001", employee_name="E",
+            unit_code="300", evaluator=cls.evaluator,
+            period_start=date(2025, 1, 1), period_end=date(2025, 3, 31),
+        )
+        cls.items, cls.options = [], []
+        for i in range(1, 3):
+            criterion = FormCriterion.objects.create(template=template, order=i, title=f"c{i}", weight=Decimal(i))
+            options = [
+                FormOption.objects.create(criterion=criterion, order=j, label=f"l{v}", value=Decimal(v))
+                for j, v in enumerate([4, 2], 1)
+            ]
+            cls.options.append(options)
+            cls.items.append(EvaluationItem.objects.create(
+                evaluation=cls.evaluation, criterion=criterion, criterion_order=i, criterion_title=f"c{i}",
+                weight=criterion.weight,
+            ))
+
+    def _fresh(self):
+        return Evaluation.objects.select_related("template").get(pk=self.evaluation.pk)
+
+    def test_autosave_writes_changes_and_bumps_revision(self):
+        ev = self._fresh()
+        changed = autosave_choices(ev, ev.revision, {self.items[0].pk: self.options[0][0].pk})
+        self.assertEqual(changed, 1)
+        ev.refresh_from_db()
+        self.assertEqual(ev.revision, 1)
+        self.assertEqual(ev.final_score, Decimal("4.00"))
+        self.assertEqual(ev.filled_items, 1)
+        item = EvaluationItem.objects.get(pk=self.items[0].pk)
+        self.assertEqual((item.selected_option_id, item.earned_points), (self.options[0][0].pk, Decimal("4.00")))
+
+    def test_stale_revision_is_rejected(self):
+        ev = self._fresh()
+        autosave_choices(ev, 0, {self.items[0].pk: self.options[0][0].pk})
+        with self.assertRaises(StaleRevision) as ctx:
+            autosave_choices(self._fresh(), 0, {self.items[1].pk: self.options[1][1].pk})
+        self.assertEqual(ctx.exception.current, 1)
+        self.assertIsNone(EvaluationItem.objects.get(pk=self.items[1].pk).selected_option_id)
+
+    def test_unchanged_autosave_does_not_write(self):
+        ev = self._fresh()
+        autosave_choices(ev, 0, {self.items[0].pk: self.options[0][0].pk})
+        ev = self._fresh()
+        updated_at = ev.updated_at
+        with CaptureQueriesContext(connection) as ctx:
+            changed = autosave_choices(ev, 1, {self.items[0].pk: self.options[0][0].pk})
+        self.assertEqual(changed, 0)
+        self.assertFalse([q for q in ctx.captured_queries if q["sql"].lstrip().upper().startswith("UPDATE")])
+        ev.refresh_from_db()
+        self.assertEqual((ev.revision, ev.updated_at), (1, updated_at))
+
+    def test_non_draft_is_rejected_under_lock(self):
+        ev = self._fresh()  # نمونه‌ی قدیمی هنوز Draft است
+        Evaluation.objects.filter(pk=ev.pk).update(status=Evaluation.Status.SUBMITTED)
+        with self.assertRaises(NotDraft):
+            autosave_choices(ev, 0, {self.items[0].pk: self.options[0][0].pk})
+        Evaluation.objects.filter(pk=ev.pk).update(status=Evaluation.Status.DRAFT, is_archived=True)
+        with self.assertRaises(NotDraft):
+            autosave_choices(self._fresh(), 0, {self.items[0].pk: self.options[0][0].pk})
+        self.assertIsNone(EvaluationItem.objects.get(pk=self.items[0].pk).selected_option_id)
+        self.assertEqual(Evaluation.objects.get(pk=ev.pk).revision, 0)
+
+    def test_autosave_view_status_codes(self):
+        self.client.force_login(self.evaluator)
+        url = reverse("eval_autosave", args=[self.evaluation.pk])
+        body = {"revision": 0, "items": {str(self.items[0].pk): self.options[0][0].pk}}
+        response = self.client.post(url, body, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["revision"], 1)
+        response = self.client.post(url, body, content_type="application/json")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["revision"], 1)
@@ -0,0 +1,110 @@
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from core.models import EmployeeProfile, EvaluationLink, Organization, Unit
+from core.services.evaluation_links import LinkType, diff_links, rebuild_links
+from core.services.org_graph import graph_version
+
+LOCMEM = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "links-tests"}}
+TYPES = [LinkType.DIRECT_SUPERVISOR, LinkType.UNIT_MANAGER]
+
+
+@override_settings(CACHES=LOCMEM)
+class RebuildLinksTests(TestCase):
+    """ساخت مجموعه‌ای لینک‌ها: ایجاد، تغییر ارزیاب، حذف، نسخه‌ی گراف و idempotence"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.org = Organization.objects.create(name="Org")
+        users = {name: User.objects.create(username=name) for name in ("head", "manager", "sup", "a", "b", "c")}
+        cls.users = users
+        unit = Unit.objects.create(organization=cls.org, name="U", unit_code="300", manager=users["manager"])
+
+        def profile(name, unit=None, supervisor=None):
+            EmployeeProfile.objects.create(
+                user=users[name], organization=cls.org, unit=unit, direct_supervisor=supervisor, personnel_code=name
+            )
+
+        profile("head")
+        profile("manager", unit)
+        profile("sup", unit)
+        profile("a", unit, users["sup"])
+        profile("b", unit, users["sup"])
+        profile("c")
+
+        def link(sub, link_type, evaluator):
+            EvaluationLink.objects.create(
+                organization=cls.org, subordinate=users[sub], link_type=link_type, evaluator=users[evaluator]
+            )
+
+        link("a", LinkType.DIRECT_SUPERVISOR, "head")  # ارزیاب عوض می‌شود → update
+        link("b", LinkType.DIRECT_SUPERVISOR, "sup")  # بدون تغییر
+        link("b", LinkType.DIRECT_SUPERVISOR, "head")  # تکراری همان کلید → delete
+        link("c", LinkType.DIRECT_SUPERVISOR, "head")  # دیگر مطلوب نیست → delete
+        link("a", LinkType.ORG_HEAD, "head")  # نوع خواسته‌نشده → دست نمی‌خورد
+
+    def _links(self):
+        u = {user.pk: name for name, user in self.users.items()}
+        return {
+            (u[sub], lt, u[ev])
+            for sub, lt, ev in EvaluationLink.objects.values_list("subordinate_id", "link_type", "evaluator_id")
+        }
+
+    def _existing(self):
+        return list(
+            EvaluationLink.objects.filter(organization=self.org)
+            .values_list("pk", "subordinate_id", "link_type", "evaluator_id")
+        )
+
+    def test_diff_branches(self):
+        diff = rebuild_links(self.org.pk, self.users["head"].pk, TYPES, dry_run=True)
+        by_pk = {pk: (sub, lt, ev) for pk, sub, lt, ev in self._existing()}
+        u = self.users
+
+        self.assertEqual(
+            sorted((key, ev) for key, ev in diff.create),
+            sorted([
+                ((u["a"].pk, LinkType.UNIT_MANAGER), u["manager"].pk),
+                ((u["b"].pk, LinkType.UNIT_MANAGER), u["manager"].pk),
+                ((u["sup"].pk, LinkType.UNIT_MANAGER), u["manager"].pk),
+            ]),
+        )
+        self.assertEqual(
+            [(by_pk[pk][:2], ev) for pk, ev in diff.update],
+            [((u["a"].pk, LinkType.DIRECT_SUPERVISOR), u["sup"].pk)],
+        )
+        self.assertEqual(
+            sorted(by_pk[pk] for pk in diff.delete),
+            sorted([
+                (u["b"].pk, LinkType.DIRECT_SUPERVISOR, u["head"].pk),
+                (u["c"].pk, LinkType.DIRECT_SUPERVISOR, u["head"].pk),
+            ]),
+        )
+        self.assertEqual(diff.counts[(LinkType.DIRECT_SUPERVISOR, "unchanged")], 1)
+        # dry_run چیزی نمی‌نویسد
+        self.assertEqual(len(self._existing()), 5)
+
+    def test_keep_stale_only_drops_duplicates(self):
+        desired = {(self.users["b"].pk, LinkType.DIRECT_SUPERVISOR): self.users["sup"].pk}
+        diff = diff_links(self._existing(), desired, TYPES, keep_stale=True)
+        self.assertEqual(len(diff.delete), 1)
+        self.assertEqual((diff.create, diff.update), ([], []))
+
+    def test_apply_writes_bumps_graph_and_is_idempotent(self):
+        before = graph_version(self.org.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            rebuild_links(self.org.pk, self.users["head"].pk, TYPES)
+        self.assertNotEqual(graph_version(self.org.pk), before)
+
+        self.assertEqual(self._links(), {
+            ("a", LinkType.DIRECT_SUPERVISOR, "sup"),
+            ("b", LinkType.DIRECT_SUPERVISOR, "sup"),
+            ("a", LinkType.UNIT_MANAGER, "manager"),
+            ("b", LinkType.UNIT_MANAGER, "manager"),
+            ("sup", LinkType.UNIT_MANAGER, "manager"),
+            ("a", LinkType.ORG_HEAD, "head"),
+        })
+
+        # اجرای دوم: diff خالی
+        diff = rebuild_links(self.org.pk, self.users["head"].pk, TYPES)
+        self.assertEqual((diff.create, diff.update, diff.delete), ([], [], []))
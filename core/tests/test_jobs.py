@@ -0,0 +1,81 @@
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.storage import FileSystemStorage
+from django.test import TestCase
+from django.urls import reverse
+
+from core.models import BackgroundJob
+from core.services import jobs
+
+PAYLOAD = b"x" * 100_000
+
+
+@jobs.job_handler("test_blob")
+def _blob_job(ctx, size=len(PAYLOAD)):
+    ctx.out.write(PAYLOAD[:size])
+    return "blob.bin", "application/octet-stream"
+
+
+class JobResultFileTests(TestCase):
+    """خروجی کار پس‌زمینه روی دیسک: ذخیره، دانلود تدریجی، سقف حجم و پاک‌سازی"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="root", is_staff=True, is_superuser=True)
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        self.storage = FileSystemStorage(location=root)
+        field = BackgroundJob._meta.get_field("result_file")
+        patcher = mock.patch.object(field, "storage", self.storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _run(self, **params):
+        jobs.enqueue("test_blob", params, user=self.user)
+        return jobs.run_job(jobs.claim_next("test"))
+
+    def test_result_is_stored_as_file_and_streamed(self):
+        job = self._run()
+        self.assertEqual(job.status, BackgroundJob.Status.DONE)
+        self.assertTrue(self.storage.exists(job.result_file.name))
+        self.assertEqual(self.storage.size(job.result_file.name), len(PAYLOAD))
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("admin:reports_job_download", args=[job.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('filename="blob.bin"', response["Content-Disposition"])
+        self.assertEqual(b"".join(response.streaming_content), PAYLOAD)
+
+    def test_oversized_result_fails_cleanly(self):
+        with mock.patch.object(jobs, "MAX_RESULT_BYTES", 1000):
+            job = self._run()
+        job.refresh_from_db()
+        self.assertEqual(job.status, BackgroundJob.Status.FAILED)
+        self.assertIn("1000", job.error)
+        self.assertFalse(job.result_file)
+        self.assertEqual(self.storage.listdir("")[1], [])
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("admin:reports_job_download", args=[job.pk]))
+        self.assertEqual(response.status_code, 409)
+
+    def test_missing_file_is_gone(self):
+        job = self._run(size=10)
+        self.storage.delete(job.result_file.name)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("admin:reports_job_download", args=[job.pk]))
+        self.assertEqual(response.status_code, 410)
+
+    def test_purge_deletes_result_files(self):
+        job = self._run(size=10)
+        name = job.result_file.name
+        BackgroundJob.objects.filter(pk=job.pk).update(created_at=job.created_at.replace(year=2000))
+        self.assertEqual(jobs.purge_jobs(timedelta(days=1)), 1)
+        self.assertFalse(self.storage.exists(name))
@@ -0,0 +1,76 @@
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from core.models import Evaluation, FormTemplate, Organization, Unit
+from core.services.evaluation_stats import aggregate_stats_by_unit, rebuild_evaluation_stats
+from core.services.report_aggregates import aggregate_report
+
+
+class ReportAggregateQueryCountTests(TestCase):
+    """تعداد کوئری گزارش‌ها نباید با تعداد واحدها رشد کند"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.org = Organization.objects.create(name="Org")
+        cls.template = FormTemplate.objects.create(code="HR-F-80", name="T", status="Published", version=1)
+        cls.evaluator = User.objects.create(username="900000")
+
+    def _make_units(self, n_units, per_unit=3):
+        statuses = [Evaluation.Status.DRAFT, Evaluation.Status.APPROVED, Evaluation.Status.FINAL_APPROVED]
+        for u in range(n_units):
+            unit = Unit.objects.create(organization=self.org, name=f"U{u}", unit_code=str(300 + u))
+            for k in range(per_unit):
+                Evaluation.objects.create(
+                    template=self.template, template_version=1, employee_id=f"{u}{k:04d}",
+                    employee_name=f"E{u}{k}", unit_code=unit.unit_code, status=statuses[k % len(statuses)],
+                    evaluator=self.evaluator, period_start=date(2025, 1, 1), period_end=date(2025, 12, 31),
+                    final_score=Decimal(12), max_score=Decimal(24),
+                )
+        rebuild_evaluation_stats()
+
+    def test_aggregate_report_single_unit(self):
+        self._make_units(1)
+        with self.assertNumQueries(1):
+            agg = aggregate_report(Evaluation.objects.all(), score_statuses=[Evaluation.Status.APPROVED])
+        self.assertEqual(agg.total, 3)
+        self.assertEqual(agg.count(Evaluation.Status.APPROVED), 1)
+        self.assertAlmostEqual(agg.avg_percent, 50.0)
+
+    def test_aggregate_report_many_units(self):
+        self._make_units(8)
+        with self.assertNumQueries(1):
+            agg = aggregate_report(Evaluation.objects.all(), score_statuses=[Evaluation.Status.APPROVED])
+        self.assertEqual(agg.total, 24)
+        self.assertEqual(agg.count(Evaluation.Status.DRAFT), 8)
+        self.assertEqual(agg.by_form(), [{"template__code": "HR-F-80", "avg_percent": 50.0}])
+
+    def test_rated_count_keeps_zero_max_rows(self):
+        self._make_units(1)
+        ev = Evaluation.objects.get(status=Evaluation.Status.APPROVED)
+        Evaluation.objects.create(
+            template=self.template, template_version=1, employee_id="99999", employee_name="Z",
+            unit_code=ev.unit_code, status=Evaluation.Status.APPROVED, evaluator=self.evaluator,
+            period_start=date(2025, 1, 1), period_end=date(2025, 12, 31),
+            final_score=Decimal(0), max_score=Decimal(0),
+        )
+        agg = aggregate_report(Evaluation.objects.all(), score_statuses=[Evaluation.Status.APPROVED])
+        # خلاصه‌ی ادمین همه‌ی تأییدشده‌های دارای امتیاز را می‌شمارد؛ میانگین فقط درصدهای معتبر
+        self.assertEqual((agg.rated_count, agg.pct_count), (2, 1))
+        self.assertAlmostEqual(agg.avg_percent, 50.0)
+
+    def test_stats_by_unit_single_unit(self):
+        self._make_units(1)
+        with self.assertNumQueries(1):
+            per_unit = aggregate_stats_by_unit()
+        self.assertEqual(set(per_unit), {"300"})
+        self.assertEqual(per_unit["300"].total, 3)
+
+    def test_stats_by_unit_many_units(self):
+        self._make_units(8)
+        with self.assertNumQueries(1):
+            per_unit = aggregate_stats_by_unit()
+        self.assertEqual(len(per_unit), 8)
+        self.assertTrue(all(agg.total == 3 for agg in per_unit.values()))
@@ -0,0 +1,51 @@
+import io
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+
+from core.models import Evaluation, EvaluationItem, FormCriterion, FormOption, FormTemplate
+
+
+class RescoreDryRunTests(TestCase):
+    """dry-run با --sync-weights باید همان تعدادی را گزارش کند که اجرای واقعی تغییر می‌دهد"""
+
+    @classmethod
+    def setUpTestData(cls):
+        evaluator = User.objects.create(username="900000")
+        cls.template = FormTemplate.objects.create(code="HR-F-80", name="T", status="Published", version=1)
+        criterion = FormCriterion.objects.create(template=cls.template, order=1, title="c", weight=Decimal(1))
+        option = FormOption.objects.create(criterion=criterion, order=1, label="l", value=Decimal(4))
+        for k in range(3):
+            ev = Evaluation.objects.create(
+                template=cls.template, template_version=1, employee_id=f"10000{k}", employee_name="E",
+                unit_code="300", evaluator=evaluator, period_start=date(2025, 1, 1), period_end=date(2025, 3, 31),
+                final_score=Decimal(4), max_score=Decimal(4),
+            )
+            EvaluationItem.objects.create(
+                evaluation=ev, criterion=criterion, criterion_order=1, criterion_title="c", weight=Decimal(1),
+                selected_option=option, selected_value=option.value, earned_points=Decimal(4),
+            )
+        # اصلاح وزن معیار؛ اسنپ‌شات آیتم‌ها هنوز وزن قبلی را دارند
+        FormCriterion.objects.filter(pk=criterion.pk).update(weight=Decimal(2))
+
+    def _rescore(self, **opts):
+        out = io.StringIO()
+        call_command("rescore_evaluations", template=self.template.code, stdout=out, **opts)
+        return out.getvalue()
+
+    def test_dry_run_applies_synced_weights_in_memory(self):
+        self.assertIn("Done: 0 of 3 evaluation score(s) would change", self._rescore(dry_run=True))
+
+        output = self._rescore(dry_run=True, sync_weights=True)
+        self.assertIn("Item weights to sync: 3", output)
+        self.assertIn("Done: 3 of 3 evaluation score(s) would change", output)
+        self.assertEqual(set(Evaluation.objects.values_list("final_score", flat=True)), {Decimal(4)})
+        self.assertEqual(set(EvaluationItem.objects.values_list("weight", flat=True)), {Decimal(1)})
+
+        self.assertIn("Done: 3 of 3 evaluation score(s) updated", self._rescore(sync_weights=True))
+        self.assertEqual(
+            set(Evaluation.objects.values_list("final_score", "max_score")), {(Decimal(8), Decimal(8))}
+        )
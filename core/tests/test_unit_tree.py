@@ -0,0 +1,49 @@
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+
+from core.models import Organization, Unit, UnitClosure
+from core.services.unit_tree import descendant_units, rebuild_unit_closure
+
+
+def _pairs(unit_ids):
+    return set(
+        UnitClosure.objects.filter(descendant_id__in=unit_ids).values_list("ancestor_id", "descendant_id", "depth")
+    )
+
+
+class UnitTreeTests(TestCase):
+    """جدول بستار واحدها: زیردرخت، جلوگیری از حلقه و بازسازی محدود به سازمان"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.org = Organization.objects.create(name="Org")
+        cls.other_org = Organization.objects.create(name="Other")
+        # ریشه در سازمان دیگر؛ a → b → c در Org
+        cls.root = Unit.objects.create(organization=cls.other_org, name="R", unit_code="100")
+        cls.a = Unit.objects.create(organization=cls.org, name="A", unit_code="200", parent_unit=cls.root)
+        cls.b = Unit.objects.create(organization=cls.org, name="B", unit_code="300", parent_unit=cls.a)
+        cls.c = Unit.objects.create(organization=cls.org, name="C", unit_code="400", parent_unit=cls.b)
+
+    def test_descendant_units(self):
+        self.assertEqual(set(descendant_units(self.a)), {self.a, self.b, self.c})
+        self.assertEqual(set(descendant_units(self.a.pk, include_self=False)), {self.b, self.c})
+        self.assertEqual(set(descendant_units(self.c)), {self.c})
+
+    def test_cycle_is_a_validation_error(self):
+        self.a.parent_unit = self.c
+        with self.assertRaises(ValidationError) as ctx:
+            self.a.full_clean()
+        self.assertIn("parent_unit", ctx.exception.message_dict)
+        with self.assertRaises(ValidationError):
+            self.a.save()
+        self.assertEqual(Unit.objects.get(pk=self.a.pk).parent_unit_id, self.root.pk)
+
+    def test_org_scoped_rebuild_keeps_cross_org_ancestors(self):
+        ids = [self.a.pk, self.b.pk, self.c.pk]
+        expected = _pairs(ids)
+        self.assertIn((self.root.pk, self.c.pk, 3), expected)
+
+        UnitClosure.objects.filter(descendant_id__in=ids).delete()
+        rebuild_unit_closure(organization_ids=[self.org.pk])
+        self.assertEqual(_pairs(ids), expected)
+        self.assertEqual(_pairs([self.root.pk]), {(self.root.pk, self.root.pk, 0)})
@@ -0,0 +1,130 @@
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.approval.roles import ApprovalRole
+from core.approval.statuses import EvaluationStatus
+from core.approval.workflow_engine import WorkflowEngine
+from core.constants import Settings
+from core.models import (
+    EmployeeProfile, Evaluation, EvaluationSignature, EvaluationTransition, FormTemplate, JobRole, Organization, Unit,
+)
+
+
+class ApproveManyTests(TestCase):
+    """تأیید گروهی: بررسی مرحله/نقش برای هر مورد، شکست جزئی و تعداد کوئری ثابت"""
+
+    @classmethod
+    def setUpTestData(cls):
+        org = Organization.objects.create(name="Org")
+        cls.unit = Unit.objects.create(organization=org, name="U", unit_code="300")
+        job_role = JobRole.objects.create(name="FM", code=Settings.ROLE_FACTORY_MANAGER, organization=org)
+        cls.user = User.objects.create(username="900000", first_name="F", last_name="M")
+        EmployeeProfile.objects.create(
+            user=cls.user, organization=org, unit=cls.unit, job_role=job_role, personnel_code="900000"
+        )
+        cls.template = FormTemplate.objects.create(code="HR-F-80", name="T", status="Published", version=1)
+
+    def _make(self, status, n=1):
+        start = Evaluation.objects.count()
+        return [
+            Evaluation.objects.create(
+                template=self.template, template_version=1, employee_id=f"{k:06d}", employee_name=f"E{k}",
+                unit_code=self.unit.unit_code, status=status, evaluator=self.user,
+                period_start=date(2025, 1, 1), period_end=date(2025, 3, 31),
+            ).pk
+            for k in range(start, start + n)
+        ]
+
+    def _status(self, pk):
+        return Evaluation.objects.values_list("status", flat=True).get(pk=pk)
+
+    def test_partial_failure(self):
+        ok_ids = self._make(EvaluationStatus.FACTORY_REVIEW, 2)
+        wrong_stage = self._make(EvaluationStatus.SUBMITTED)[0]
+        draft = self._make(EvaluationStatus.DRAFT)[0]
+        ids = [ok_ids[0], wrong_stage, "x", 999999, ok_ids[1], draft, ok_ids[0]]
+
+        results = WorkflowEngine.approve_many(self.user, ids, role=ApprovalRole.FACTORY_MANAGER)
+
+        # ورودی نامعتبر و تکراری حذف می‌شود؛ ترتیب ورودی حفظ می‌شود
+        self.assertEqual([r.evaluation_id for r in results], [ok_ids[0], wrong_stage, 999999, ok_ids[1], draft])
+        self.assertEqual([r.ok for r in results], [True, False, False, True, False])
+        self.assertEqual(results[0].status, EvaluationStatus.FINAL_APPROVED)
+        self.assertEqual(results[1].status, EvaluationStatus.SUBMITTED)
+        self.assertTrue(all(r.error for r in results if not r.ok))
+
+        for pk in ok_ids:
+            self.assertEqual(self._status(pk), EvaluationStatus.FINAL_APPROVED)
+        self.assertEqual(self._status(wrong_stage), EvaluationStatus.SUBMITTED)
+        self.assertEqual(self._status(draft), EvaluationStatus.DRAFT)
+        signatures = EvaluationSignature.objects.filter(role=ApprovalRole.FACTORY_MANAGER.value)
+        self.assertEqual(sorted(signatures.values_list("evaluation_id", flat=True)), sorted(ok_ids))
+        self.assertTrue(all(signatures.values_list("is_final", flat=True)))
+        self.assertEqual(
+            sorted(EvaluationTransition.objects.values_list("evaluation_id", "to_status")),
+            sorted((pk, EvaluationStatus.FINAL_APPROVED.value) for pk in ok_ids),
+        )
+
+    def test_per_item_role_and_stage_checks(self):
+        submitted = self._make(EvaluationStatus.SUBMITTED)[0]
+        factory = self._make(EvaluationStatus.FACTORY_REVIEW)[0]
+
+        # HR فقط مرحله‌ی SUBMITTED را تأیید می‌کند
+        results = WorkflowEngine.approve_many(self.user, [submitted, factory], role=ApprovalRole.HR)
+        self.assertEqual([r.ok for r in results], [True, False])
+        self.assertEqual(self._status(submitted), EvaluationStatus.FACTORY_REVIEW)
+        self.assertEqual(self._status(factory), EvaluationStatus.FACTORY_REVIEW)
+
+        # بدون نقش: هیچ چیز نوشته نمی‌شود
+        results = WorkflowEngine.approve_many(self.user, [submitted, factory], role=None)
+        self.assertFalse(any(r.ok for r in results))
+        self.assertEqual(EvaluationSignature.objects.count(), 1)
+
+        # مرحله‌ی آخر: نقش مجاز است ولی مرحله‌ی بعدی وجود ندارد
+        final = self._make(EvaluationStatus.FINAL_APPROVED)[0]
+        (result,) = WorkflowEngine.approve_many(self.user, [final], role=ApprovalRole.FINAL)
+        self.assertFalse(result.ok)
+        self.assertEqual(self._status(final), EvaluationStatus.FINAL_APPROVED)
+
+    def test_existing_signature_is_not_duplicated(self):
+        pk = self._make(EvaluationStatus.FACTORY_REVIEW)[0]
+        EvaluationSignature.objects.create(evaluation_id=pk, evaluator=self.user, role=ApprovalRole.FACTORY_MANAGER.value)
+        (result,) = WorkflowEngine.approve_many(self.user, [pk], role=ApprovalRole.FACTORY_MANAGER)
+        self.assertTrue(result.ok)
+        self.assertEqual(EvaluationSignature.objects.filter(evaluation_id=pk).count(), 1)
+
+    def _approve_queries(self, ids):
+        user = User.objects.get(pk=self.user.pk)
+        with CaptureQueriesContext(connection) as ctx:
+            results = WorkflowEngine.approve_many(user, ids, role=ApprovalRole.FACTORY_MANAGER)
+        self.assertTrue(all(r.ok for r in results))
+        return len(ctx)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        small = self._approve_queries(self._make(EvaluationStatus.FACTORY_REVIEW, 2))
+        large = self._approve_queries(self._make(EvaluationStatus.FACTORY_REVIEW, 20))
+        self.assertEqual(small, large)
+
+        # یک UPDATE برای همه‌ی وضعیت‌ها
+        ids = self._make(EvaluationStatus.FACTORY_REVIEW, 5)
+        with CaptureQueriesContext(connection) as ctx:
+            WorkflowEngine.approve_many(self.user, ids, role=ApprovalRole.FACTORY_MANAGER)
+        updates = [q for q in ctx.captured_queries if q["sql"].startswith('UPDATE "core_evaluation"')]
+        self.assertEqual(len(updates), 1)
+
+    def test_view_reports_each_result(self):
+        ok_id = self._make(EvaluationStatus.FACTORY_REVIEW)[0]
+        wrong_stage = self._make(EvaluationStatus.SUBMITTED)[0]
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse("manager:eval_approve_many"), {"ids": [ok_id, wrong_stage], "format": "json"}
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data["approved"], data["failed"]), (1, 1))
+        self.assertEqual([r["ok"] for r in data["results"]], [True, False])
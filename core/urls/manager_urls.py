@@ -3,16 +3,16 @@ from django.urls import path
 from django.views.generic import RedirectView
 from core.views.manager.evaluations import (
     dashboard_view, evaluation_list_view, edit_evaluation_view,
-    start_evaluation_view, evaluation_save_progress,
+    start_evaluation_view, start_team_evaluations_view, evaluation_save_progress, evaluation_autosave,
     ajax_managers_for_unit, ajax_teams_for_manager,
     bulk_archive_drafts_view, bulk_delete_drafts_view,
     archive_evaluation_view, eval_approve,
 )
-from core.views.manager.workflow import eval_factory_approve
+from core.views.manager.workflow import eval_factory_approve, eval_approve_many
 from core.views.manager import  workflow
 from core.views.manager.reports import reports_dashboard_view, print_dashboard_view, print_evaluation_view
 from core.views.manager.evaluation_lists import (ArchivedListView,)
-from core.views.manager.reports import summary_report_view
+from core.views.manager.reports import summary_report_view, time_in_stage_report_view
 from core.views.manager.evaluation_lists import (
     DraftListView,
     SubmittedListView,
@@ -33,7 +33,9 @@ urlpatterns = [
     path("eval/list/<str:status>/", evaluation_list_view, name="eval_list"),
     path("eval/<int:pk>/edit/", edit_evaluation_view, name="eval_edit"),
     path("eval/start/", start_evaluation_view, name="eval_create"),
+    path("eval/start/team/", start_team_evaluations_view, name="eval_create_team"),
     path("eval/<int:pk>/save-progress/", evaluation_save_progress, name="eval_save_progress"),
+    path("eval/<int:pk>/autosave/", evaluation_autosave, name="eval_autosave"),
 
     # Ajax
     path("ajax/units/<str:unit_key>/managers/", ajax_managers_for_unit, name="ajax_managers_for_unit"),
@@ -57,12 +59,14 @@ urlpatterns = [
     path("evaluations/archived/", ArchivedListView.as_view(), name="manager_evaluations_archived",),
 
     path("reports/summary/", summary_report_view, name="manager_summary_report"),
+    path("reports/time-in-stage/", time_in_stage_report_view, name="manager_time_in_stage_report"),
     path("evaluations/draft/", DraftListView.as_view(), name="draft_list"),
     path("evaluations/submitted/", SubmittedListView.as_view(), name="submitted_list"),
     path("evaluations/approved/", ApprovedListView.as_view(), name="approved_list"),
 
     # مراحل جدید گردش کار
     path("workflow/", workflow.workflow_view, name="workflow"),
+    path("workflow/approve-many/", eval_approve_many, name="eval_approve_many"),
     path("evaluations/hr-review/", HRReviewListView.as_view(), name="hr_review_list"),
     path("evaluations/manager-review/", ManagerReviewListView.as_view(), name="manager_review_list"),
     path("evaluations/factory-review/", FactoryReviewListView.as_view(), name="factory_review_list"),
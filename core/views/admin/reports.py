@@ -1,22 +1,41 @@
 # core/views/admin/reports.py
 from django.contrib import admin
-from django.http import JsonResponse, HttpResponseBadRequest
-from django.urls import path
+from django.http import Http404, JsonResponse, HttpResponseBadRequest
+from django.urls import path, reverse
 from django.views.decorators.http import require_GET
-from core.models import Unit, EmployeeProfile, Evaluation, Organization
-import csv
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
+from core.models import Unit, EmployeeProfile, Evaluation, Organization, BackgroundJob
 # ---------- برای ویوهای جدید چاپ و PDF ----------
 from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render
-from django.http import HttpResponse
-from io import BytesIO
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from core.mixins.organization_scope import scope_queryset
+from core.services.report_aggregates import aggregate_report, percent_expression
+from core.services.evaluation_export import (
+    export_queryset,
+    iter_csv_rows,
+    iter_with_usernames,
+    print_form_context,
+    spooled_file,
+    units_export_queryset,
+    write_pdf_report,
+    write_print_form_pdf,
+    write_units_zip,
+)
+from core.services.jobs import enqueue
 from django.utils.decorators import method_decorator
 
+STATUS_PIE_LABELS = {
+    "draft": "پیش‌نویس", "submitted": "ارسال‌شده",
+    "approved": "تأییدشده", "archived": "آرشیوشده", "expired": "منقضی‌شده"
+}
+
+def _status_pie(agg):
+    """برچسب‌ها و داده‌های نمودار دایره‌ای وضعیت‌ها از خروجی aggregate_report"""
+    present = sorted((st, n) for st, n in agg.status_counts.items() if n)
+    if not present:
+        return ["بدون داده"], [1]
+    return [STATUS_PIE_LABELS.get(st, st) for st, _ in present], [n for _, n in present]
+
 class EvaluationReportAdmin(admin.ModelAdmin):
     """
     صفحه گزارش در ادمین + ۲ API:
@@ -41,6 +60,9 @@ class EvaluationReportAdmin(admin.ModelAdmin):
             path("export/pdf/", self.admin_site.admin_view(self.export_pdf), name="reports_export_pdf"),
             path("load-units/", self.admin_site.admin_view(self.load_units_api), name="reports_load_units"),
             path("print-form/", self.admin_site.admin_view(self.print_form_view), name="reports_print_form"),
+            path("print-form/pdf/", self.admin_site.admin_view(self.print_form_pdf), name="reports_print_form_pdf"),
+            path("jobs/<int:job_id>/", self.admin_site.admin_view(self.job_status_api), name="reports_job_status"),
+            path("jobs/<int:job_id>/download/", self.admin_site.admin_view(self.job_download), name="reports_job_download"),
         ]
         return custom + urls
 
@@ -48,179 +70,110 @@ class EvaluationReportAdmin(admin.ModelAdmin):
     # 📁 خروجی CSV و PDF
     # -----------------------------
 
+    def _enqueue_response(self, request, kind):
+        """ثبت کار در صف پس‌زمینه به‌جای اجرا در همین درخواست"""
+        params = {k: v for k, v in request.GET.items() if k != "async"}
+        job = enqueue(kind, params, user=request.user)
+        return JsonResponse({
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": reverse("admin:reports_job_status", args=[job.id]),
+            "download_url": reverse("admin:reports_job_download", args=[job.id]),
+        }, status=202)
+
     @method_decorator(require_GET)
     def export_csv(self, request):
+        if request.GET.get("async"):
+            return self._enqueue_response(request, "evaluation_csv")
 
-        mode = request.GET.get("mode", "unit")
-        unit_id = request.GET.get("unit_id")
-        if not unit_id:
-            return HttpResponse("unit_id required", status=400)
-
-        unit = Unit.objects.filter(id=unit_id).first()
-        if not unit:
-            return HttpResponse("unit not found", status=404)
-
-        # فیلتر زمانی
-        year = request.GET.get("year")
-        period = int(request.GET.get("period", 12))  # ماه
-        date_filter = {}
-        if year:
-            from datetime import date, timedelta
-            start_year = date(int(year), 1, 1)
-            end_year = date(int(year) + 1, 1, 1)
-            date_filter["period_start__gte"] = start_year
-            date_filter["period_start__lt"] = end_year
-
-        # برای بازه‌ی ماه‌ها، فقط آخر N ماه آخر داده‌ها را نگه می‌داریم
-        if period and period < 12:
-            from datetime import date, timedelta
-            today = date.today()
-            cutoff = today - timedelta(days=30 * period)
-            date_filter["period_start__gte"] = cutoff
-
-        # اگر حالت فردی است، فیلترش می‌کنیم
-        employee_filter = {}
-        if mode == "individual":
-            emp_id = request.GET.get("employee_id")
-            if not emp_id:
-                return HttpResponse("employee_id required", status=400)
-            ep = EmployeeProfile.objects.select_related("user").filter(id=emp_id).first()
-            if not ep:
-                return HttpResponse("employee not found", status=404)
-            candidate_ids = []
-            if ep.personnel_code: candidate_ids.append(ep.personnel_code.strip())
-            if ep.user_id: candidate_ids.append(str(ep.user_id))
-            employee_filter["employee_id__in"] = candidate_ids
-
-        qs = (Evaluation.objects
-              .filter(unit_code=(unit.unit_code or "").strip(), **employee_filter)
-              .order_by("employee_id", "period_start"))
-        qs = scope_queryset(qs, user=request.user)
-
-        response = HttpResponse(content_type="text/csv; charset=utf-8")
+        try:
+            qs, unit, mode, _ = export_queryset(request.user, request.GET)
+        except ValueError as e:
+            return HttpResponse(str(e), status=400)
+        except Http404 as e:
+            return HttpResponse(str(e), status=404)
+
+        # پخش تدریجی؛ username هر chunk با یک کوئری (نه دو کوئری برای هر ردیف)
+        response = StreamingHttpResponse(iter_csv_rows(qs), content_type="text/csv; charset=utf-8")
         filename = f"evaluation_report_{mode}_{unit.unit_code or 'unit'}.csv"
         response["Content-Disposition"] = f'attachment; filename="{filename}"'
-
-        writer = csv.writer(response)
-        writer.writerow(["Employee Code", "Username", "Status", "Final Score", "Max Score", "Percent", "Period Start"])
-
-        # برای نام لاتین از username و کد استفاده می‌کنیم (نه نام فارسی)
-        for ev in qs:
-            # سعی می‌کنیم username را از پروفایل پیدا کنیم (اختیاری، امن)
-            username = ""
-            ep = EmployeeProfile.objects.select_related("user").filter(personnel_code=ev.employee_id).first()
-            if not ep and (ev.employee_id or "").isdigit():
-                ep = EmployeeProfile.objects.select_related("user").filter(user_id=int(ev.employee_id)).first()
-            if ep and ep.user:
-                username = ep.user.username
-
-            percent = ""
-            if ev.final_score and ev.max_score:
-                try:
-                    percent = round(float(ev.final_score) / float(ev.max_score) * 100.0, 2)
-                except Exception:
-                    percent = ""
-            writer.writerow([
-                ev.employee_id or "",  # لاتین
-                username,  # لاتین
-                ev.status or "",
-                ev.final_score or "",
-                ev.max_score or "",
-                percent,
-                ev.period_start or "",
-            ])
-
         return response
 
     @method_decorator(require_GET)
     def export_pdf(self, request):
-
         mode = request.GET.get("mode", "unit")
-        unit_id = request.GET.get("unit_id")
-        if not unit_id:
-            return HttpResponse("unit_id required", status=400)
-
-        unit = Unit.objects.filter(id=unit_id).first()
-        if not unit:
-            return HttpResponse("unit not found", status=404)
-
-        # فیلتر حالت فردی (مثل CSV)
-        employee_filter = {}
-        title_suffix = f"Unit {unit.unit_code or '—'}"
-        if mode == "individual":
-            emp_id = request.GET.get("employee_id")
-            if not emp_id:
-                return HttpResponse("employee_id required", status=400)
-            ep = EmployeeProfile.objects.select_related("user").filter(id=emp_id).first()
-            if not ep:
-                return HttpResponse("employee not found", status=404)
-            candidate_ids = []
-            if ep.personnel_code: candidate_ids.append(ep.personnel_code.strip())
-            if ep.user_id: candidate_ids.append(str(ep.user_id))
-            employee_filter["employee_id__in"] = candidate_ids
-            title_suffix += f" – Employee {ep.user.username if ep and ep.user else (ep.personnel_code or '')}"
-
-        qs = (Evaluation.objects
-              .filter(unit_code=(unit.unit_code or "").strip(), **employee_filter)
-              .order_by("employee_id", "period_start"))
-        qs = scope_queryset(qs, user=request.user)
 
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, leftMargin=24, rightMargin=24, topMargin=24, bottomMargin=24)
-        styles = getSampleStyleSheet()
-        story = []
-
-        # عنوان انگلیسی (تماماً لاتین)
-        story.append(Paragraph("<b>Performance Evaluation Report</b>", styles["Title"]))
-        story.append(Paragraph(title_suffix, styles["Heading3"]))
-        story.append(Spacer(1, 10))
-
-        data = [["Employee Code", "Username", "Status", "Final Score", "Max Score", "Percent", "Period Start"]]
-
-        for ev in qs:
-            username = ""
-            ep = EmployeeProfile.objects.select_related("user").filter(personnel_code=ev.employee_id).first()
-            if not ep and (ev.employee_id or "").isdigit():
-                ep = EmployeeProfile.objects.select_related("user").filter(user_id=int(ev.employee_id)).first()
-            if ep and ep.user:
-                username = ep.user.username
-
-            percent = ""
-            if ev.final_score and ev.max_score:
-                try:
-                    percent = f"{round(float(ev.final_score) / float(ev.max_score) * 100.0, 2)}%"
-                except Exception:
-                    percent = ""
-
-            data.append([
-                ev.employee_id or "",
-                username,
-                ev.status or "",
-                ev.final_score or "-",
-                ev.max_score or "-",
-                percent,
-                str(ev.period_start or ""),
-            ])
-
-        table = Table(data, repeatRows=1, hAlign="LEFT", colWidths=[80, 80, 60, 70, 70, 60, 80])
-        table.setStyle(TableStyle([
-            ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
-            ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
-            ("ALIGN", (0, 0), (-1, 0), "CENTER"),
-            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-            ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-            ("ALIGN", (0, 1), (-1, -1), "CENTER"),
-            ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.whitesmoke, colors.white]),
-        ]))
-
-        story.append(table)
-        doc.build(story)
-
-        buffer.seek(0)
-        response = HttpResponse(buffer, content_type="application/pdf")
+        # حالت چندواحدی: یک PDF برای هر واحد داخل ZIP
+        if mode == "units":
+            if request.GET.get("async"):
+                return self._enqueue_response(request, "evaluation_pdf_units")
+            qs = units_export_queryset(request.user, request.GET.get("org_id"))
+            out = spooled_file()
+            write_units_zip(out, qs)
+            out.seek(0)
+            return FileResponse(out, as_attachment=True, filename="evaluation_reports_units.zip",
+                                content_type="application/zip")
+
+        if request.GET.get("async"):
+            return self._enqueue_response(request, "evaluation_pdf")
+
+        try:
+            qs, unit, mode, subtitle = export_queryset(request.user, request.GET)
+        except ValueError as e:
+            return HttpResponse(str(e), status=400)
+        except Http404 as e:
+            return HttpResponse(str(e), status=404)
+
+        # جدول‌های یک‌صفحه‌ای، نوشته‌شده در فایل موقت (نه یک BytesIO بزرگ)
+        out = spooled_file()
+        write_pdf_report(out, iter_with_usernames(qs), subtitle)
+        out.seek(0)
         filename = f"evaluation_report_{mode}_{unit.unit_code or 'unit'}.pdf"
-        response["Content-Disposition"] = f'attachment; filename="{filename}"'
-        return response
+        return FileResponse(out, as_attachment=True, filename=filename, content_type="application/pdf")
+
+    # -----------------------------
+    # ⏳ کارهای پس‌زمینه
+    # -----------------------------
+
+    def _get_job(self, request, job_id):
+        qs = BackgroundJob.objects.all()
+        if not request.user.is_superuser:
+            qs = qs.filter(created_by=request.user)
+        return qs.filter(id=job_id).first()
+
+    @method_decorator(require_GET)
+    def job_status_api(self, request, job_id):
+        job = self._get_job(request, job_id)
+        if not job:
+            return JsonResponse({"error": "job not found"}, status=404)
+        return JsonResponse({
+            "job_id": job.id,
+            "kind": job.kind,
+            "status": job.status,
+            "progress": job.progress,
+            "total": job.total,
+            "percent": job.percent,
+            "error": job.error.splitlines()[0] if job.error else "",
+            "download_url": (
+                reverse("admin:reports_job_download", args=[job.id])
+                if job.status == BackgroundJob.Status.DONE else None
+            ),
+        })
+
+    @method_decorator(require_GET)
+    def job_download(self, request, job_id):
+        job = self._get_job(request, job_id)
+        if not job:
+            return HttpResponse("job not found", status=404)
+        if job.status != BackgroundJob.Status.DONE:
+            return HttpResponse("job not finished", status=409)
+        if not job.result_file or not job.result_file.storage.exists(job.result_file.name):
+            return HttpResponse("job result is no longer available", status=410)
+        # پخش تدریجی فایل روی دیسک
+        return FileResponse(
+            job.result_file.open("rb"), as_attachment=True, filename=job.result_name,
+            content_type=job.result_content_type or "application/octet-stream",
+        )
 
     def changelist_view(self, request, extra_context=None):
         """
@@ -266,10 +219,7 @@ class EvaluationReportAdmin(admin.ModelAdmin):
         خروجی: نمودار خطی، دایره‌ای، خلاصه
         """
         from datetime import date, datetime
-        from django.db.models import (
-            Avg, Count, F, FloatField, Value, Case, When, ExpressionWrapper, IntegerField
-        )
-        from django.db.models.functions import ExtractYear, ExtractMonth
+        from django.db.models import Avg, Count
         from dateutil.relativedelta import relativedelta
 
         try:
@@ -306,32 +256,15 @@ class EvaluationReportAdmin(admin.ModelAdmin):
                 t_date = datetime.fromisoformat(to_date).date()
                 base_filters["period_start__range"] = (f_date, t_date)
 
-            # فیلتر اختلاف ماه بین start و end (بدون حلقه)
-            qs_eval = Evaluation.objects.annotate(
-                diff_months=ExpressionWrapper(
-                    (ExtractYear(F("period_end")) - ExtractYear(F("period_start"))) * 12 +
-                    (ExtractMonth(F("period_end")) - ExtractMonth(F("period_start"))),
-                    output_field=IntegerField()
-                )
-            ).filter(**base_filters)
+            qs_eval = Evaluation.objects.filter(**base_filters)
             qs_eval = scope_queryset(qs_eval, user=request.user)
 
+            # فیلتر طول بازه (ستون ذخیره‌شده period_months)
             if period_param and period_param.isdigit():
-                qs_eval = qs_eval.filter(diff_months=int(period_param))
-
-            # فیلتر فقط فرم‌های دارای امتیاز
-            eval_filters = {**base_filters, "status": Evaluation.Status.APPROVED}
-            pie_filters = {**base_filters}
-
-            # درصد امن
-            avg_percent_expr = ExpressionWrapper(
-                100.0 * F("final_score") / F("max_score"),
-                output_field=FloatField()
-            )
-            safe_percent_expr = Case(
-                When(final_score__isnull=False, max_score__isnull=False, then=avg_percent_expr),
-                default=Value(None), output_field=FloatField()
-            )
+                qs_eval = qs_eval.filter(period_months=int(period_param))
+
+            # درصد امن (max_score صفر/خالی → NULL)
+            safe_percent_expr = percent_expression()
 
             # ---------- حالت فردی ----------
             if mode == "individual":
@@ -365,22 +298,10 @@ class EvaluationReportAdmin(admin.ModelAdmin):
                 labels = [e["period_start"].isoformat() if e["period_start"] else "—" for e in evals]
                 series = [float(e["avg_pct"] or 0.0) for e in evals]
 
-                summary = (qs_eval.filter(status=Evaluation.Status.APPROVED)
-                           .exclude(final_score__isnull=True, max_score__isnull=True)
-                           .aggregate(avg=Avg(avg_percent_expr), count=Count("id")))
-
-                # Pie Chart وضعیت‌ها
-                status_map = {
-                    "draft": "پیش‌نویس", "submitted": "ارسال‌شده",
-                    "approved": "تأییدشده", "archived": "آرشیوشده", "expired": "منقضی‌شده"
-                }
-                status_counts = (qs_eval.values("status")
-                                 .annotate(cnt=Count("id"))
-                                 .order_by("status"))
-                pie_labels = [status_map.get(s["status"], s["status"]) for s in status_counts]
-                pie_data = [s["cnt"] for s in status_counts] or [1]
-                if not status_counts:
-                    pie_labels = ["بدون داده"]
+                # خلاصه + Pie Chart وضعیت‌ها در یک کوئری
+                agg = aggregate_report(qs_eval, score_statuses=[Evaluation.Status.APPROVED])
+                summary = {"avg": agg.avg_percent, "count": agg.rated_count}
+                pie_labels, pie_data = _status_pie(agg)
 
                 return JsonResponse({
                     "chart": {
@@ -411,21 +332,9 @@ class EvaluationReportAdmin(admin.ModelAdmin):
             labels = [e["period_start"].isoformat() if e["period_start"] else "—" for e in evals]
             series = [float(e["avg_pct"] or 0.0) for e in evals]
 
-            summary = (qs_eval.filter(status=Evaluation.Status.APPROVED)
-                       .exclude(final_score__isnull=True, max_score__isnull=True)
-                       .aggregate(avg=Avg(avg_percent_expr), count=Count("id")))
-
-            status_map = {
-                "draft": "پیش‌نویس", "submitted": "ارسال‌شده",
-                "approved": "تأییدشده", "archived": "آرشیوشده", "expired": "منقضی‌شده"
-            }
-            status_counts = (qs_eval.values("status")
-                             .annotate(cnt=Count("id"))
-                             .order_by("status"))
-            pie_labels = [status_map.get(s["status"], s["status"]) for s in status_counts]
-            pie_data = [s["cnt"] for s in status_counts] or [1]
-            if not status_counts:
-                pie_labels = ["بدون داده"]
+            agg = aggregate_report(qs_eval, score_statuses=[Evaluation.Status.APPROVED])
+            summary = {"avg": agg.avg_percent, "count": agg.rated_count}
+            pie_labels, pie_data = _status_pie(agg)
 
             return JsonResponse({
                 "chart": {
@@ -469,129 +378,31 @@ class EvaluationReportAdmin(admin.ModelAdmin):
     @method_decorator(staff_member_required)
     def print_form_view(self, request, *args, **kwargs):
         """خروجی HTML قابل پرینت برای فرم ارزیابی در ادمین"""
-        employee_id = request.GET.get("employee_id")
-        unit_id = request.GET.get("unit_id")
-        year = request.GET.get("year")
-        period = request.GET.get("period")
-
-        if not employee_id:
-            return HttpResponse("پارامتر کارمند الزامی است", status=400)
-
-        emp = EmployeeProfile.objects.select_related("user", "unit").filter(id=employee_id).first()
-        if not emp:
-            return HttpResponse("کارمند یافت نشد", status=404)
-
-        # واکشی فرم تأییدشده
-        filters = {"status": Evaluation.Status.APPROVED, "employee_id": emp.personnel_code}
-        if year:
-            filters["period_start__year"] = int(year)
-
-        evals = Evaluation.objects.filter(**filters).order_by("-period_start")
-        evals = scope_queryset(evals, user=request.user)
-
-        if period and period.isdigit():
-            from django.db.models import F, IntegerField, ExpressionWrapper
-            from django.db.models.functions import ExtractYear, ExtractMonth
-
-            diff_expr = ExpressionWrapper(
-                (ExtractYear(F("period_end")) - ExtractYear(F("period_start"))) * 12
-                + (ExtractMonth(F("period_end")) - ExtractMonth(F("period_start"))),
-                output_field=IntegerField(),
-            )
-            evals = evals.annotate(month_diff=diff_expr).filter(month_diff=int(period))
-
-        ev = evals.first()
-        if not ev:
-            return HttpResponse("هیچ ارزیابی یافت نشد", status=404)
-
-        # ✅ آیتم‌های فرم از snapshot داخلی مدل
-        items = list(
-            ev.items.select_related("criterion", "selected_option").values(
-                "criterion_order",
-                "criterion_title",
-                "selected_value",
-                "earned_points",
-                "selected_option",
-                "selected_option__label",
-            )
-        )
-
-        context = {
-            "title": "فرم ارزیابی عملکرد پرسنل",
-            "employee": emp,
-            "unit_code": ev.unit_code or (emp.unit.unit_code if emp.unit else "-"),
-            "manager_name": ev.manager_name or "—",
-            "year": year or (ev.period_start.year if ev.period_start else ""),
-            "period": ev.period_label if hasattr(ev, "period_label") else "",
-            "items": items,
-            "total_score": ev.final_score or 0,
-            "max_score": ev.max_score or 0,
-            "total_percent": (
-                round(100 * float(ev.final_score) / float(ev.max_score), 2)
-                if ev.final_score and ev.max_score
-                else None
-            ),
-        }
+        try:
+            context = print_form_context(request.user, request.GET)
+        except ValueError as e:
+            return HttpResponse(str(e), status=400)
+        except Http404 as e:
+            return HttpResponse(str(e), status=404)
 
         return render(request, "admin/reports/print_form.html", context)
 
     # ---------- خروجی PDF فرم ----------
-    @staff_member_required
-    def print_form_pdf(request):
-        """دانلود PDF فرم"""
-        from django.template.loader import get_template
-        from io import BytesIO
-        from xhtml2pdf import pisa
-        employee_id = request.GET.get("employee_id")
-        unit_id = request.GET.get("unit_id")
+    @method_decorator(staff_member_required)
+    def print_form_pdf(self, request):
+        """دانلود PDF فرم (با async=1 در صف پس‌زمینه)"""
+        if request.GET.get("async"):
+            return self._enqueue_response(request, "print_form_pdf")
 
-        if not employee_id or not unit_id:
-            return HttpResponse("پارامترها ناقص است", status=400)
-
-        emp = EmployeeProfile.objects.select_related("user").filter(id=employee_id).first()
-        unit = Unit.objects.filter(id=unit_id).first()
-        year = request.GET.get("year")
-        period = request.GET.get("period")
-
-        # فیلتر پایه
-        filters = {
-            "employee_id": emp.personnel_code,
-            "status": Evaluation.Status.APPROVED,
-        }
-
-        # فیلتر سال
-        if year:
-            from datetime import date
-            start = date(int(year), 1, 1)
-            end = date(int(year) + 1, 1, 1)
-            filters["period_start__gte"] = start
-            filters["period_start__lt"] = end
-
-        # فیلتر دوره (3،6،9،12)
-        if period and period.isdigit():
-            from django.db.models import F, IntegerField, ExpressionWrapper
-            from django.db.models.functions import ExtractYear, ExtractMonth
-
-            diff_expr = ExpressionWrapper(
-                (ExtractYear(F("period_end")) - ExtractYear(F("period_start"))) * 12 +
-                (ExtractMonth(F("period_end")) - ExtractMonth(F("period_start"))),
-                output_field=IntegerField()
-            )
-
-            evals = (Evaluation.objects.annotate(month_diff=diff_expr)
-                     .filter(**filters, month_diff=int(period))
-                     .order_by("-period_start"))
-            evals = scope_queryset(evals, user=request.user)
-
-        else:
-            evals = Evaluation.objects.filter(**filters).order_by("-period_start")
-
-        template = get_template("admin/print_form.html")
-        html = template.render({"employee": emp, "unit": unit, "evaluations": evals})
-        response = HttpResponse(content_type="application/pdf")
-        response["Content-Disposition"] = f'attachment; filename="evaluation_{emp.personnel_code}.pdf"'
-        pisa.CreatePDF(BytesIO(html.encode("utf-8")), dest=response, encoding="utf-8")
-        return response
+        out = spooled_file()
+        try:
+            filename = write_print_form_pdf(out, request.user, request.GET)
+        except ValueError as e:
+            return HttpResponse(str(e), status=400)
+        except Http404 as e:
+            return HttpResponse(str(e), status=404)
+        out.seek(0)
+        return FileResponse(out, as_attachment=True, filename=filename, content_type="application/pdf")
 
 # ---------- مدل مجازی فقط برای گزارش ----------
 from core.models import Unit
@@ -1,4 +1,5 @@
 # core/views/manager/evaluations.py
+import json
 from datetime import date
 from typing import Optional, List
 from django.contrib import messages
@@ -6,6 +7,7 @@ from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_http_methods
 from django.core.paginator import Paginator
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.utils import timezone
 from django.http import HttpResponseBadRequest, HttpResponseForbidden
 from django.db.models import Q
@@ -16,13 +18,13 @@ from core.constants import Settings
 from core.mixins.organization_scope import scope_queryset
 from core.constants import WorkflowStatus
 from core.approval.workflow_engine import WorkflowEngine
+from core.approval.role_resolver import resolve_approval_role
+from core.approval.audit import ARCHIVED, Transition, record_transition, record_transitions
 from core.models import EvaluationSignature
 
 from core.models import (
     EmployeeProfile,
-    EvaluationItem,
     FormTemplate,
-    FormCriterion,
 )
 from core.models import Evaluation
 from core.services.permissions import (
@@ -30,6 +32,13 @@ from core.services.permissions import (
     can_evaluate,
     RoleLevel,
 )
+from core.services.dashboard import dashboard_counters
+from core.services.evaluation_start import build_draft, create_items, start_team_drafts, template_criteria
+from core.services.evaluation_form import NotDraft, StaleRevision, autosave_choices, save_item_choices
+from core.services.template_bundle import get_bundle
+from core.services.dashboard_cache import DASHBOARD_CARD_LIMIT, cached_dashboard_context, cached_dashboard_counters
+from core.signals import evaluation_changed
+from core.services.evaluation_stats import collect_stat_keys, schedule_stat_refresh
 from core.services.evaluation_access import (
     can_view_evaluation,
     can_edit_evaluation,
@@ -181,7 +190,6 @@ def forms_home_view(request):
         forms = list(
             FormTemplate.objects.filter(status="Published", code__in=allowed_codes)
             .order_by("code")
-            .prefetch_related("criteria")
         )
 
     return render(request, "manager/evaluations/forms_home.html", {"forms": forms})
@@ -366,9 +374,11 @@ def _pick_selected_template(forms: List[FormTemplate], form_code: Optional[str])
     return forms[0]
 
 def attach_workflow_flags(evaluations, user):
+    # نقش کاربر یک بار؛ نه یک کوئری پروفایل برای هر ارزیابی
+    role = resolve_approval_role(user)
     result = []
     for ev in evaluations:
-        engine = WorkflowEngine(ev)
+        engine = WorkflowEngine(ev, role=role)
         result.append({
             "ev": ev,
             "can_approve": engine.can_approve(user),
@@ -398,28 +408,35 @@ def dashboard_view(request):
     else:
         allowed_codes = _allowed_form_codes_for_evaluator(evaluator_role)
 
-    # فرم‌های مجاز منتشرشده
-    forms = list(FormTemplate.objects.filter(status="Published", code__in=allowed_codes).order_by("code"))
-
-    # انتخاب‌های کاربر
-    selected_code = request.GET.get("form_code") or (forms[0].code if forms else None)
     months = int(request.GET.get("months", "3"))
-    today = date.today()
-    pstart = _subtract_months(today, months)
-    pend = today
 
-    selected_tpl = next((f for f in forms if f.code == selected_code), None)
-    if not selected_tpl:
-        # هیچ فرمی مجاز نیست؛ صفحه خالی
-        context = {
-            "forms": forms, "selected_code": selected_code,
-            "months": months, "month_choices": [3, 6, 9, 12],
-            "period_start": pstart, "period_end": pend,
-            "todo": [], "drafts": [], "submitted": [], "approved": [],
-            "evaluator_role": evaluator_role, "evaluator_unit": evaluator_unit, "evaluator_team": evaluator_team,
-        }
-        return render(request, "manager/evaluations/dashboard.html", context)
+    # context سنگین از کش هر کاربر (با ابطال از طریق سیگنال evaluation_changed)
+    context = cached_dashboard_context(
+        request.user, request.GET.get("form_code"), months,
+        lambda: _build_dashboard_context(
+            request, evaluator_role, evaluator_unit, evaluator_team, wf_role, allowed_codes, months
+        ),
+    )
+    # شمارنده‌ها (COUNTERS: count_draft, count_hr, ..., hr_pending_count, factory_pending_count)
+    # ورودی کش جدا دارند؛ تغییر وضعیت هر ارزیابی فقط همین یک کوئری را دوباره می‌خواهد
+    context.update(cached_dashboard_counters(request.user, lambda: dashboard_counters(request.user)))
+    selected_tpl = next((f for f in context["forms"] if f.code == context["selected_code"]), None)
+    context["todo"] = (
+        _todo_people(selected_tpl, evaluator_role, evaluator_unit, context["period_start"], context["period_end"])
+        if selected_tpl else []
+    )
+    context["now"] = timezone.now()
+    context["is_hr"] = is_hr(request.user)
+    context["is_manager"] = is_unit_manager(request.user)
+    context["is_factory_manager"] = is_factory_manager(request.user)
+
+    return render(request, "manager/evaluations/dashboard.html", context)
 
+def _todo_people(selected_tpl, evaluator_role, evaluator_unit, pstart, pend):
+    """
+    To-Do داشبورد: کسانی که ارزیاب می‌تواند برایشان فرم بسازد و در همین فرم/بازه هنوز ارزیابی ندارند.
+    کش نمی‌شود: شروع پیش‌نویس برای همان نفر توسط ارزیاب دیگر هم باید فوراً دیده شود.
+    """
     # ---- 1) people_qs (کسانی که می‌توانم برایشان ارزیابی بسازم) ----
     if selected_tpl.code == Settings.FORM_CODE_MANAGER:
         if evaluator_role == RoleLevel.MANAGER:  # 901
@@ -476,13 +493,39 @@ def dashboard_view(request):
         is_archived=False,
     ).values_list("employee_id", flat=True)
 
-    todo = list(people_qs.exclude(personnel_code__in=done_qs)[:200])
+    return list(people_qs.exclude(personnel_code__in=done_qs)[:200])
+
+
+def _build_dashboard_context(request, evaluator_role, evaluator_unit, evaluator_team, wf_role, allowed_codes, months):
+    """context داشبورد (فرم‌ها و کارت‌ها؛ شمارنده‌ها جدا کش می‌شوند و To-Do کش نمی‌شود)؛ فقط مقادیر قابل کش"""
+    # فرم‌های مجاز منتشرشده
+    forms = list(FormTemplate.objects.filter(status="Published", code__in=allowed_codes).order_by("code"))
+    for f in forms:
+        f.criteria_count = len(get_bundle(f).criteria)
+
+    # انتخاب‌های کاربر
+    selected_code = request.GET.get("form_code") or (forms[0].code if forms else None)
+    today = date.today()
+    pstart = _subtract_months(today, months)
+    pend = today
+
+    selected_tpl = next((f for f in forms if f.code == selected_code), None)
+    if not selected_tpl:
+        # هیچ فرمی مجاز نیست؛ صفحه خالی
+        context = {
+            "forms": forms, "selected_code": selected_code,
+            "months": months, "month_choices": [3, 6, 9, 12],
+            "period_start": pstart, "period_end": pend,
+            "drafts": [], "submitted": [], "approved": [],
+            "evaluator_role": evaluator_role, "evaluator_unit": evaluator_unit, "evaluator_team": evaluator_team,
+        }
+        return context
 
    # ===================== بخش‌های مستقل داشبورد ======================
 
     # Draft → 10 آخر
     drafts = list(
-        Evaluation.objects.filter(
+        Evaluation.objects.select_related("template").filter(
             evaluator=request.user,
             status=Evaluation.Status.DRAFT,
             is_archived=False
@@ -491,7 +534,7 @@ def dashboard_view(request):
 
     # Submitted → 5 آخر
     recent_submitted = list(
-        Evaluation.objects.filter(
+        Evaluation.objects.select_related("template").filter(
             evaluator=request.user,
             status=Evaluation.Status.SUBMITTED,
             is_archived=False
@@ -499,7 +542,7 @@ def dashboard_view(request):
     )
     # Approved → 5 آخر
     approved = list(
-        Evaluation.objects.filter(
+        Evaluation.objects.select_related("template").filter(
             evaluator=request.user,
             status=WorkflowStatus.FINAL_APPROVED,
             is_archived=False
@@ -509,13 +552,14 @@ def dashboard_view(request):
     # Archived → 5 آخر (از active جداست)
     archived_recent = list(
         Evaluation.objects
+        .select_related("template")
         .filter(evaluator=request.user, is_archived=True)
         .order_by("-archived_at")[:5]
     )
 
     # منقضی‌ها → همون قبلی بهتره ولی limit بذاریم
     stale_drafts = list(
-        Evaluation.objects.filter(
+        Evaluation.objects.select_related("template").filter(
             evaluator=request.user,
             status=Evaluation.Status.EXPIRED,
             is_archived=False
@@ -523,76 +567,11 @@ def dashboard_view(request):
     )
     submitted = recent_submitted
 
-    #==================================================
-    # ==================================================
-    # --- counters for dashboard (Approval Workflow) ---
-    # ==================================================
-    # Draft (همان قبلی)
-    count_draft = Evaluation.objects.filter(
-        evaluator=request.user,
-        status=Evaluation.Status.DRAFT,
-        is_archived=False
-    ).count()
-
-    count_submitted = scope_queryset(
-        Evaluation.objects.filter(
-            status=Evaluation.Status.SUBMITTED,
-            is_archived=False
-        ),
-        user=request.user
-    ).count()
-
-    # HR Review
-    count_hr = Evaluation.objects.filter(
-        status=WorkflowStatus.HR_REVIEW,
-        is_archived=False
-    ).count()
-
-    # Manager Review
-    count_manager = Evaluation.objects.filter(
-        status=WorkflowStatus.MANAGER_REVIEW,
-        is_archived=False
-    ).count()
-
-    # Factory Manager Review
-    count_factory = Evaluation.objects.filter(
-        status=WorkflowStatus.FACTORY_REVIEW,
-        is_archived=False
-    ).count()
-
-    # Final Approved
-    count_final = Evaluation.objects.filter(
-        status=WorkflowStatus.FINAL_APPROVED,
-        is_archived=False
-    ).count()
-
-    count_approved = Evaluation.objects.filter(
-        evaluator=request.user,
-        status=Evaluation.Status.APPROVED,
-        is_archived=False
-    ).count()
-
-    # Rejected (هر سه حالت)
-    count_rejected = Evaluation.objects.filter(
-        status__in=[
-            WorkflowStatus.HR_REJECTED,
-            WorkflowStatus.MANAGER_REJECTED,
-            WorkflowStatus.FACTORY_REJECTED,
-        ],
-        is_archived=False
-    ).count()
-
-    # Archived (بدون تغییر)
-    count_archived = Evaluation.objects.filter(
-        evaluator=request.user,
-        is_archived=True
-    ).count()
-
     # ==================================================
     # lists for dashboard cards
     # ==================================================
     hr = scope_queryset(
-        Evaluation.objects.filter(
+        Evaluation.objects.select_related("template").filter(
             status=WorkflowStatus.HR_REVIEW,
             is_archived=False,
         ),
@@ -600,7 +579,7 @@ def dashboard_view(request):
     )
 
     manager_qs = scope_queryset(
-        Evaluation.objects.filter(
+        Evaluation.objects.select_related("template").filter(
             status=WorkflowStatus.MANAGER_REVIEW,
             is_archived=False,
         ),
@@ -610,7 +589,7 @@ def dashboard_view(request):
     manager = attach_workflow_flags(manager_qs, request.user)
 
     factory = scope_queryset(
-        Evaluation.objects.filter(
+        Evaluation.objects.select_related("template").filter(
             status=WorkflowStatus.FACTORY_REVIEW,
             is_archived=False,
         ),
@@ -618,7 +597,7 @@ def dashboard_view(request):
     )
 
     final = scope_queryset(
-        Evaluation.objects.filter(
+        Evaluation.objects.select_related("template").filter(
             status=WorkflowStatus.FINAL_APPROVED,
             is_archived=False,
         ),
@@ -626,7 +605,7 @@ def dashboard_view(request):
     )
 
     rejected = scope_queryset(
-        Evaluation.objects.filter(
+        Evaluation.objects.select_related("template").filter(
             status__in=[
                 WorkflowStatus.HR_REJECTED,
                 WorkflowStatus.MANAGER_REJECTED,
@@ -637,21 +616,11 @@ def dashboard_view(request):
         user=request.user
     )
 
-    hr_pending_count = Evaluation.objects.filter(
-        is_archived=False,
-        status=Evaluation.Status.SUBMITTED,
-    ).exclude(
-        signatures__role="hr",
-        signatures__signed_at__isnull=False,
-    ).distinct().count()
-
-    factory_pending_count = Evaluation.objects.filter(
-        is_archived=False,
-        status=Evaluation.Status.FACTORY_REVIEW,
-    ).exclude(
-        signatures__role="factory",
-        signatures__signed_at__isnull=False,
-    ).distinct().count()
+    # برای کش: QuerySetها همین‌جا و حداکثر DASHBOARD_CARD_LIMIT ردیف اجرا می‌شوند
+    # (تعداد کل از شمارنده‌ها می‌آید)
+    hr, factory, final, rejected = (
+        list(qs[:DASHBOARD_CARD_LIMIT]) for qs in (hr, factory, final, rejected)
+    )
 
     # فیلتر کردن لیست‌ها بر اساس نقش گردش‌کار
     if wf_role == "hr":
@@ -675,7 +644,6 @@ def dashboard_view(request):
         "month_choices": [3, 6, 9, 12],
         "period_start": pstart,
         "period_end": pend,
-        "todo": todo,
         "drafts": drafts,
         "archived_recent": archived_recent,
 
@@ -684,25 +652,12 @@ def dashboard_view(request):
         "evaluator_unit": evaluator_unit,
         "evaluator_team": evaluator_team,
         "approved" : approved,
-        "count_approved" :count_approved,
         "submitted": submitted,
 
         # recent activity
         "recent_submitted": recent_submitted,
         "stale_drafts": stale_drafts,
-        "now": timezone.now(),
-
-        # COUNTERS
-        "count_draft": count_draft,
-        "count_hr": count_hr,
-        "count_manager": count_manager,
-        "count_factory": count_factory,
-        "count_final": count_final,
-        "count_rejected": count_rejected,
-        "count_archived": count_archived,
-        "count_submitted": count_submitted,
-        "hr_pending_count":hr_pending_count,
-        "factory_pending_count": factory_pending_count,
+
         "hr": hr,
         "manager": manager,
         "factory": factory,
@@ -710,11 +665,7 @@ def dashboard_view(request):
         "rejected": rejected,
         "wf_role": wf_role,
     }
-    context["is_hr"] = is_hr(request.user)
-    context["is_manager"] = is_unit_manager(request.user)
-    context["is_factory_manager"] = is_factory_manager(request.user)
-
-    return render(request, "manager/evaluations/dashboard.html", context)
+    return context
 
 # -------------List (per-status)-----------------
 @login_required
@@ -790,19 +741,17 @@ def create_evaluation_view(request):
         }
     )
 
-    # اگر تازه ساخته شده، آیتم‌ها را تزریق کن
-    if created and ev.items.count() == 0:
-        for c in tmpl.criteria.all():
-            EvaluationItem.objects.create(
-                evaluation=ev, criterion=c,
-                criterion_order=c.order, criterion_title=c.title, weight=c.weight,
-            )
+    # اگر تازه ساخته شده، آیتم‌ها را با یک INSERT تزریق کن
+    if created and not ev.items.exists():
+        create_items([ev], template_criteria(tmpl))
     # --- ست کردن Draft/Expiration ---
     if created:
         ev.draft_started = True
-        ev.save()  # اول ذخیره تا created_at پر بشه
+        ev.required_items = sum(1 for c in get_bundle(tmpl).criteria if c.is_required)
         ev.ensure_visible_until()
-        ev.save(update_fields=["visible_until", "draft_started", "updated_at"])
+        ev.save(update_fields=["visible_until", "draft_started", "required_items", "updated_at"])
+        record_transition(ev, "", ev.status, actor=request.user)
+        evaluation_changed.send(sender=Evaluation, evaluation=ev, user=request.user, status_changed=True)
     elif not ev.visible_until:
         # اگر قبلاً ساخته شده ولی تاریخ دیده شدن ندارد
         ev.ensure_visible_until()
@@ -1078,59 +1027,77 @@ def start_evaluation_view(request):
             for e in stale_qs:
                 e.archive_if_expired()
 
-            # 3) Draft تازه بساز (اینجا که خودت قبلاً درستش کردی 👇)
-            ev = Evaluation.objects.create(
-                template=tpl,
-                template_version=tpl.version,
-                status=Evaluation.Status.DRAFT,
-                employee_id=str(employee_id),
+            # 3) معیارهای فرم (کش برای هر نسخه)
+            criteria = template_criteria(tpl)
+            if not criteria:
+                messages.error(request, f"برای فرم {tpl.code} هیچ معیاری پیدا نشد.")
+                return redirect("eval_dashboard")
+
+            # 4) Draft تازه (با مهلت) + آیتم‌ها در یک INSERT
+            ev = build_draft(
+                tpl,
+                employee_id=employee_id,
                 employee_name=_employee_display_name(employee_id),
-                unit_code=unit_code,
+                evaluator=request.user,
+                evaluator_profile=ep,
                 role_level=rl,
+                unit_code=unit_code,
                 team_code=team_code,
-                evaluator=request.user,
-                manager_id=str(ep.personnel_code) if ep else "",
-                manager_name=request.user.get_full_name() or request.user.username,
-
-                # 🌟 اسکوپ سازمانی
-                holding_id=holding_id,
-                # factory_id=factory_id,
-                # department_group_id=department_group_id,
-
-                show_employee_signature=tpl.show_employee_signature,
-                show_manager_signature=tpl.show_manager_signature,
-                show_hr_signature=tpl.show_hr_signature,
-                show_employee_comment=tpl.show_employee_comment,
-                show_next_period_goals=tpl.show_next_period_goals,
                 period_start=pstart,
                 period_end=pend,
             )
+            ev.save()
             created = True
+            create_items([ev], criteria)
+            record_transition(ev, "", ev.status, actor=request.user)
 
-            # 4) آیتم‌ها
-            criteria_qs = FormCriterion.objects.filter(template_id=tpl.id).order_by("order", "id")
-            if not criteria_qs.exists():
-                messages.error(request, f"برای فرم {tpl.code} هیچ معیاری پیدا نشد.")
-                ev.delete()
-                return redirect("eval_dashboard")
+            # ارزیابی جدید: To-Do و شمارنده‌های داشبورد عوض می‌شوند
+            evaluation_changed.send(sender=Evaluation, evaluation=ev, user=request.user, status_changed=True)
 
-            idx = 0
-            for c in criteria_qs:
-                idx += 1
-                EvaluationItem.objects.create(
-                    evaluation=ev,
-                    criterion=c,
-                    criterion_title=getattr(c, "title", "") or getattr(c, "name", "") or "",
-                    weight=(getattr(c, "weight", None) or 1),
-                    criterion_order=(getattr(c, "order", None) or idx),
-                )
+    return redirect("eval_edit", pk=ev.id)
 
-            # 5) مهلت Draft
-            ev.draft_started = True
-            ev.ensure_visible_until()
-            ev.save(update_fields=["draft_started", "visible_until", "updated_at"])
+@login_required
+@require_http_methods(["POST"])
+def start_team_evaluations_view(request):
+    """
+    شروع Draft برای چند نفر از To-Do (ابتدای دوره).
+    employee_ids: لیست کد پرسنلی کارمندان (دکمه‌ی «شروع همه» در داشبورد).
+    """
+    rl, unit_code, team_code, ep = _evaluator_profile(request)
+    if not rl:
+        messages.error(request, "پروفایل ارزیاب ناقص است.")
+        return redirect("eval_dashboard")
 
-    return redirect("eval_edit", pk=ev.id)
+    form_code = request.POST.get("form_code")
+    months = int(request.POST.get("months") or 3)
+    employee_ids = [e for e in request.POST.getlist("employee_ids") if e]
+    if not form_code or not employee_ids:
+        messages.error(request, "اطلاعات ناقص است.")
+        return redirect("eval_dashboard")
+
+    tpl = get_object_or_404(FormTemplate, code=form_code, status="Published")
+    pstart, pend = _period_from_start_of_year(months)
+
+    employees = list(
+        EmployeeProfile.objects.select_related("user").filter(personnel_code__in=employee_ids)
+    )
+    try:
+        result = start_team_drafts(
+            tpl, employees, request.user, ep,
+            role_level=rl, unit_code=unit_code, team_code=team_code,
+            period_start=pstart, period_end=pend,
+        )
+    except ValueError as ex:
+        messages.error(request, str(ex))
+        return redirect("eval_dashboard")
+
+    if result["created"]:
+        evaluation_changed.send(sender=Evaluation, evaluation=None, user=request.user, status_changed=True)
+    messages.success(
+        request,
+        f"{len(result['created'])} پیش‌نویس ساخته شد؛ {len(result['existing'])} مورد از قبل وجود داشت."
+    )
+    return redirect(f"{reverse('eval_dashboard')}?form_code={tpl.code}&months={months}")
 
 def _employee_display_name(personnel_code: str) -> str:
     ep = EmployeeProfile.objects.select_related("user").filter(personnel_code=personnel_code).first()
@@ -1207,23 +1174,9 @@ def edit_evaluation_view(request, pk: int):
                 return HttpResponseForbidden("امکان ویرایش این ارزیابی برای شما وجود ندارد.")
 
         # ------------------- ذخیره انتخاب گزینه‌ها -------------------
-        items = list(ev.items.select_related("criterion"))
-        for it in items:
-            field = f"item_{it.id}"
-            opt_id = request.POST.get(field)
-
-            if not opt_id:
-                continue  # ❗️دیگه پاک نکن
-
-            opt = it.criterion.options.filter(id=opt_id).first()
-            if opt:
-                it.selected_option = opt
-                it.selected_value = opt.value
-                it.save(update_fields=["selected_option", "selected_value"])
-
-        ev.recalc_scores()
-        ev.updated_at = timezone.now()
-        ev.save(update_fields=["updated_at"])
+        # فیلد خالی پاک نمی‌شود؛ فقط آیتم‌های تغییر کرده با یک bulk_update + یک محاسبه‌ی امتیاز
+        save_item_choices(ev, request.POST)
+        evaluation_changed.send(sender=Evaluation, evaluation=ev, user=request.user, status_changed=False)
 
         # ------------------- ذخیره در Draft -------------------
         if 'save_draft' in request.POST:
@@ -1231,9 +1184,15 @@ def edit_evaluation_view(request, pk: int):
                 return HttpResponseForbidden("امکان ذخیره پیش‌نویس ندارید.")
 
             # آیتم‌ها قبلاً ذخیره شده‌اند
+            old_status = ev.status
             ev.status = Evaluation.Status.DRAFT
             ev.updated_at = timezone.now()
             ev.save(update_fields=["status", "updated_at"])
+            record_transition(ev, old_status, ev.status, actor=request.user)
+            evaluation_changed.send(
+                sender=Evaluation, evaluation=ev, user=request.user,
+                status_changed=(old_status != Evaluation.Status.DRAFT),
+            )
 
             messages.success(request, "فرم به‌صورت پیش‌نویس ذخیره شد.")
             return redirect("eval_dashboard")
@@ -1249,6 +1208,8 @@ def edit_evaluation_view(request, pk: int):
 
             ev.is_archived = True
             ev.save(update_fields=["is_archived"])
+            record_transition(ev, ev.status, ARCHIVED, actor=request.user)
+            evaluation_changed.send(sender=Evaluation, evaluation=ev, user=request.user, status_changed=True)
             messages.success(request, "فرم با موفقیت آرشیو شد.")
             return redirect("eval_dashboard")
         # ----------------------------- ذخیره و ارسال -----------------------------
@@ -1263,24 +1224,14 @@ def edit_evaluation_view(request, pk: int):
                 messages.error(request, "این فرم قبلاً ارسال شده است.")
                 return redirect("eval_dashboard")
 
-            # ذخیره آیتم‌ها (همونی که داری)
-            items = list(ev.items.select_related("criterion"))
-            for it in items:
-                field = f"item_{it.id}"
-                opt_id = request.POST.get(field)
-                if opt_id:
-                    opt = it.criterion.options.filter(id=opt_id).first()
-                    if opt:
-                        it.selected_option = opt
-                        it.selected_value = opt.value
-                        it.save(update_fields=["selected_option", "selected_value"])
-
-            ev.recalc_scores()
+            # آیتم‌ها و امتیاز بالاتر (save_item_choices) ذخیره شده‌اند
 
             # 👇👇👇 خط نجات
             ev.status = Evaluation.Status.SUBMITTED
             ev.updated_at = timezone.now()
             ev.save(update_fields=["status", "updated_at"])
+            record_transition(ev, Evaluation.Status.DRAFT, ev.status, actor=request.user)
+            evaluation_changed.send(sender=Evaluation, evaluation=ev, user=request.user, status_changed=True)
 
             messages.success(request, "فرم با موفقیت ارسال شد.")
             return redirect("eval_dashboard")
@@ -1325,12 +1276,11 @@ def edit_evaluation_view(request, pk: int):
     # ==========================================================
     #                           GET
     # ==========================================================
-    items = (
-        ev.items
-        .select_related("criterion")
-        .prefetch_related("criterion__options")
-        .order_by("criterion_order", "id")
-    )
+    # معیار/گزینه‌ها از بسته‌ی کش‌شده‌ی فرم؛ بدون کوئری قالب
+    bundle = get_bundle(ev.template)
+    items = list(ev.items.order_by("criterion_order", "id"))
+    for it in items:
+        it.spec = bundle.criterion(it.criterion_id)
     signatures = (
         EvaluationSignature.objects
         .filter(evaluation=ev)
@@ -1373,36 +1323,70 @@ def edit_evaluation_view(request, pk: int):
 @login_required
 @require_http_methods(["POST"])
 def evaluation_save_progress(request, pk: int):
-    ev = get_object_or_404(Evaluation, pk=pk, status=Evaluation.Status.DRAFT)
+    ev = get_object_or_404(Evaluation.objects.select_related("template"), pk=pk, status=Evaluation.Status.DRAFT)
 
     # فقط ارزیابِ همین Draft اجازه دارد
     if ev.evaluator_id != request.user.id:
         return HttpResponseForbidden("مجوز این عمل را ندارید.")
 
     # ذخیرهٔ انتخاب‌های فعلی (اگر چیزی زده شده باشد)
-    items = list(ev.items.select_related("criterion").all())
-    for it in items:
-        field_name = f"item_{it.id}"
-        opt_id = request.POST.get(field_name)
-        if not opt_id:
-            continue
-        try:
-            opt = it.criterion.options.get(id=int(opt_id))
-            it.selected_option = opt
-            it.selected_value = opt.value
-            it.save(update_fields=["selected_option", "selected_value"])
-        except Exception:
-            continue
+    save_item_choices(ev, request.POST)
 
     # Draft را معتبر نگه دار
-    ev.updated_at = timezone.now()
     if not ev.visible_until:
         ev.ensure_visible_until()
-    ev.save(update_fields=["updated_at", "visible_until"])
+        ev.save(update_fields=["visible_until"])
+    evaluation_changed.send(sender=Evaluation, evaluation=ev, user=request.user, status_changed=False)
 
     messages.info(request, "فرم شما ذخیره موقت شد و می‌توانید بعداً ادامه دهید.")
     return redirect("eval_dashboard")
 
+@login_required
+@require_http_methods(["POST"])
+def evaluation_autosave(request, pk: int):
+    """
+    ذخیره‌ی خودکار JSON:
+      {"revision": 3, "items": {"<item_id>": <option_id>, ...}}  ← فقط انتخاب‌های تغییر کرده
+    پاسخ: نسخه‌ی جدید + امتیاز/پیشرفت؛ نسخه‌ی قدیمی → 409 با نسخه‌ی فعلی
+    مهلت Draft (visible_until) اینجا تمدید نمی‌شود.
+    """
+    ev = get_object_or_404(Evaluation.objects.select_related("template"), pk=pk)
+    if ev.evaluator_id != request.user.id:
+        return JsonResponse({"ok": False, "error": "مجوز این عمل را ندارید."}, status=403)
+    if ev.status != Evaluation.Status.DRAFT or ev.is_archived:
+        return JsonResponse({"ok": False, "error": "فقط پیش‌نویس قابل ذخیره است."}, status=409)
+
+    try:
+        payload = json.loads(request.body or b"{}")
+        revision = int(payload["revision"])
+        choices = {int(k): int(v) for k, v in (payload.get("items") or {}).items()}
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return JsonResponse({"ok": False, "error": "درخواست نامعتبر است."}, status=400)
+
+    try:
+        changed = autosave_choices(ev, revision, choices)
+    except NotDraft:
+        return JsonResponse({"ok": False, "error": "فقط پیش‌نویس قابل ذخیره است."}, status=409)
+    except StaleRevision as ex:
+        return JsonResponse(
+            {"ok": False, "error": "فرم در جای دیگری ذخیره شده است؛ صفحه را دوباره بارگذاری کنید.",
+             "revision": ex.current},
+            status=409,
+        )
+
+    if changed:
+        evaluation_changed.send(sender=Evaluation, evaluation=ev, user=request.user, status_changed=False)
+    return JsonResponse({
+        "ok": True,
+        "changed": changed,
+        "revision": ev.revision,
+        "final_score": float(ev.final_score) if ev.final_score is not None else None,
+        "max_score": float(ev.max_score) if ev.max_score is not None else None,
+        "filled_items": ev.filled_items,
+        "required_items": ev.required_items,
+        "progress_percent": ev.progress_percent,
+    })
+
 @login_required
 @require_http_methods(["POST"])
 def bulk_archive_drafts_view(request):
@@ -1416,7 +1400,13 @@ def bulk_archive_drafts_view(request):
     if not request.user.is_superuser:
         qs = qs.filter(evaluator=request.user)
 
+    # update() از save() رد می‌شود؛ سطل‌های rollup را دستی تازه می‌کنیم
+    keys = collect_stat_keys(qs)
+    archived = [Transition(ev, ev.status, ARCHIVED) for ev in qs.only("id", "status", "unit_code")]
     count = qs.update(is_archived=True)
+    record_transitions(archived, actor=request.user)
+    schedule_stat_refresh(keys | {k._replace(is_archived=True) for k in keys})
+    evaluation_changed.send(sender=Evaluation, evaluation=None, user=request.user, status_changed=True)
     messages.success(request, f"{count} پیش‌نویس آرشیو شد.")
     return redirect("eval_dashboard")
 
@@ -1432,7 +1422,10 @@ def bulk_delete_drafts_view(request):
         return redirect("eval_dashboard")
 
     qs = Evaluation.objects.filter(id__in=ids, status=Evaluation.Status.DRAFT)
+    keys = collect_stat_keys(qs)
     count = qs.delete()[0]
+    schedule_stat_refresh(keys)
+    evaluation_changed.send(sender=Evaluation, evaluation=None, user=request.user, status_changed=True)
     messages.success(request, f"{count} پیش‌نویس به‌صورت دائم حذف شد.")
     return redirect("eval_dashboard")
 
@@ -1445,6 +1438,8 @@ def archive_evaluation_view(request, pk: int):
         return HttpResponseForbidden("مجوز این عمل را ندارید.")
     ev.is_archived = True
     ev.save(update_fields=["is_archived"])
+    record_transition(ev, ev.status, ARCHIVED, actor=request.user)
+    evaluation_changed.send(sender=Evaluation, evaluation=ev, user=request.user, status_changed=True)
     messages.success(request, "پیش‌نویس آرشیو شد.")
     return redirect("eval_dashboard")
 
@@ -1478,7 +1473,12 @@ def bulk_archive_drafts_view(request):
         messages.info(request, "هیچ فرم قابل آرشیو یافت نشد.")
         return redirect(request.META.get("HTTP_REFERER", "/eval/dashboard/"))
 
+    keys = collect_stat_keys(qs)
+    archived = [Transition(ev, ev.status, ARCHIVED) for ev in qs.only("id", "status", "unit_code")]
     qs.update(is_archived=True, updated_at=timezone.now())
+    record_transitions(archived, actor=request.user)
+    schedule_stat_refresh(keys | {k._replace(is_archived=True) for k in keys})
+    evaluation_changed.send(sender=Evaluation, evaluation=None, user=request.user, status_changed=True)
     messages.success(request, f"{count} فرم با موفقیت آرشیو شد.")
     return redirect(request.META.get("HTTP_REFERER", "/eval/dashboard/"))
 
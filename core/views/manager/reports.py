@@ -6,6 +6,13 @@ from core.models import Evaluation
 from core.models import FormTemplate
 from core.models import EmployeeProfile, Unit
 from core.constants import Settings
+from core.services.unit_tree import descendant_units
+from core.services.report_aggregates import ReportAggregate, aggregate_report
+from core.services.evaluation_stats import (
+    aggregate_stats,
+    aggregate_stats_by_unit,
+    available_years,
+)
 from django.db.models import Q
 
 def is_factory_manager(user):
@@ -33,10 +40,7 @@ def reports_dashboard_view(request):
     - مدیر واحد: فقط پرسنل واحد خودش
     - فیلتر بر اساس سال و بازه (۳/۶/۹/۱۲ یا کل سال)
     """
-    from django.db.models import Avg, FloatField, Case, When, F
-    from django.db.models.functions import Coalesce
     from django.utils.safestring import mark_safe
-    from django.db.models import ExpressionWrapper, fields
     from datetime import date
     import json
 
@@ -85,9 +89,10 @@ def reports_dashboard_view(request):
         # =========================
         else:
             if ep.unit:
+                # واحد خودش و زیرمجموعه‌هایش
                 employees = EmployeeProfile.objects.filter(
                     organization=ep.organization,
-                    unit=ep.unit
+                    unit__in=descendant_units(ep.unit_id)
                 ).order_by("user__last_name", "user__first_name")
 
     # -----------------------------
@@ -121,44 +126,21 @@ def reports_dashboard_view(request):
     # -----------------------------
     # فیلتر سال / بازه
     # -----------------------------
+    qs = qs_base.filter(period_start__year=year)
     if months in (3, 6, 9, 12):
-        qs_temp = qs_base.annotate(
-            months_diff=ExpressionWrapper(
-                F("period_end") - F("period_start"),
-                output_field=fields.DurationField()
-            )
-        ).filter(period_start__year=year)
-
-        filtered_ids = [
-            ev.id for ev in qs_temp
-            if ev.months_label() == months
-        ]
-
-        qs = qs_base.filter(id__in=filtered_ids)
-
-    else:
-        qs = qs_base.filter(period_start__year=year)
+        qs = qs.filter(period_months=months)
 
     # -----------------------------
-    # محاسبه درصد
+    # آمار خلاصه (یک کوئری تجمیعی)
     # -----------------------------
-    percent_expr = Case(
-        When(max_score__gt=0, then=(F("final_score") * 100.0) / F("max_score")),
-        default=None,
-        output_field=FloatField(),
-    )
+    agg = aggregate_report(qs)
 
-    # -----------------------------
-    # آمار خلاصه
-    # -----------------------------
     stats = {
-        "total": qs.count(),
-        "draft": qs.filter(status="draft").count(),
-        "submitted": qs.filter(status="submitted").count(),
-        "approved": qs.filter(status="approved").count(),
-        "avg_percent": round(
-            qs.aggregate(avg=Avg(percent_expr))["avg"] or 0.0, 1
-        ),
+        "total": agg.total,
+        "draft": agg.count(Evaluation.Status.DRAFT),
+        "submitted": agg.count(Evaluation.Status.SUBMITTED),
+        "approved": agg.count(Evaluation.Status.APPROVED),
+        "avg_percent": round(agg.avg_percent, 1),
     }
 
     # -----------------------------
@@ -170,11 +152,7 @@ def reports_dashboard_view(request):
         "approved": stats["approved"],
     }
 
-    by_form = list(
-        qs.values("template__code")
-        .annotate(avg_percent=Coalesce(Avg(percent_expr), 0.0))
-        .order_by("template__code")
-    )
+    by_form = agg.by_form(default=0.0)
 
     status_pie_json = mark_safe(json.dumps(status_pie))
     by_form_json = mark_safe(json.dumps(by_form))
@@ -393,21 +371,15 @@ def summary_report_view(request):
         # مدیر کارخانه → همه واحدهای سازمان خودش
         units_qs = Unit.objects.filter(organization=manager_profile.organization)
     else:
-        # مدیر واحد → فقط واحد خودش
-        units_qs = Unit.objects.filter(id=manager_profile.unit_id)
+        # مدیر واحد → واحد خودش و زیرمجموعه‌هایش (جدول بستار)
+        units_qs = descendant_units(manager_profile.unit_id) if manager_profile.unit_id else Unit.objects.none()
 
-    # کد واحدهای تحت مدیریت
-    unit_codes = list(units_qs.values_list("unit_code", flat=True))
+    # واحدهای تحت مدیریت (یک بار واکشی؛ برای جدول خلاصه هم استفاده می‌شود)
+    units = list(units_qs.only("id", "name", "unit_code").order_by("name"))
+    unit_codes = [u.unit_code for u in units]
 
-    # ---- گرفتن ارزیابی‌ها ----
-    qs = Evaluation.objects.filter(unit_code__in=unit_codes)
-
-    # ---- سال‌ها ----
-    years = list(
-        qs.values_list("period_start__year", flat=True)
-          .distinct()
-          .order_by("-period_start__year")
-    )
+    # ---- سال‌ها (از جدول تجمیعی EvaluationStat) ----
+    years = available_years(unit_codes=unit_codes)
 
     # ---- فرم‌ها ----
     form_choices = list(
@@ -418,40 +390,29 @@ def summary_report_view(request):
     selected_year = request.GET.get("year")
     selected_form = request.GET.get("form_code")
 
-    if selected_year:
-        qs = qs.filter(period_start__year=selected_year)
-
-    if selected_form:
-        qs = qs.filter(template__code=selected_form)
-
-    # ---- محاسبه درصد ----
-    from django.db.models import Avg, F, FloatField, Case, When
+    stat_filters = {
+        "unit_codes": unit_codes,
+        "year": _int_safe(selected_year),
+        "template_code": selected_form or None,
+    }
 
-    percent_expr = Case(
-        When(max_score__gt=0, then=(F("final_score") * 100.0) / F("max_score")),
-        default=None,
-        output_field=FloatField()
-    )
+    # ---- آمار و نمودارها (جمع ردیف‌های rollup) ----
+    agg = aggregate_stats(**stat_filters)
 
     stats = {
-        "total": qs.count(),
-        "submitted": qs.filter(status="submitted").count(),
-        "approved": qs.filter(status="approved").count(),
-        "avg_percent": round(qs.aggregate(avg=Avg(percent_expr))["avg"] or 0, 1),
+        "total": agg.total,
+        "submitted": agg.count(Evaluation.Status.SUBMITTED),
+        "approved": agg.count(Evaluation.Status.APPROVED),
+        "avg_percent": round(agg.avg_percent, 1),
     }
 
-    # ---- نمودارها ----
     status_pie = {
-        "draft": qs.filter(status="draft").count(),
-        "submitted": qs.filter(status="submitted").count(),
-        "approved": qs.filter(status="approved").count(),
+        "draft": agg.count(Evaluation.Status.DRAFT),
+        "submitted": stats["submitted"],
+        "approved": stats["approved"],
     }
 
-    by_form = list(
-        qs.values("template__code")
-          .annotate(avg_percent=Avg(percent_expr))
-          .order_by("template__code")
-    )
+    by_form = agg.by_form()
 
     import json
     from django.utils.safestring import mark_safe
@@ -459,28 +420,20 @@ def summary_report_view(request):
     status_pie_json = mark_safe(json.dumps(status_pie))
     by_form_json = mark_safe(json.dumps(by_form))
 
-    # ---- خلاصه واحدها ----
+    # ---- خلاصه واحدها (rollup به تفکیک unit_code) ----
+    per_unit = aggregate_stats_by_unit(**stat_filters)
+    empty = ReportAggregate()
     unit_summary = []
 
-    for u in units_qs:
-        u_qs = qs.filter(unit_code=u.unit_code)
-
-        total = u_qs.count()
-        submitted = u_qs.filter(status="submitted").count()
-        approved = u_qs.filter(status="approved").count()
-
-        avg_percent = (
-            round(u_qs.aggregate(avg=Avg(percent_expr))["avg"] or 0, 1)
-            if total > 0 else 0
-        )
-
+    for u in units:
+        u_agg = per_unit.get(u.unit_code, empty)
         unit_summary.append({
             "name": u.name,
             "code": u.unit_code,
-            "total": total,
-            "submitted": submitted,
-            "approved": approved,
-            "avg_percent": avg_percent,
+            "total": u_agg.total,
+            "submitted": u_agg.count(Evaluation.Status.SUBMITTED),
+            "approved": u_agg.count(Evaluation.Status.APPROVED),
+            "avg_percent": round(u_agg.avg_percent, 1),
         })
 
     # ---- ارسال به template ----
@@ -499,11 +452,51 @@ def summary_report_view(request):
     return render(request, "manager/reports/summary_report.html", context)
 
 
+@login_required
+def time_in_stage_report_view(request):
+    """مدت ماندن ارزیابی‌ها در هر مرحله (از لاگ EvaluationTransition)، به تفکیک واحد"""
+    from datetime import date, timedelta
+    from core.approval.audit import ARCHIVED, time_in_stage
 
+    manager_profile = getattr(request.user, "employee_profile", None)
+    if not manager_profile:
+        return HttpResponse("پروفایل پیدا نشد!", status=403)
 
+    # ---- واحدها: مثل summary_report_view ----
+    if is_factory_manager(request.user):
+        units_qs = Unit.objects.filter(organization=manager_profile.organization)
+    else:
+        units_qs = descendant_units(manager_profile.unit_id) if manager_profile.unit_id else Unit.objects.none()
+    units = {u.unit_code: u.name for u in units_qs.only("name", "unit_code")}
 
+    # ---- بازه (پیش‌فرض: ۹۰ روز اخیر) ----
+    def _parse(val):
+        try:
+            return date.fromisoformat(_digits_en(val)) if val else None
+        except ValueError:
+            return None
 
+    date_to = _parse(request.GET.get("date_to")) or date.today()
+    date_from = _parse(request.GET.get("date_from")) or date_to - timedelta(days=90)
+
+    labels = dict(Evaluation.Status.choices)
+    labels[ARCHIVED] = "آرشیو"
+    rows = [
+        {
+            "unit": units.get(r.unit_code, r.unit_code or "—"),
+            "code": r.unit_code,
+            "status": labels.get(r.status, r.status),
+            "count": r.count,
+            "avg_hours": r.avg_hours,
+            "avg_days": round(r.avg_hours / 24, 1),
+            "max_days": round(r.max_hours / 24, 1),
+        }
+        for r in time_in_stage(units.keys(), date_from, date_to)
+    ]
 
-
-
-
+    context = {
+        "rows": rows,
+        "date_from": date_from.isoformat(),
+        "date_to": date_to.isoformat(),
+    }
+    return render(request, "manager/reports/time_in_stage.html", context)
@@ -5,10 +5,12 @@ from django.shortcuts import render
 from core.models import Evaluation
 from core.constants import Settings
 from core.approval.workflow_engine import WorkflowEngine
+from core.approval.role_resolver import resolve_approval_role, resolve_profile
 from core.approval.statuses import EvaluationStatus
+from core.approval.roles import ApprovalRole
 from django.shortcuts import get_object_or_404, redirect
 from django.views.decorators.http import require_POST
-from django.http import HttpResponseForbidden
+from django.http import HttpResponseForbidden, JsonResponse
 from django.contrib import messages
 from core.models import Unit
 
@@ -16,7 +18,8 @@ from core.models import Unit
 @login_required
 @require_http_methods(["GET"])
 def workflow_view(request):
-    ep = getattr(request.user, "employee_profile", None)
+    ep = resolve_profile(request.user)
+    role = resolve_approval_role(request.user)
 
     # ------------------ تشخیص نقش‌ها ------------------
     is_factory_manager = (
@@ -65,7 +68,7 @@ def workflow_view(request):
         )
 
         for ev in hr_items:
-            engine = WorkflowEngine(ev)
+            engine = WorkflowEngine(ev, role=role)
             ev.unit_name = units_map.get(ev.unit_code, "—")
             hr_list.append({
                 "ev": ev,
@@ -83,7 +86,7 @@ def workflow_view(request):
         )
 
         for ev in factory_items:
-            engine = WorkflowEngine(ev)
+            engine = WorkflowEngine(ev, role=role)
             ev.unit_name = units_map.get(ev.unit_code, "—")  # ← این خط رو اضافه کن
             factory_list.append({
                 "ev": ev,
@@ -120,3 +123,40 @@ def eval_factory_approve(request, pk):
     messages.success(request, "ارزیابی با موفقیت تأیید نهایی شد.")
     return redirect("manager:workflow")
 
+
+
+@login_required
+@require_POST
+def eval_approve_many(request):
+    """
+    تأیید گروهی HR / مدیر کارخانه از صفحه‌ی گردش‌کار.
+    ids: لیست شناسه‌ها؛ با format=json نتیجه‌ی هر مورد برگردانده می‌شود.
+    """
+    role = resolve_approval_role(request.user)
+    if role not in (ApprovalRole.HR, ApprovalRole.FACTORY_MANAGER):
+        return HttpResponseForbidden("اجازه تأیید گروهی ندارید.")
+
+    ids = request.POST.getlist("ids")
+    results = WorkflowEngine.approve_many(request.user, ids, role=role) if ids else []
+    ok = [r for r in results if r.ok]
+    failed = [r for r in results if not r.ok]
+
+    if request.POST.get("format") == "json":
+        return JsonResponse({
+            "approved": len(ok),
+            "failed": len(failed),
+            "results": [
+                {"id": r.evaluation_id, "ok": r.ok, "status": getattr(r.status, "value", r.status), "error": r.error}
+                for r in results
+            ],
+        })
+
+    if not results:
+        messages.info(request, "موردی انتخاب نشده است.")
+    if ok:
+        messages.success(request, f"{len(ok)} ارزیابی تأیید شد.")
+    if failed:
+        messages.error(request, f"{len(failed)} مورد تأیید نشد: " + "، ".join(
+            f"#{r.evaluation_id} ({r.error})" for r in failed[:10]
+        ))
+    return redirect("manager:workflow")
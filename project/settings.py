@@ -101,6 +101,20 @@ DATABASES = {
     }
 }
 
+# کش: پیش‌فرض فایل (مشترک بین workerهای gunicorn روی یک سرور)
+CACHES = {
+    "default": {
+        "BACKEND": env.str("CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"),
+        "LOCATION": env.str("CACHE_LOCATION", str(BASE_DIR / ".cache")),
+    }
+}
+DASHBOARD_CACHE_TIMEOUT = env.int("DASHBOARD_CACHE_TIMEOUT", 300)
+
+# خروجی کارهای پس‌زمینه: فایل روی دیسک (بیرون از static/media؛ فقط از راه view دانلود)
+JOB_RESULTS_ROOT = env.str("JOB_RESULTS_ROOT", str(BASE_DIR / "job_results"))
+# سقف حجم خروجی هر کار؛ بزرگ‌تر از این کار را ناموفق می‌کند
+JOB_RESULT_MAX_BYTES = env.int("JOB_RESULT_MAX_BYTES", 512 * 1024 * 1024)
+
 AUTH_PASSWORD_VALIDATORS = [
     # === validation of password===== پیش فرض بررسی پسورد جنگو
     # {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},